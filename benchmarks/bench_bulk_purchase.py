@@ -0,0 +1,124 @@
+"""
+One bulk purchase request vs one purchase_domain request per domain.
+
+Registers ``--domains`` domains for one contact against a local fake GoDaddy
+server, on a throwaway SQLite database with a checkout session per domain,
+first with sequential purchase-domain/ calls and then with a single
+purchase-domains/ call. Reports wall time, upstream requests and database
+queries for each.
+
+    python -m benchmarks.bench_bulk_purchase --domains 50 --latency 0.05
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from benchmarks.e2e import contact
+from benchmarks.fake_godaddy import FakeGoDaddyServer
+from benchmarks.loadtest_sync_async import use_temporary_database
+from service.models import CheckoutSession, Purchase
+
+
+def post(application, path, body):
+    """POST ``body`` as JSON through the WSGI app, returns ``(status, decoded body)``."""
+    payload = json.dumps(body).encode()
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": path,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "8000",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(payload)),
+        "wsgi.input": io.BytesIO(payload),
+        "wsgi.url_scheme": "http",
+        "wsgi.errors": sys.stderr,
+    }
+    statuses = []
+    body = b"".join(application(environ, lambda status, headers: statuses.append(status)))
+    return int(statuses[0].split()[0]), json.loads(body)
+
+
+def create_sessions(prefix, count, email):
+    domains = [f"{prefix}{i}{('.com', '.net', '.org')[i % 3]}" for i in range(count)]
+    CheckoutSession.objects.bulk_create(
+        CheckoutSession(session_id=f"cs_{domain}", domain_name=domain, email=email, period=1, price="11.99",
+                        currency="usd")
+        for domain in domains
+    )
+    return domains
+
+
+def run(label, server, send):
+    caches[settings.GODADDY_AGREEMENT_CACHE_ALIAS].clear()  # Both modes start without cached agreements
+    handled = server.handled
+    purchases = Purchase.objects.count()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        send()
+        elapsed = time.perf_counter() - started
+    print(
+        f"{label:<12} {elapsed:>9.2f} {server.handled - handled:>10} {len(queries):>8} "
+        f"{Purchase.objects.count() - purchases:>10}"
+    )
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--domains", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream latency in seconds")
+    args = parser.parse_args(argv)
+
+    use_temporary_database()
+    application = get_wsgi_application()
+    details = contact(0)
+    settings.GODADDY_RATE_LIMIT = 0  # The fake has no quota to protect
+    with FakeGoDaddyServer(args.latency, 0.01, seed=1) as server:
+        settings.GODADDY_API_URL = server.url
+        print(f"{args.domains} domains, concurrency {settings.PURCHASE_BULK_CONCURRENCY}, "
+              f"{args.latency * 1000:g}ms upstream latency\n")
+        print(f"{'mode':<12} {'seconds':>9} {'upstream':>10} {'queries':>8} {'purchases':>10}")
+
+        domains = create_sessions("single", args.domains, details["email"])
+
+        def sequential():
+            for domain in domains:
+                status, _ = post(application, "/purchase-domain/", {
+                    "domain_name": domain, "period": 1, "amount": 1199, "currency": "usd", **details,
+                })
+                assert status == 200, status
+
+        single = run("sequential", server, sequential)
+
+        bulk_domains = create_sessions("bulk", args.domains, details["email"])
+
+        def bulk():
+            status, body = post(application, "/purchase-domains/", {
+                **details,
+                "currency": "usd",
+                "domains": [{"domain_name": domain, "period": 1, "amount": 1199} for domain in bulk_domains],
+            })
+            assert status == 200 and body["failed"] == 0, body
+
+        batched = run("bulk", server, bulk)
+    print(f"\nspeedup: {single / batched:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
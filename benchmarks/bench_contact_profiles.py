@@ -0,0 +1,121 @@
+"""
+Contact profiles: payload building per purchase and the storage they save.
+
+Times building the four GoDaddy contact blocks from the request on every
+purchase, querying the ContactProfile a purchase references and fetching it
+with its prebuilt blocks from the cache, then seeds a throwaway SQLite database (migrated up to 0008) with
+``--purchases`` purchases by ``--customers`` repeat customers in the old
+per-row contact columns, applies the migrations that move them into
+profiles and prints ``contact_storage_report``.
+
+    python -m benchmarks.bench_contact_profiles --purchases 200000 --customers 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection, transaction
+
+from benchmarks.loadtest_sync_async import use_temporary_database
+from service.contacts import contact_details, contact_profile, fingerprint
+from service.models import ContactProfile
+from service.purchasing import build_contacts
+
+SQLITE_DATETIME = "2025-01-01 00:00:00"
+
+
+def customer(n):
+    return {
+        "email": f"user{n}@example.com",
+        "first_name": "Ada",
+        "last_name": f"Lovelace{n}",
+        "phone": "+1.5555550100",
+        "address1": f"{n} Main St",
+        "address2": "",
+        "city": "Springfield",
+        "state": "IL",
+        "postal_code": "62701",
+        "country": "US",
+    }
+
+
+def time_payloads(calls):
+    """Median microseconds per purchase for each way of getting the contact blocks."""
+    data = customer(1)
+    contact_profile(data)  # The repeat customer's profile is cached after their first purchase
+    results = {}
+    details = contact_details(data)
+    for label, build in [
+        ("build per purchase", lambda: build_contacts(data)),
+        # What finding the profile to reference would cost without the cache
+        ("query profile", lambda: ContactProfile.objects.get(fingerprint=fingerprint(details)).godaddy_contacts),
+        ("cached profile", lambda: contact_profile(data).godaddy_contacts),
+    ]:
+        timings = []
+        for _ in range(calls):
+            started = time.perf_counter()
+            build()
+            timings.append((time.perf_counter() - started) * 1_000_000)
+        results[label] = statistics.median(timings)
+    return results
+
+
+def seed(purchases, customers, batch_size=50000):
+    """Insert sessions and purchases with the contact columns Purchase had up to 0008."""
+    for offset in range(0, purchases, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            ids = range(offset + 1, min(offset + batch_size, purchases) + 1)
+            cursor.executemany(
+                "INSERT INTO service_checkoutsession (id, session_id, domain_name, email, period, price, currency,"
+                " payment_status, created_at) VALUES (%s, %s, %s, %s, 1, '11.99', 'usd', 'paid', %s)",
+                [(i, f"cs_{i}", f"domain{i}.com", customer(i % customers)["email"], SQLITE_DATETIME) for i in ids],
+            )
+            cursor.executemany(
+                "INSERT INTO service_purchase (order_id, checkout_session_id, first_name, last_name, phone,"
+                " address1, address2, city, state, postal_code, country, amount, currency, status, created_at)"
+                " VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, '11.99', 'usd', 'SUCCESS', %s)",
+                [
+                    (f"order_{i}", i, *(
+                        # Some repeat customers type their details a little differently
+                        f" {value} " if i % 7 == 0 else value
+                        for field, value in customer(i % customers).items() if field != "email"
+                    ), SQLITE_DATETIME)
+                    for i in ids
+                ],
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--purchases", type=int, default=200000)
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--calls", type=int, default=20000, help="purchases to time the payload building over")
+    args = parser.parse_args(argv)
+
+    use_temporary_database()
+    print(f"{'contact blocks':<20} {'p50 us':>9}")
+    for label, median in time_payloads(args.calls).items():
+        print(f"{label:<20} {median:>9.2f}")
+
+    call_command("migrate", "service", "0008", verbosity=0)
+    started = time.perf_counter()
+    seed(args.purchases, args.customers)
+    print(f"seeded {args.purchases} purchases by {args.customers} customers in {time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    call_command("migrate", "service", verbosity=0)
+    print(f"moved the contacts into profiles in {time.perf_counter() - started:.1f}s")
+    call_command("contact_storage_report")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Measure the export formats of export-checkout-sessions: rows/sec and bytes/row.
+
+Sessions (and one purchase for every ``--purchase-every`` sessions) are
+written to a throwaway SQLite database, then each format is encoded from the
+same streaming query. ``--memory`` also reports the peak traced Python memory
+per format (this slows every format down).
+
+    python -m benchmarks.bench_exports --rows 200000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from benchmarks.loadtest_sync_async import use_temporary_database
+from service.contacts import contact_profile
+from service.exports import export_rows, iter_export, load_pyarrow
+from service.models import CheckoutSession, Purchase
+
+VARIANTS = [
+    # label, format, compress
+    ("csv", "csv", None),
+    ("csv.gz", "csv", "gzip"),
+    ("ndjson", "ndjson", None),
+    ("ndjson.gz", "ndjson", "gzip"),
+    ("parquet", "parquet", None),
+    ("arrow", "arrow", None),
+]
+
+
+def populate(rows, purchase_every, batch_size=10000):
+    started = timezone.now()
+    for offset in range(0, rows, batch_size):
+        CheckoutSession.objects.bulk_create(
+            CheckoutSession(
+                session_id=f"cs_bench_{i}",
+                domain_name=f"benchmark{i}.com",
+                email=f"user{i % 5000}@example.com",
+                period=1 + i % 3,
+                price="11.99",
+                currency="usd",
+                created_at=started + timedelta(seconds=i),
+            )
+            for i in range(offset, min(offset + batch_size, rows))
+        )
+    sessions = CheckoutSession.objects.order_by("id").values_list("id", flat=True)[::purchase_every]
+    contact = contact_profile({
+        "email": "ada@example.com", "first_name": "Ada", "last_name": "Lovelace", "phone": "+1.5555550100",
+        "address1": "1 Main St", "city": "Springfield", "state": "IL", "postal_code": "62701", "country": "US",
+    })
+    Purchase.objects.bulk_create(
+        (
+            Purchase(
+                order_id=f"order_{pk}", checkout_session_id=pk, contact=contact, amount="11.99", currency="usd",
+                status="SUCCESS",
+            )
+            for pk in sessions
+        ),
+        batch_size=batch_size,
+    )
+
+
+def measure(fmt, compress, include_purchases, trace_memory):
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    rows = 0
+
+    def counted(source):
+        nonlocal rows
+        for row in source:
+            rows += 1
+            yield row
+
+    size = 0
+    for chunk in iter_export(counted(export_rows(include_purchases=include_purchases)), fmt, compress, include_purchases):
+        size += len(chunk.encode() if isinstance(chunk, str) else chunk)
+    elapsed = time.perf_counter() - started
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return rows, elapsed, size, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--purchase-every", type=int, default=4, help="add a purchase to every n-th session")
+    parser.add_argument("--no-purchases", action="store_true", help="export sessions only")
+    parser.add_argument("--memory", action="store_true", help="report peak traced memory per format")
+    args = parser.parse_args(argv)
+
+    use_temporary_database()
+    populate(args.rows, args.purchase_every)
+    include_purchases = not args.no_purchases
+
+    print(f"rows={args.rows} include_purchases={include_purchases}")
+    print(f"{'format':<10} {'rows/s':>10} {'bytes/row':>10} {'MB':>8}" + (f" {'peak MB':>8}" if args.memory else ""))
+    for label, fmt, compress in VARIANTS:
+        if fmt in ("parquet", "arrow"):
+            try:
+                load_pyarrow()
+            except ImproperlyConfigured:
+                print(f"{label:<10} skipped, pyarrow is not installed")
+                continue
+        rows, elapsed, size, peak = measure(fmt, compress, include_purchases, args.memory)
+        line = f"{label:<10} {rows / elapsed:>10.0f} {size / rows:>10.1f} {size / 1e6:>8.1f}"
+        if args.memory:
+            line += f" {peak / 1e6:>8.1f}"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+View latency with logging off, with print() and with the JSON loggers.
+
+Runs list-domains through the WSGI application against a warm availability
+cache (so the view itself is cheap and the logging cost shows) with the
+``service`` loggers at DEBUG, writing to a file behind a stream that waits
+``--sink-latency`` seconds per write, like a pipe or log shipper that has
+fallen behind:
+
+- off: no handler output (the logger level filters everything)
+- print: the old print() of every request body
+- sync json: JSONFormatter on a plain StreamHandler, written on the request thread
+- queued json: BackgroundJSONHandler, written by its listener thread
+- queued json, sampled: the same with 1% of DEBUG records kept
+
+    python -m benchmarks.bench_logging --requests 5000
+"""
+import argparse
+import contextlib
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+from benchmarks.bench_search_fanout import EXTENSIONS, percentile
+from benchmarks.fake_godaddy import FakeGoDaddyServer, serve_in_process
+from benchmarks.loadtest_sync_async import wsgi_request
+from service.log import BackgroundJSONHandler, JSONFormatter, SamplingFilter
+
+BODY = {"domain_name": "logbench", "extensions": EXTENSIONS[:10], "bulk": False}
+
+
+class SlowStream:
+    """A file whose writes block for ``latency`` seconds."""
+
+    def __init__(self, file, latency):
+        self.file = file
+        self.latency = latency
+        self.name = file.name
+
+    def write(self, data):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+
+def configure(mode, stream):
+    """Point the service loggers at ``stream`` the way ``mode`` says, returns the handler to close."""
+    logger = logging.getLogger("service")
+    for handler in logger.handlers:
+        handler.close()
+    logger.handlers = []
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    if mode in ("off", "print"):
+        logger.setLevel(logging.CRITICAL)
+        return None
+    if mode == "sync json":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler = BackgroundJSONHandler(stream)
+        handler.addFilter(SamplingFilter(0.01 if mode.endswith("sampled") else 1.0))
+    logger.addHandler(handler)
+    return handler
+
+
+def run(application, mode, requests, stream):
+    handler = configure(mode, stream)
+    redirect = contextlib.redirect_stdout(stream) if mode == "print" else contextlib.nullcontext()
+    timings = []
+    with redirect:
+        for _ in range(requests):
+            started = time.perf_counter()
+            if mode == "print":
+                print(BODY)  # What get_list_domains used to do on every request
+            wsgi_request(application, "/list-domains/", BODY)
+            timings.append((time.perf_counter() - started) * 1000)
+    if handler is not None:
+        handler.close()
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--sink-latency", type=float, default=0.0005, help="seconds each write to the log blocks")
+    args = parser.parse_args(argv)
+
+    application = get_wsgi_application()
+    with serve_in_process(FakeGoDaddyServer, 0.0, 0.0, seed=1) as godaddy_url, \
+            open(os.path.join(tempfile.mkdtemp(), "bench.log"), "w") as log_file:
+        stream = SlowStream(log_file, args.sink_latency)
+        settings.GODADDY_API_URL = godaddy_url
+        settings.GODADDY_RATE_LIMIT = 0  # The fake has no quota to protect
+        wsgi_request(application, "/list-domains/", BODY)  # Fill the availability cache
+
+        print(
+            f"requests={args.requests}, list-domains with a warm cache, "
+            f"{args.sink_latency * 1000:.1f}ms per log write to {stream.name}"
+        )
+        print(f"{'mode':<22} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+        for mode in ["off", "print", "sync json", "queued json", "queued json, sampled"]:
+            timings = run(application, mode, args.requests, stream)
+            print(
+                f"{mode:<22} {statistics.median(timings):>9.3f} {percentile(timings, 99):>9.3f}"
+                f" {statistics.mean(timings):>9.3f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
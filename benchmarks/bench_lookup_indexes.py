@@ -0,0 +1,156 @@
+"""
+Lookup latency on the hot query paths before and after the 0008 indexes.
+
+Seeds a throwaway SQLite database (migrated up to 0007) with ``--sessions``
+checkout sessions and a purchase for every ``--purchase-every``-th one,
+times the queries, applies 0008 and times them again:
+
+- purchase_domain's session lookup by (domain_name, email), both the old
+  exists() + first() pair and the single first()
+- the Purchase admin changelist filtered on status (count + first page)
+- the Purchase admin changelist filtered on a created_at range
+
+    python -m benchmarks.bench_lookup_indexes --sessions 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection, transaction
+
+from benchmarks.bench_search_fanout import percentile
+from benchmarks.loadtest_sync_async import use_temporary_database
+from service.models import CheckoutSession, Purchase
+
+STATUSES = ["SUCCESS", "SUCCESS", "SUCCESS", "FAILED", "PENDING"]
+SQLITE_DATETIME = "%Y-%m-%d %H:%M:%S"  # How Django stores UTC datetimes in SQLite
+
+
+def seed(sessions, purchase_every, batch_size=50000):
+    """Insert rows with plain executemany, the ORM would dominate the setup time."""
+    # One transaction per batch, in autocommit mode SQLite would sync every row
+    started = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    session_table = CheckoutSession._meta.db_table
+    purchase_table = Purchase._meta.db_table
+    for offset in range(0, sessions, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            ids = range(offset + 1, min(offset + batch_size, sessions) + 1)
+            cursor.executemany(
+                f"INSERT INTO {session_table} (id, session_id, domain_name, email, period, price, currency,"
+                " payment_status, created_at) VALUES (%s, %s, %s, %s, 1, '11.99', 'usd', 'paid', %s)",
+                [
+                    (i, f"cs_{i}", f"domain{i}.com", f"user{i % 50000}@example.com",
+                     (started + timedelta(seconds=30 * i)).strftime(SQLITE_DATETIME))
+                    for i in ids
+                ],
+            )
+            cursor.executemany(
+                f"INSERT INTO {purchase_table} (order_id, checkout_session_id, first_name, last_name, phone,"
+                " address1, city, state, postal_code, country, amount, currency, status, created_at)"
+                " VALUES (%s, %s, 'Ada', 'Lovelace', '+1.5555550100', '1 Main St', 'Springfield', 'IL',"
+                " '62701', 'US', '11.99', 'usd', %s, %s)",
+                [
+                    (f"order_{i}", i, STATUSES[i % len(STATUSES)],
+                     (started + timedelta(seconds=30 * i + 5)).strftime(SQLITE_DATETIME))
+                    for i in ids if i % purchase_every == 0
+                ],
+            )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def timed(query, repeat):
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        query(i)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+# The columns the queries load, the models' other fields only exist in later migrations
+SESSION_FIELDS = ["session_id", "domain_name", "email", "period", "price", "currency", "payment_status", "created_at"]
+PAGE_FIELDS = ["order_id", "checkout_session_id", "amount", "currency", "status", "created_at"]
+
+
+def queries(sessions):
+    rng = random.Random(1)
+    targets = [rng.randint(1, sessions) for _ in range(1000)]
+    first_day = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    last_day = first_day + timedelta(seconds=30 * sessions)
+
+    def lookup(i):
+        n = targets[i % len(targets)]
+        return CheckoutSession.objects.only(*SESSION_FIELDS).filter(
+            domain_name=f"domain{n}.com", email=f"user{n % 50000}@example.com"
+        )
+
+    def exists_then_first(i):
+        sessions = lookup(i)
+        if sessions.exists():
+            sessions.first()
+
+    def status_page(i):
+        purchases = Purchase.objects.filter(status="FAILED")
+        purchases.count()
+        list(purchases.only(*PAGE_FIELDS).order_by("-created_at", "-pk")[:100])
+
+    def date_range_page(i):
+        day = first_day + (last_day - first_day) * rng.random()
+        purchases = Purchase.objects.filter(created_at__gte=day, created_at__lt=day + timedelta(days=1))
+        purchases.count()
+        list(purchases.only(*PAGE_FIELDS).order_by("-created_at", "-pk")[:100])
+
+    return [
+        ("session exists()+first()", exists_then_first, 200),
+        ("session first()", lambda i: lookup(i).first(), 200),
+        ("admin status filter", status_page, 10),
+        ("admin created_at range", date_range_page, 50),
+    ]
+
+
+def run(label, sessions):
+    results = {}
+    for name, query, repeat in queries(sessions):
+        timings = timed(query, repeat)
+        results[name] = timings
+        print(f"{label:<7} {name:<26} {statistics.median(timings):>9.3f} {percentile(timings, 99):>9.3f}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=1000000)
+    parser.add_argument("--purchase-every", type=int, default=2, help="add a purchase to every n-th session")
+    args = parser.parse_args(argv)
+
+    use_temporary_database()
+    call_command("migrate", "service", "0007", verbosity=0)
+    started = time.perf_counter()
+    seed(args.sessions, args.purchase_every)
+    print(f"seeded {args.sessions} sessions in {time.perf_counter() - started:.1f}s")
+
+    print(f"{'':<7} {'query':<26} {'p50 ms':>9} {'p99 ms':>9}")
+    run("before", args.sessions)
+    started = time.perf_counter()
+    call_command("migrate", "service", "0008", verbosity=0)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    print(f"applied the 0008 indexes in {time.perf_counter() - started:.1f}s")
+    run("after", args.sessions)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Cost of pricing a checkout from a quote vs asking GoDaddy at checkout time.
+
+Runs ``--checkouts`` checkout pricings per mode against a local fake GoDaddy
+server: trusting the posted price (no check at all), looking the domain up
+on GoDaddy again, and the quote store with cached and with expired quotes.
+Reports upstream requests per checkout and p50/p99 latency, plus what
+issuing the quotes adds to a search.
+
+    python -m benchmarks.bench_quotes --checkouts 500 --latency 0.05
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.cache import caches
+
+from benchmarks.bench_search_fanout import percentile
+from benchmarks.fake_godaddy import FakeGoDaddyServer, is_available
+from service.godaddy import get_client
+from service.quotes import checkout_terms, quote_store
+
+
+def requery(domain):
+    # Hardening without a quote: ask GoDaddy for the price on every checkout
+    result = get_client().check_available(domain).json()
+    return domain, result["price"] // 10_000, 1
+
+
+def run(label, checkouts, price, server):
+    timings = []
+    handled = server.handled
+    for data in checkouts:
+        started = time.perf_counter()
+        price(data)
+        timings.append((time.perf_counter() - started) * 1000)
+    requests = (server.handled - handled) / len(checkouts)
+    print(f"{label:<16} {requests:>17.2f} {statistics.median(timings):>9.3f} {percentile(timings, 99):>9.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--checkouts", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream latency in seconds")
+    args = parser.parse_args(argv)
+
+    domains = [domain for domain in (f"quote{i}.com" for i in range(args.checkouts * 3)) if is_available(domain)]
+    domains = domains[:args.checkouts]
+    answers = [
+        {"domain": domain, "available": True, "definitive": True, "price": 11990000, "currency": "USD", "period": 1}
+        for domain in domains
+    ]
+
+    started = time.perf_counter()
+    quoted = quote_store.attach(answers)
+    elapsed = time.perf_counter() - started
+    print(f"issuing a quote: {elapsed / len(answers) * 1e6:.1f}us per available domain, "
+          f"{statistics.mean(len(result['quote_id']) for result in quoted):.0f} bytes per quote_id\n")
+
+    settings.GODADDY_RATE_LIMIT = 0  # The fake has no quota to protect
+    with FakeGoDaddyServer(args.latency, 0.01, seed=1) as server:
+        settings.GODADDY_API_URL = server.url
+        print(f"{'pricing':<16} {'requests/checkout':>17} {'p50 ms':>9} {'p99 ms':>9}")
+        run("posted price", [{"name": d, "price": "11.99", "period": 1} for d in domains], checkout_terms, server)
+        run("re-query", domains, requery, server)
+        checkouts = [{"name": result["domain"], "quote_id": result["quote_id"]} for result in quoted]
+        run("cached quote", checkouts, checkout_terms, server)
+        caches[settings.QUOTE_CACHE_ALIAS].clear()
+        run("expired quote", checkouts, checkout_terms, server)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Search bursts against a rate limited fake GoDaddy, with and without the client-side limiter.
+
+Search threads hammer the fake (which answers 429 past ``--quota`` requests a
+second) while one thread buys a domain every ``--purchase-interval`` seconds.
+Each mode reports the 429s GoDaddy had to send, how many searched domains
+came back answered vs pending, and purchase success and latency.
+
+    python -m benchmarks.bench_rate_limit --quota 10 --searchers 8 --duration 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.cache import caches
+
+from benchmarks.bench_search_fanout import EXTENSIONS, percentile
+from benchmarks.fake_godaddy import FakeGoDaddyServer
+from service.availability import search_available_domains
+from service.godaddy import get_client
+from service.ratelimit import UpstreamUnavailable
+
+
+def search_load(stop, index, extensions, counts, lock):
+    i = 0
+    while not stop.is_set():
+        result = search_available_domains(f"ratelimit{index}x{i}", extensions, bulk=False, fresh=True)
+        with lock:
+            counts["searches"] += 1
+            counts["pending"] += len(result["pending_domains"])
+            counts["domains"] += len(extensions)
+        i += 1
+
+
+def purchase_load(stop, interval, timings, outcomes):
+    client = get_client()
+    while not stop.wait(interval):
+        started = time.perf_counter()
+        try:
+            client.get_agreements(["com"])
+            ok = client.purchase({"domain": "example.com", "period": 1}).status_code == 200
+        except UpstreamUnavailable:
+            ok = False
+        timings.append((time.perf_counter() - started) * 1000)
+        outcomes.append(ok)
+
+
+def run(server, args, limit):
+    settings.GODADDY_RATE_LIMIT = limit
+    # The fake counts per calendar second, so the burst plus a second of refill must fit the quota
+    settings.GODADDY_RATE_LIMIT_BURST = max(1, args.quota // 4)
+    caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS].clear()
+    time.sleep(1)  # Let the fake's quota window roll over
+    server.rate_limited = 0
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    counts = {"searches": 0, "pending": 0, "domains": 0}
+    timings, outcomes = [], []
+    threads = [
+        threading.Thread(target=search_load, args=(stop, i, EXTENSIONS[:args.extensions], counts, lock))
+        for i in range(args.searchers)
+    ]
+    threads.append(threading.Thread(target=purchase_load, args=(stop, args.purchase_interval, timings, outcomes)))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counts, timings, outcomes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quota", type=int, default=10, help="requests per second the fake accepts")
+    parser.add_argument("--searchers", type=int, default=8, help="threads searching back to back")
+    parser.add_argument("--extensions", type=int, default=5, help="extensions per search")
+    parser.add_argument("--purchase-interval", type=float, default=0.5, help="seconds between purchases")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per mode")
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream latency in seconds")
+    args = parser.parse_args(argv)
+
+    server = FakeGoDaddyServer(args.latency, 0.01, seed=1, quota=args.quota)
+    with server:
+        settings.GODADDY_API_URL = server.url
+        print(f"quota={args.quota}/s searchers={args.searchers} duration={args.duration:g}s per mode")
+        print(
+            f"{'mode':<8} {'429s':>6} {'searches':>9} {'pending':>8} "
+            f"{'purchases ok':>13} {'p50 ms':>8} {'p99 ms':>8}"
+        )
+        # Keep a margin under the quota, other clients of the same key count against it too
+        for name, limit in [("off", 0), ("limiter", int(args.quota * 60 * 0.75))]:
+            counts, timings, outcomes = run(server, args, limit)
+            pending = counts["pending"] / counts["domains"] if counts["domains"] else 0
+            print(
+                f"{name:<8} {server.rate_limited:>6} {counts['searches']:>9} {pending:>8.1%} "
+                f"{f'{sum(outcomes)}/{len(outcomes)}':>13} {statistics.median(timings):>8.1f} "
+                f"{percentile(timings, 99):>8.1f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
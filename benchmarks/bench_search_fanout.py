@@ -0,0 +1,92 @@
+"""
+Benchmark the domain search fan-out against a local fake GoDaddy server.
+
+Compares the old serial loop (one lookup at a time) with the concurrent
+fan-out engine and the chunked bulk endpoint as the number of extensions
+grows and prints p50/p99 latencies per search.
+
+    python -m benchmarks.bench_search_fanout --latency 0.05 --searches 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+
+from benchmarks.fake_godaddy import FakeGoDaddyServer
+from service.availability import search_available_domains
+
+EXTENSIONS = [
+    ".com", ".in", ".org", ".net", ".info", ".co", ".io", ".biz", ".us", ".uk",
+    ".ca", ".au", ".eu", ".asia", ".de", ".fr", ".nl", ".es", ".it", ".ch",
+    ".se", ".no", ".dk", ".fi", ".pl", ".cz", ".at", ".be", ".ie", ".pt",
+    ".jp", ".kr", ".cn", ".tw", ".hk", ".sg", ".nz", ".za", ".mx", ".br",
+    ".ar", ".cl", ".app", ".dev", ".ai", ".xyz", ".online", ".store", ".shop", ".tech",
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(extension_count, searches, max_workers, deadline, bulk):
+    extensions = EXTENSIONS[:extension_count]
+    timings = []
+    partial = 0
+    for i in range(searches):
+        started = time.perf_counter()
+        result = search_available_domains(
+            f"benchkeyword{i}", extensions, max_workers, deadline, bulk, fresh=True
+        )
+        timings.append((time.perf_counter() - started) * 1000)
+        partial += result["partial"]
+    return timings, partial
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.05, help="base upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra uniform upstream latency in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.01, help="fraction of upstream calls that are slow")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="latency of slow upstream calls in seconds")
+    parser.add_argument("--bulk-error-rate", type=float, default=0.02, help="fraction of bulk results that error")
+    parser.add_argument("--searches", type=int, default=20, help="searches per data point")
+    parser.add_argument("--concurrency", type=int, default=settings.GODADDY_SEARCH_CONCURRENCY)
+    parser.add_argument("--deadline", type=float, default=settings.GODADDY_SEARCH_DEADLINE)
+    parser.add_argument("--extensions", type=int, nargs="+", default=[1, 5, 15, 30, 50])
+    args = parser.parse_args(argv)
+
+    server = FakeGoDaddyServer(
+        args.latency, args.jitter, args.slow_rate, args.slow_latency, args.bulk_error_rate, seed=1
+    )
+    with server:
+        settings.GODADDY_API_URL = server.url
+        settings.GODADDY_RATE_LIMIT = 0  # The fake has no quota to protect
+        print(f"{'mode':<10} {'tlds':>5} {'p50 ms':>9} {'p99 ms':>9} {'partial':>8}")
+        for count in args.extensions:
+            modes = [
+                ("serial", 1, 3600, False),  # the old loop, one lookup at a time and no deadline
+                ("fan-out", args.concurrency, args.deadline, False),
+                ("bulk", args.concurrency, args.deadline, True),
+            ]
+            for mode, workers, deadline, bulk in modes:
+                timings, partial = run(count, args.searches, workers, deadline, bulk)
+                print(
+                    f"{mode:<10} {count:>5} {statistics.median(timings):>9.1f} "
+                    f"{percentile(timings, 99):>9.1f} {partial:>8}"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Benchmark the domain suggestion engine against a local fake GoDaddy server.
+
+Measures how fast candidates are generated and checked against the
+memory-mapped taken filter, then runs suggestion searches without and with a
+seeded filter and compares the upstream lookups each search needed. The
+filter is seeded with ``--coverage`` of the candidates the fake reports as
+taken (real zone data never covers everything) plus ``--filler`` unrelated
+names, so lookups hit a realistically large file.
+
+    python -m benchmarks.bench_suggestions --keywords 200 --filler 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.cache import caches
+
+from benchmarks.bench_search_fanout import percentile
+from benchmarks.fake_godaddy import FakeGoDaddyServer, is_available
+from service.suggestions import get_index, suggest_domains
+from service.taken_filter import rebuild, taken_filter
+
+
+def make_keywords(count, seed=1):
+    """Two word keywords like ``quickcoffee``, the kind whose exact name is usually taken."""
+    words = sorted(get_index().synonyms)
+    generator = random.Random(seed)
+    return [f"{generator.choice(words)}{generator.choice(words)}" for _ in range(count)]
+
+
+def seed_taken_filter(keywords, coverage, filler, seed=1):
+    generator = random.Random(seed)
+    taken = [
+        domain
+        for keyword in keywords
+        for domain, _, _ in get_index().candidates(keyword, [".com"])
+        if not is_available(domain) and generator.random() < coverage
+    ]
+    taken.extend(f"filler{i}.com" for i in range(filler))
+    seeds, _, _ = rebuild(taken)
+    return seeds
+
+
+def run_searches(keywords):
+    """Run one suggestion search per keyword on cold caches, returns (timings ms, lookups, suggestions)."""
+    timings, lookups, found = [], [], []
+    for keyword in keywords:
+        caches[settings.AVAILABILITY_CACHE_ALIAS].clear()
+        started = time.perf_counter()
+        result = suggest_domains(keyword, [".com"])
+        timings.append((time.perf_counter() - started) * 1000)
+        lookups.append(result["stats"]["looked_up"])
+        found.append(len(result["suggestions"]))
+    return timings, lookups, found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--keywords", type=int, default=200, help="suggestion searches per run")
+    parser.add_argument("--coverage", type=float, default=0.8, help="share of taken candidates in the taken set")
+    parser.add_argument("--filler", type=int, default=1_000_000, help="unrelated names added to the taken set")
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream latency in seconds")
+    args = parser.parse_args(argv)
+
+    keywords = make_keywords(args.keywords)
+    index = get_index()
+
+    started = time.perf_counter()
+    candidates = [candidate for keyword in keywords for candidate in index.candidates(keyword, [".com"])]
+    elapsed = time.perf_counter() - started
+    print(f"generated {len(candidates)} candidates in {elapsed:.2f}s: {len(candidates) / elapsed:,.0f}/s")
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "taken_filter.bloom")
+    settings.TAKEN_FILTER_PATH = path
+    settings.TAKEN_FILTER_JOURNAL_PATH = os.path.join(directory, "taken_filter.journal")
+    started = time.perf_counter()
+    count = seed_taken_filter(keywords, args.coverage, args.filler)
+    print(f"built a taken filter of {count:,} domains ({os.path.getsize(path) / 2**20:.1f} MiB) "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    settings.GODADDY_RATE_LIMIT = 0  # The fake has no quota to protect
+    with FakeGoDaddyServer(args.latency, 0.01, seed=1) as server:
+        settings.GODADDY_API_URL = server.url
+        print(f"\n{'filter':<10} {'lookups/search':>15} {'p50 ms':>9} {'p99 ms':>9} {'suggestions':>12}")
+        results = {}
+        for label, filter_path in [("off", os.path.join(directory, "missing.bloom")), ("seeded", path)]:
+            settings.TAKEN_FILTER_PATH = filter_path
+            if label == "seeded":
+                taken = taken_filter()
+                started = time.perf_counter()
+                hits = sum(domain in taken for domain, _, _ in candidates)
+                elapsed = time.perf_counter() - started
+            timings, lookups, found = run_searches(keywords)
+            results[label] = statistics.mean(lookups)
+            print(
+                f"{label:<10} {statistics.mean(lookups):>15.1f} {statistics.median(timings):>9.1f} "
+                f"{percentile(timings, 99):>9.1f} {statistics.mean(found):>12.1f}"
+            )
+
+    print(f"\ntaken filter membership: {len(candidates) / elapsed:,.0f} lookups/s, {hits / len(candidates):.1%} of candidates pruned")
+    print(f"candidates per search: {len(candidates) / len(keywords):.1f}")
+    print(f"upstream lookups saved per search: {results['off'] - results['seeded']:.1f} "
+          f"({1 - results['seeded'] / results['off']:.1%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Benchmark the taken-domain Bloom filter.
+
+Builds a filter from ``--seeds`` synthetic zone entries, measures its size,
+build time, lookup rate and real false positive rate against the configured
+one, then runs Zipf distributed searches for short popular words against a
+local fake GoDaddy server with the filter off and on, and compares the
+upstream requests per search. The availability cache is cleared before each
+search, as if the searches were spread over more than its TTL.
+
+    python -m benchmarks.bench_taken_filter --seeds 1000000 --searches 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.cache import caches
+
+from benchmarks.bench_search_fanout import EXTENSIONS, percentile
+from benchmarks.fake_godaddy import FakeGoDaddyServer, is_available
+from service.availability import search_available_domains
+from service.suggestions import get_index
+from service.taken_filter import rebuild, taken_filter
+
+
+def zipf_keywords(count, seed=1):
+    """``count`` searches over the index's words, the most popular words searched most."""
+    words = sorted(get_index().vocabulary)
+    generator = random.Random(seed)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    return generator.choices(words, weights, k=count)
+
+
+def run_searches(keywords, extensions, server):
+    timings = []
+    handled = server.handled
+    for keyword in keywords:
+        caches[settings.AVAILABILITY_CACHE_ALIAS].clear()
+        started = time.perf_counter()
+        search_available_domains(keyword, extensions, bulk=False)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, (server.handled - handled) / len(keywords)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seeds", type=int, default=1_000_000, help="synthetic zone entries in the filter")
+    parser.add_argument("--error-rate", type=float, default=settings.TAKEN_FILTER_ERROR_RATE)
+    parser.add_argument("--searches", type=int, default=500)
+    parser.add_argument("--extensions", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream latency in seconds")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    settings.TAKEN_FILTER_PATH = os.path.join(directory, "taken_filter.bloom")
+    settings.TAKEN_FILTER_JOURNAL_PATH = os.path.join(directory, "taken_filter.journal")
+    extensions = EXTENSIONS[:args.extensions]
+    keywords = zipf_keywords(args.searches)
+
+    # Half of the popular names that are taken are in the zone data, the rest is learned from answers
+    popular = [f"{word}{ext}" for word in set(keywords) for ext in extensions]
+    seeds = [f"zone{i}.com" for i in range(args.seeds)]
+    seeds += [domain for domain in popular[::2] if not is_available(domain)]
+
+    started = time.perf_counter()
+    rebuild(seeds, capacity=len(seeds), error_rate=args.error_rate)
+    elapsed = time.perf_counter() - started
+    bloom = taken_filter()
+    print(
+        f"built from {len(seeds):,} names in {elapsed:.1f}s: {len(bloom.bits) / 2**20:.2f} MiB, "
+        f"{len(bloom.bits) * 8 / len(seeds):.1f} bits/name, {bloom.hashes} hashes"
+    )
+
+    probes = [f"free{i}.com" for i in range(200_000)]
+    started = time.perf_counter()
+    false_positives = sum(domain in bloom for domain in probes)
+    elapsed = time.perf_counter() - started
+    print(
+        f"false positives {false_positives / len(probes):.3%} (configured {args.error_rate:.3%}), "
+        f"{len(probes) / elapsed:,.0f} lookups/s"
+    )
+
+    settings.GODADDY_RATE_LIMIT = 0  # The fake has no quota to protect
+    with FakeGoDaddyServer(args.latency, 0.01, seed=1) as server:
+        settings.GODADDY_API_URL = server.url
+        print(f"\n{'filter':<8} {'requests/search':>16} {'p50 ms':>9} {'p99 ms':>9}")
+        results = {}
+        for label, path in [("off", os.path.join(directory, "missing.bloom")), ("on", settings.TAKEN_FILTER_PATH)]:
+            settings.TAKEN_FILTER_PATH = path
+            timings, requests = run_searches(keywords, extensions, server)
+            results[label] = requests
+            print(f"{label:<8} {requests:>16.2f} {statistics.median(timings):>9.1f} {percentile(timings, 99):>9.1f}")
+    print(f"\nupstream requests saved per search: {results['off'] - results['on']:.2f} "
+          f"({1 - results['on'] / results['off']:.1%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+End-to-end benchmark: search -> checkout -> payment webhook -> purchase.
+
+The app runs in this process behind a threaded WSGI server on a throwaway
+SQLite database; the fake GoDaddy and Stripe servers run in their own
+processes. Each virtual customer searches a keyword, opens a checkout
+session for the first available domain, pays it on the fake Stripe (which
+sends the signed webhook back to the app, drained by a background
+process_webhooks loop) and buys the domain. Every concurrency level runs
+``--flows`` customers.
+
+The report (throughput, errors and p50/p95/p99 per step) is written as JSON
+named after the current commit, so runs can be compared across commits:
+
+    python -m benchmarks.e2e --concurrency 1,8,32 --flows 200
+    python -m benchmarks.e2e --compare benchmarks/results/e2e-<old commit>.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections
+
+from benchmarks.bench_search_fanout import EXTENSIONS, percentile
+from benchmarks.fake_godaddy import FakeGoDaddyServer, serve_in_process
+from benchmarks.fake_stripe import WEBHOOK_SECRET, FakeStripeServer
+from benchmarks.loadtest_sync_async import use_temporary_database
+from service.webhooks import process_batch
+
+STEPS = ["search", "checkout", "pay", "purchase", "flow"]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def contact(i):
+    return {
+        "email": f"customer{i}@example.com",
+        "first_name": "Ada",
+        "last_name": "Lovelace",
+        "phone": "+1.5555550100",
+        "address1": "1 Main St",
+        "city": "Springfield",
+        "state": "IL",
+        "postal_code": "62701",
+        "country": "US",
+    }
+
+
+def flow(app_url, i, run_id):
+    """One customer's journey, returns ``(step timings in ms, error or None)``."""
+    session = requests.Session()
+    timings = {}
+    details = contact(i)
+    started = time.perf_counter()
+
+    def step(name, method, url, **kwargs):
+        step_started = time.perf_counter()
+        response = session.request(method, url, timeout=30, **kwargs)
+        timings[name] = (time.perf_counter() - step_started) * 1000
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        keyword = f"e2e{run_id}x{i}"
+        found = step("search", "POST", f"{app_url}/list-domains/", json={
+            "domain_name": keyword, "extensions": EXTENSIONS[:5], "fresh": True,
+        })
+        if found["available_domains"]:
+            # Checkout and purchase are priced from the search result's quote
+            terms = {"quote_id": found["available_domains"][0]["quote_id"]}
+            domain = found["available_domains"][0]["domain"]
+        else:
+            terms = {}
+            domain = f"{keyword}.com"
+        checkout = step("checkout", "POST", f"{app_url}/checkout-session/", json={
+            "name": domain, "price": "11.99", "period": 1, "email": details["email"], **terms,
+        })
+        step("pay", "GET", checkout["session"])
+        step("purchase", "POST", f"{app_url}/purchase-domain/", json={
+            "domain_name": domain, "period": 1, "amount": 1199, "currency": "usd", **details, **terms,
+        })
+    except (requests.RequestException, KeyError, ValueError) as error:
+        return timings, f"{type(error).__name__}: {error}"
+    timings["flow"] = (time.perf_counter() - started) * 1000
+    return timings, None
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        "p50": statistics.median(values),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": statistics.mean(values),
+    }
+
+
+def run_level(app_url, concurrency, flows, run_id):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda i: flow(app_url, i, f"{run_id}c{concurrency}"), range(flows)))
+    elapsed = time.perf_counter() - started
+    errors = [error for _, error in results if error]
+    completed = flows - len(errors)
+    return {
+        "concurrency": concurrency,
+        "flows": flows,
+        "completed": completed,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "elapsed": elapsed,
+        "throughput": completed / elapsed,
+        "steps": {name: summarize([t[name] for t, _ in results if name in t]) for name in STEPS},
+    }
+
+
+def drain_webhooks(stop):
+    while not stop.is_set():
+        close_old_connections()
+        if not process_batch():
+            stop.wait(0.2)
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report):
+    print(f"commit {report['commit']}  upstream latency {report['config']['latency'] * 1000:.0f}ms"
+          f"  error rate {report['config']['error_rate']:.1%}")
+    print(f"{'conc':>5} {'flows/s':>8} {'errors':>7}  " + "  ".join(f"{name + ' p50/p95/p99 ms':>26}" for name in STEPS))
+    for level in report["levels"]:
+        cells = []
+        for name in STEPS:
+            stats = level["steps"][name]
+            cells.append(f"{stats['p50']:>8.1f} {stats['p95']:>8.1f} {stats['p99']:>8.1f}" if stats else f"{'-':>26}")
+        print(f"{level['concurrency']:>5} {level['throughput']:>8.2f} {level['errors']:>7}  " + "  ".join(cells))
+
+
+def print_comparison(baseline, report):
+    """Relative change of throughput and step percentiles per concurrency level, negative is faster."""
+    print(f"\nchange from {baseline['commit']} to {report['commit']}")
+    print(f"{'conc':>5} {'flows/s':>9}  " + "  ".join(f"{name + ' p50/p99':>18}" for name in STEPS))
+    levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in report["levels"]:
+        old = levels.get(level["concurrency"])
+        if old is None:
+            continue
+
+        def change(new, previous):
+            return f"{(new - previous) / previous:>+8.1%}" if previous else f"{'-':>8}"
+
+        cells = []
+        for name in STEPS:
+            new, previous = level["steps"][name], old["steps"][name]
+            if new and previous:
+                cells.append(f"{change(new['p50'], previous['p50'])} {change(new['p99'], previous['p99'])}")
+            else:
+                cells.append(f"{'-':>17}")
+        print(f"{level['concurrency']:>5} {change(level['throughput'], old['throughput'])}  " + "  ".join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--flows", type=int, default=100, help="customers per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra uniform upstream latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream requests that fail")
+    parser.add_argument("--output", help="report path, default benchmarks/results/e2e-<commit>.json")
+    parser.add_argument("--compare", help="earlier report to compare this run with")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    use_temporary_database()
+    settings.WEBHOOK_ENDPOINT_SECRET = WEBHOOK_SECRET
+    settings.ALLOWED_HOSTS = ["*"]
+    server = make_server("127.0.0.1", 0, get_wsgi_application(), ThreadingWSGIServer, QuietHandler)
+    app_url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stop = threading.Event()
+    threading.Thread(target=drain_webhooks, args=(stop,), daemon=True).start()
+
+    upstream = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    with serve_in_process(FakeGoDaddyServer, seed=1, **upstream) as godaddy_url, \
+            serve_in_process(FakeStripeServer, seed=2, webhook_url=f"{app_url}/stripe-webhook/", **upstream) as stripe_url:
+        settings.GODADDY_API_URL = godaddy_url
+        settings.GODADDY_RATE_LIMIT = 0  # The fake has no quota to protect
+        stripe.api_base = stripe_url
+
+        run_id = int(time.time())
+        levels = [
+            run_level(app_url, int(concurrency), args.flows, run_id)
+            for concurrency in args.concurrency.split(",")
+        ]
+    stop.set()
+    server.shutdown()
+
+    report = {
+        "commit": commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"flows": args.flows, **upstream},
+        "levels": levels,
+    }
+    print_report(report)
+    if baseline:
+        print_comparison(baseline, report)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{report['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"\nreport written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+A tiny stand-in for the GoDaddy domains API used by the benchmarks.
+
+Every request sleeps for an injected latency before answering so the
+benchmarks see realistic round trip times without touching the network.
+Run it on its own with ``python -m benchmarks.serve_fakes``.
+"""
+import itertools
+import json
+import multiprocessing
+import random
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def is_available(domain):
+    # Deterministic so repeated runs agree on which domains are free
+    return zlib.crc32(domain.lower().encode()) % 3 == 0
+
+
+def availability(domain):
+    return {
+        "available": is_available(domain),
+        "currency": "USD",
+        "definitive": True,
+        "domain": domain,
+        "period": 1,
+        "price": 11990000,
+    }
+
+
+class FakeGoDaddyHandler(BaseHTTPRequestHandler):
+    # Keep-alive like the real API, so connection reuse shows up in the numbers
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_rate_limited(self):
+        """Answer 429 past the server's ``quota`` of requests per second, returns True if it did."""
+        if not self.server.over_quota():
+            return False
+        if self.command == "POST":
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_json({"code": "TOO_MANY_REQUESTS", "message": "Quota exceeded", "retryAfterSec": 1}, status=429)
+        return True
+
+    def send_injected_error(self):
+        """Answer ``error_rate`` of the requests with ``error_status``, returns True if it did."""
+        if not self.server.inject_error():
+            return False
+        if self.command == "POST":
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_json({"code": "UNEXPECTED_ERROR", "message": "Injected error"}, status=self.server.error_status)
+        return True
+
+    def do_GET(self):
+        self.server.handled += 1
+        self.server.sleep()
+        if self.send_rate_limited() or self.send_injected_error():
+            return
+        url = urlparse(self.path)
+        if url.path == "/v1/domains/available":
+            domain = parse_qs(url.query).get("domain", [""])[0]
+            return self.send_json(availability(domain))
+        if url.path == "/v1/domains/agreements":
+            tlds = parse_qs(url.query).get("tlds", [])
+            return self.send_json([
+                {"agreementKey": "DNRA", "title": "Domain Name Registration Agreement", "url": "https://example.com/dnra"}
+            ] + [
+                {"agreementKey": f"{tld.upper()}_TERMS", "title": f".{tld} terms", "url": "https://example.com/terms"}
+                for tld in tlds if tld not in ("com", "net", "org")
+            ])
+        self.send_json({"code": "NOT_FOUND", "message": "Unknown path"}, status=404)
+
+    def do_POST(self):
+        self.server.handled += 1
+        self.server.sleep()
+        if self.send_rate_limited() or self.send_injected_error():
+            return
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"null")
+        if url.path == "/v1/domains/available":
+            return self.send_json(self.server.bulk_availability(body), status=200)
+        if url.path == "/v1/domains/purchase":
+            return self.send_json(self.server.purchase(body))
+        if url.path.endswith("/verifyRegistrantEmail"):
+            return self.send_json({})
+        self.send_json({"code": "NOT_FOUND", "message": "Unknown path"}, status=404)
+
+
+class FakeGoDaddyServer(ThreadingHTTPServer):
+    """
+    Serve the fake API on ``127.0.0.1`` in a background thread.
+
+    ``latency`` is the base delay in seconds, ``jitter`` adds a uniform random
+    delay on top, and ``slow_rate`` of the requests take ``slow_latency``
+    instead to model a long tail. ``error_rate`` of the requests are answered
+    with ``error_status`` instead, and ``bulk_error_rate`` of the domains in a
+    bulk availability call come back in ``errors`` instead of ``domains``.
+    Past ``quota`` requests in a second (0 for no quota) requests get a 429,
+    like GoDaddy's per key rate limit. ``port`` 0 picks a free port.
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+    handler_class = FakeGoDaddyHandler
+
+    def __init__(self, latency=0.05, jitter=0.02, slow_rate=0.0, slow_latency=1.0,
+                 bulk_error_rate=0.0, seed=None, error_rate=0.0, error_status=503, port=0, quota=0):
+        super().__init__(("127.0.0.1", port), self.handler_class)
+        self.quota = quota
+        self.quota_window = (0, 0)  # (second, requests seen in it)
+        self.quota_lock = threading.Lock()
+        self.rate_limited = 0
+        self.handled = 0  # requests received, for benchmarks counting upstream calls
+        self.bulk_error_rate = bulk_error_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.orders = itertools.count(1000)
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.random = random.Random(seed)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def sleep(self):
+        if self.slow_rate and self.random.random() < self.slow_rate:
+            time.sleep(self.slow_latency)
+        else:
+            time.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+    def over_quota(self):
+        if not self.quota:
+            return False
+        with self.quota_lock:
+            second, seen = self.quota_window
+            now = int(time.time())
+            seen = seen + 1 if second == now else 1
+            self.quota_window = (now, seen)
+            if seen > self.quota:
+                self.rate_limited += 1
+                return True
+        return False
+
+    def inject_error(self):
+        return bool(self.error_rate) and self.random.random() < self.error_rate
+
+    def bulk_availability(self, domains):
+        result = {"domains": [], "errors": []}
+        for domain in domains[:500]:
+            if self.bulk_error_rate and self.random.random() < self.bulk_error_rate:
+                result["errors"].append({
+                    "code": "UNEXPECTED_ERROR",
+                    "domain": domain,
+                    "message": "Availability could not be determined",
+                    "status": 500,
+                })
+            else:
+                result["domains"].append(availability(domain))
+        return result
+
+    def purchase(self, payload):
+        return {
+            "currency": "USD",
+            "itemCount": 1,
+            "orderId": next(self.orders),
+            "total": 11990000 * int(payload.get("period", 1)),
+        }
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def _serve(server_class, args, kwargs, connection):
+    server = server_class(*args, **kwargs)
+    connection.send(server.url)
+    server.serve_forever()
+
+
+@contextmanager
+def serve_in_process(server_class, *args, **kwargs):
+    """
+    Run a fake server in a child process and yield its URL.
+
+    Keeps the fake's request handling off the benchmarked process' GIL, which
+    matters once hundreds of requests are in flight.
+    """
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_serve, args=(server_class, args, kwargs, child), daemon=True
+    )
+    process.start()
+    try:
+        yield parent.recv()
+    finally:
+        process.terminate()
+        process.join()
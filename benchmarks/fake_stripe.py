@@ -0,0 +1,134 @@
+"""
+A tiny stand-in for the Stripe checkout sessions API and its webhooks, used by the benchmarks.
+
+Point ``stripe.api_base`` at ``FakeStripeServer.url`` to use it. Visiting a
+session's ``url`` pays it, like a customer finishing the checkout: the
+session turns ``complete``/``paid`` and, when a ``webhook_url`` is set, a
+``checkout.session.completed`` event signed with ``webhook_secret`` is
+delivered to it the way Stripe signs them.
+"""
+import hashlib
+import hmac
+import itertools
+import json
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from benchmarks.fake_godaddy import FakeGoDaddyHandler, FakeGoDaddyServer
+
+WEBHOOK_SECRET = "whsec_benchmark"
+
+
+def sign(payload, secret=WEBHOOK_SECRET, timestamp=None):
+    """A Stripe-Signature header for ``payload``, as Stripe computes it."""
+    timestamp = timestamp or int(time.time())
+    signed = f"{timestamp}.{payload.decode()}".encode()
+    digest = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+class FakeStripeHandler(FakeGoDaddyHandler):
+    def do_GET(self):
+        self.server.sleep()
+        if self.send_injected_error():
+            return
+        url = urlparse(self.path)
+        prefix = "/v1/checkout/sessions/"
+        if url.path.startswith(prefix):
+            session = self.server.sessions.get(url.path[len(prefix):])
+            if session:
+                return self.send_json(session)
+        if url.path.startswith("/pay/"):
+            session = self.server.complete(url.path[len("/pay/"):])
+            if session:
+                return self.send_json(session)
+        self.send_json({"error": {"type": "invalid_request_error", "message": "No such session"}}, status=404)
+
+    def do_POST(self):
+        self.server.sleep()
+        if self.send_injected_error():
+            return
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        if url.path == "/v1/checkout/sessions":
+            return self.send_json(self.server.create_session(form))
+        self.send_json({"error": {"type": "invalid_request_error", "message": "Unknown path"}}, status=404)
+
+
+class FakeStripeServer(FakeGoDaddyServer):
+    """Serves ``/v1/checkout/sessions`` with the same latency and error injection as the GoDaddy fake."""
+
+    handler_class = FakeStripeHandler
+
+    def __init__(self, latency=0.05, jitter=0.02, slow_rate=0.0, slow_latency=1.0, seed=None,
+                 error_rate=0.0, error_status=503, port=0, webhook_url=None, webhook_secret=WEBHOOK_SECRET):
+        super().__init__(
+            latency, jitter, slow_rate, slow_latency, seed=seed,
+            error_rate=error_rate, error_status=error_status, port=port,
+        )
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.events = itertools.count(1)
+        self.webhooks = requests.Session()
+
+    def create_session(self, form):
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "amount_total": int(form.get("line_items[0][price_data][unit_amount]", ["0"])[0]),
+            "customer_email": form.get("customer_email", [None])[0],
+            "mode": form.get("mode", ["payment"])[0],
+            "payment_status": "unpaid",
+            "status": "open",
+            "url": f"{self.url}/pay/{session_id}",
+        }
+        with self.sessions_lock:
+            self.sessions[session_id] = session
+        return session
+
+    def complete(self, session_id):
+        """Pay the session and send its webhook, returns the session or None if it does not exist."""
+        with self.sessions_lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            session.update(payment_status="paid", status="complete")
+        event = self.event("checkout.session.completed", session)
+        if self.webhook_url:
+            threading.Thread(target=self.deliver, args=(event,), daemon=True).start()
+        return session
+
+    def event(self, event_type, data_object):
+        return {
+            "id": f"evt_test_{next(self.events)}_{uuid.uuid4().hex[:8]}",
+            "object": "event",
+            "type": event_type,
+            "created": int(time.time()),
+            "data": {"object": dict(data_object)},
+        }
+
+    def deliver(self, event, attempts=3):
+        """POST ``event`` to ``webhook_url`` with a Stripe-Signature header, retrying failed deliveries."""
+        payload = json.dumps(event).encode()
+        for attempt in range(attempts):
+            try:
+                response = self.webhooks.post(
+                    self.webhook_url,
+                    data=payload,
+                    headers={"Content-Type": "application/json", "Stripe-Signature": sign(payload, self.webhook_secret)},
+                    timeout=10,
+                )
+                if response.status_code < 300:
+                    return True
+            except requests.RequestException:
+                pass
+            time.sleep(0.1 * 2 ** attempt)
+        return False
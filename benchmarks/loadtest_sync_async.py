@@ -0,0 +1,192 @@
+"""
+Compare the sync (WSGI) and async (ASGI) views under concurrent load.
+
+Both applications run in this process against local fake GoDaddy and Stripe
+servers (each in its own process) and a throwaway SQLite database. The WSGI
+side is driven by a fixed pool of threads, like one threaded sync worker; the
+ASGI side runs every request as a task on one event loop, like one uvicorn
+worker.
+
+    python -m benchmarks.loadtest_sync_async --scenario search --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+import stripe
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+
+from benchmarks.bench_search_fanout import EXTENSIONS, percentile
+from benchmarks.fake_godaddy import FakeGoDaddyServer, serve_in_process
+from benchmarks.fake_stripe import FakeStripeServer
+
+SCENARIOS = {
+    # name: (sync path, async path, request body for the i-th request)
+    "search": (
+        "/list-domains/",
+        "/async/list-domains/",
+        lambda i: {"domain_name": f"loadtest{i}", "extensions": EXTENSIONS[:3], "fresh": True, "bulk": False},
+    ),
+    "checkout": (
+        "/checkout-session/",
+        "/async/checkout-session/",
+        lambda i: {"name": f"loadtest{i}.com", "price": "11.99", "period": 1, "email": f"user{i}@example.com"},
+    ),
+}
+
+
+def use_temporary_database():
+    """Point the default database at an empty, migrated SQLite file."""
+    path = os.path.join(tempfile.mkdtemp(), "loadtest.sqlite3")
+    settings.DATABASES["default"]["NAME"] = path
+    connections["default"].close()
+    connections["default"].settings_dict["NAME"] = path
+    call_command("migrate", verbosity=0)
+
+
+def wsgi_request(application, path, body):
+    payload = json.dumps(body).encode()
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": path,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "8000",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(payload)),
+        "wsgi.input": io.BytesIO(payload),
+        "wsgi.url_scheme": "http",
+        "wsgi.errors": sys.stderr,
+    }
+    statuses = []
+    chunks = application(environ, lambda status, headers: statuses.append(status))
+    b"".join(chunks)
+    return int(statuses[0].split()[0])
+
+
+async def asgi_request(application, path, body):
+    payload = json.dumps(body).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+        ],
+        "server": ("localhost", 8000),
+        "client": ("127.0.0.1", 50000),
+    }
+    messages = [{"type": "http.request", "body": payload, "more_body": False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.sleep(3600)  # nothing more to send, wait to be cancelled
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def run_wsgi(path, make_body, requests, threads):
+    application = get_wsgi_application()
+    timings = []
+    errors = 0
+
+    def one(i):
+        started = time.perf_counter()
+        code = wsgi_request(application, path, make_body(i))
+        return code, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for code, elapsed in executor.map(one, range(requests)):
+            timings.append(elapsed)
+            errors += code != 200
+    return time.perf_counter() - started, timings, errors
+
+
+def run_asgi(path, make_body, requests, concurrency):
+    application = get_asgi_application()
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with semaphore:
+                started = time.perf_counter()
+                code = await asgi_request(application, path, make_body(i))
+                return code, (time.perf_counter() - started) * 1000
+
+        return await asyncio.gather(*(one(i) for i in range(requests)))
+
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    return elapsed, [ms for code, ms in results], sum(code != 200 for code, ms in results)
+
+
+def report(label, elapsed, timings, errors):
+    print(
+        f"{label:<6} {len(timings) / elapsed:>10.1f} {statistics.median(timings):>9.1f} "
+        f"{percentile(timings, 99):>9.1f} {errors:>7}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="search")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent clients for the ASGI run")
+    parser.add_argument("--threads", type=int, default=8, help="worker threads for the WSGI run")
+    parser.add_argument("--latency", type=float, default=0.25, help="upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra uniform upstream latency in seconds")
+    args = parser.parse_args(argv)
+
+    use_temporary_database()
+    sync_path, async_path, make_body = SCENARIOS[args.scenario]
+
+    with serve_in_process(FakeGoDaddyServer, args.latency, args.jitter, seed=1) as godaddy_url, \
+            serve_in_process(FakeStripeServer, args.latency, args.jitter, seed=2) as stripe_url:
+        settings.GODADDY_API_URL = godaddy_url
+        settings.GODADDY_RATE_LIMIT = 0  # The fake has no quota to protect
+        stripe.api_base = stripe_url
+
+        print(f"scenario={args.scenario} requests={args.requests} upstream latency={args.latency * 1000:.0f}ms")
+        print(f"{'path':<6} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        wsgi = run_wsgi(sync_path, make_body, args.requests, args.threads)
+        asgi = run_asgi(async_path, make_body, args.requests, args.concurrency)
+        report("wsgi", *wsgi)
+        report("asgi", *asgi)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
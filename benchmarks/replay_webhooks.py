@@ -0,0 +1,132 @@
+"""
+Replay signed Stripe webhook events against the stripe-webhook endpoint.
+
+Events are signed with a local test secret and posted through the WSGI
+application by a pool of threads (a fraction of them twice, like Stripe
+retries), then the inbox is drained with process_webhooks batches. The drain
+is repeated one event per batch to compare with row-by-row processing.
+
+    python -m benchmarks.replay_webhooks --events 5000 --threads 8
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections
+
+from benchmarks.bench_search_fanout import percentile
+from benchmarks.fake_stripe import WEBHOOK_SECRET as SECRET, sign
+from benchmarks.loadtest_sync_async import use_temporary_database
+from service.models import CheckoutSession, WebhookEvent
+from service.webhooks import process_batch
+
+
+def checkout_completed(i):
+    return {
+        "id": f"evt_bench_{i}",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "created": int(time.time()),
+        "data": {"object": {"id": f"cs_bench_{i}", "object": "checkout.session", "payment_status": "paid"}},
+    }
+
+
+def post(application, payload):
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/stripe-webhook/",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "8000",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(payload)),
+        "HTTP_STRIPE_SIGNATURE": sign(payload),
+        "wsgi.input": io.BytesIO(payload),
+        "wsgi.url_scheme": "http",
+        "wsgi.errors": sys.stderr,
+    }
+    statuses = []
+    b"".join(application(environ, lambda status, headers: statuses.append(status)))
+    return int(statuses[0].split()[0])
+
+
+def ingest(payloads, threads):
+    application = get_wsgi_application()
+
+    def one(payload):
+        started = time.perf_counter()
+        code = post(application, payload)
+        close_old_connections()
+        return code, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(one, payloads))
+    return time.perf_counter() - started, [ms for code, ms in results], sum(code != 200 for code, ms in results)
+
+
+def drain(batch_size):
+    started = time.perf_counter()
+    applied = 0
+    while True:
+        processed = process_batch(batch_size)
+        if not processed:
+            return time.perf_counter() - started, applied
+        applied += processed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="fraction of events delivered twice")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=settings.WEBHOOK_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    use_temporary_database()
+    settings.WEBHOOK_ENDPOINT_SECRET = SECRET
+    CheckoutSession.objects.bulk_create(
+        CheckoutSession(
+            session_id=f"cs_bench_{i}", domain_name=f"bench{i}.com", email=f"user{i}@example.com",
+            period=1, price=1199, currency="usd",
+        )
+        for i in range(args.events)
+    )
+    payloads = [json.dumps(checkout_completed(i)).encode() for i in range(args.events)]
+    random.seed(1)
+    payloads += random.sample(payloads, int(args.events * args.duplicates))
+    random.shuffle(payloads)
+
+    elapsed, timings, errors = ingest(payloads, args.threads)
+    print(f"ingest   {len(payloads)} deliveries, {WebhookEvent.objects.count()} stored events, {errors} errors")
+    print(
+        f"         {len(payloads) / elapsed:.1f} req/s  p50 {statistics.median(timings):.2f} ms"
+        f"  p99 {percentile(timings, 99):.2f} ms"
+    )
+
+    elapsed, applied = drain(args.batch_size)
+    paid = CheckoutSession.objects.filter(payment_status="paid").count()
+    print(f"drain    batch={args.batch_size:<5} {applied / elapsed:>10.1f} events/s  ({paid} sessions paid)")
+
+    WebhookEvent.objects.update(processed_at=None)
+    CheckoutSession.objects.update(payment_status="", paid_at=None, payment_status_at=None)
+    elapsed, applied = drain(1)
+    print(f"drain    batch=1     {applied / elapsed:>10.1f} events/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
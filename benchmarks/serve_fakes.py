@@ -0,0 +1,48 @@
+"""
+Run the fake GoDaddy and Stripe servers on fixed ports for manual testing.
+
+    python -m benchmarks.serve_fakes --latency 0.1 --error-rate 0.02 \\
+        --webhook-url http://127.0.0.1:8000/stripe-webhook/
+
+then start the app with the printed environment variables, e.g.
+``GODADDY_API_URL=http://127.0.0.1:8001 STRIPE_API_BASE=http://127.0.0.1:8002
+WEBHOOK_ENDPOINT_SECRET=whsec_benchmark python manage.py runserver``.
+"""
+import argparse
+import sys
+import threading
+
+from benchmarks.fake_godaddy import FakeGoDaddyServer
+from benchmarks.fake_stripe import WEBHOOK_SECRET, FakeStripeServer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--godaddy-port", type=int, default=8001)
+    parser.add_argument("--stripe-port", type=int, default=8002)
+    parser.add_argument("--latency", type=float, default=0.05, help="base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra uniform latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--webhook-url", help="where to deliver checkout.session.completed events")
+    parser.add_argument("--webhook-secret", default=WEBHOOK_SECRET)
+    args = parser.parse_args(argv)
+
+    options = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, error_status=args.error_status)
+    godaddy = FakeGoDaddyServer(port=args.godaddy_port, **options)
+    stripe = FakeStripeServer(
+        port=args.stripe_port, webhook_url=args.webhook_url, webhook_secret=args.webhook_secret, **options
+    )
+    print(f"GODADDY_API_URL={godaddy.url}")
+    print(f"STRIPE_API_BASE={stripe.url}")
+    print(f"WEBHOOK_ENDPOINT_SECRET={args.webhook_secret}")
+    threading.Thread(target=godaddy.serve_forever, daemon=True).start()
+    try:
+        stripe.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Concurrent writers against SQLite, with Django's default connection settings and the tuned profile.
+
+Each writer process runs short transactions shaped like the webhook and
+purchase paths: read something, then insert an inbox row and update a
+session. The report shows how many transactions failed with "database is
+locked" and the committed transactions per second.
+
+    python -m benchmarks.stress_sqlite_writers --writers 8 --transactions 300
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "domainserviceprovider.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connections, transaction
+
+PROFILES = {
+    # Django's defaults: rollback journal, deferred transactions, 5s timeout
+    "default": {},
+    "tuned": settings.DATABASES["default"].get("OPTIONS", {}),
+}
+
+
+def use_database(path, options):
+    for settings_dict in (settings.DATABASES["default"], connections["default"].settings_dict):
+        settings_dict["NAME"] = path
+        settings_dict["OPTIONS"] = dict(options)
+    connections["default"].close()
+
+
+def writer(path, options, worker, transactions, results):
+    from service.models import CheckoutSession, WebhookEvent
+
+    use_database(path, options)
+    committed = locked = 0
+    for i in range(transactions):
+        try:
+            with transaction.atomic():
+                # Read first, like the views do, then write
+                session = CheckoutSession.objects.filter(session_id=f"cs_{i % 100}").first()
+                WebhookEvent.objects.create(
+                    event_id=f"evt_{worker}_{i}", type="checkout.session.completed", payload={"n": i}
+                )
+                CheckoutSession.objects.filter(pk=session.pk).update(payment_status="paid")
+            committed += 1
+        except OperationalError as error:
+            if "locked" not in str(error):
+                raise
+            locked += 1
+    connections["default"].close()
+    results.put((committed, locked))
+
+
+def run(profile, writers, transactions):
+    path = os.path.join(tempfile.mkdtemp(), "stress.sqlite3")
+    use_database(path, PROFILES[profile])
+    call_command("migrate", verbosity=0)
+    from service.models import CheckoutSession
+
+    CheckoutSession.objects.bulk_create(
+        CheckoutSession(session_id=f"cs_{i}", domain_name=f"stress{i}.com", email="user@example.com",
+                        period=1, price="11.99", currency="usd")
+        for i in range(100)
+    )
+    connections["default"].close()
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=writer, args=(path, PROFILES[profile], n, transactions, results))
+        for n in range(writers)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    committed = sum(c for c, _ in outcomes)
+    locked = sum(l for _, l in outcomes)
+    total = committed + locked
+    print(f"{profile:<8} {committed:>9} {locked:>7} {100 * locked / total:>7.1f}% {committed / elapsed:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=8, help="writer processes")
+    parser.add_argument("--transactions", type=int, default=300, help="transactions per writer")
+    parser.add_argument("--profile", choices=sorted(PROFILES), action="append", help="default: both")
+    args = parser.parse_args(argv)
+
+    if settings.DATABASES["default"]["ENGINE"] != "django.db.backends.sqlite3":
+        parser.error("the stress test needs the SQLite profile (unset DB_ENGINE)")
+    print(f"writers={args.writers} transactions per writer={args.transactions}")
+    print(f"{'profile':<8} {'committed':>9} {'locked':>7} {'lock %':>8} {'commits/s':>10}")
+    for profile in args.profile or ["default", "tuned"]:
+        run(profile, args.writers, args.transactions)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,6 @@
 from pathlib import Path
 import os
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -33,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'service.middleware.MetricsMiddleware',  # First, so it times the other middleware too
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -68,12 +69,54 @@ WSGI_APPLICATION = 'domainserviceprovider.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=sqlite (default) or postgres, the rest of the profile follows from the environment
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgres':
+    DB_POOL = config('DB_POOL', default=False, cast=bool)  # needs psycopg[pool]
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='domainserviceprovider'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            # Django's pool and persistent connections are mutually exclusive
+            'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                    'max_size': config('DB_POOL_MAX_SIZE', default=20, cast=int),
+                    'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=20, cast=int)  # seconds a writer waits for the lock
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                'timeout': SQLITE_BUSY_TIMEOUT,
+                # Take the write lock when the transaction starts, a deferred
+                # transaction that reads first fails with "database is locked"
+                # as soon as another writer holds the lock, whatever the timeout
+                'transaction_mode': 'IMMEDIATE',
+                # Run on every new connection: readers no longer block the
+                # writer, commits skip the fsync of the WAL and reads go through mmap
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)};"
+                    f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000};'
+                ),
+            },
+        }
     }
-}
 
 
 CORS_ALLOWED_ORIGINS = [
@@ -102,6 +145,47 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Logging: JSON lines on stderr, written by a background thread with PII redacted.
+# LOG_LEVELS sets levels per logger, e.g. LOG_LEVELS=service.views=DEBUG,service.jobs=WARNING
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_DEBUG_SAMPLE_RATE = config('LOG_DEBUG_SAMPLE_RATE', default=0.01, cast=float)  # Share of DEBUG records kept
+LOG_LEVELS = {
+    name.strip(): {'level': level.strip().upper()}
+    for name, _, level in (entry.partition('=') for entry in config('LOG_LEVELS', default='', cast=Csv()))
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sample_debug': {
+            '()': 'service.log.SamplingFilter',
+            'rate': LOG_DEBUG_SAMPLE_RATE,
+        },
+    },
+    'handlers': {
+        'json': {
+            '()': 'service.log.BackgroundJSONHandler',
+            'filters': ['sample_debug'],
+        },
+    },
+    'root': {
+        'handlers': ['json'],
+        'level': 'WARNING',
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['json'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'service': {
+            'level': LOG_LEVEL,
+        },
+        **LOG_LEVELS,
+    },
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -130,7 +214,143 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 GODADDY_API_KEY = config('GODADDY_API_KEY')
 GODADDY_API_SECRET_KEY = config('GODADDY_API_SECRET_KEY')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY')
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='https://api.stripe.com')  # Point at a local stand-in for testing
+
+# GODADDY_ENV picks the OTE (test) or production API, GODADDY_API_URL overrides it (e.g. for a local stub)
+GODADDY_API_URLS = {
+    'ote': 'https://api.ote-godaddy.com',
+    'production': 'https://api.godaddy.com',
+}
+GODADDY_ENV = config('GODADDY_ENV', default='ote')
+GODADDY_API_URL = config('GODADDY_API_URL', default=GODADDY_API_URLS[GODADDY_ENV])
+
+# Pooled keep-alive client shared by every GoDaddy call in a process
+GODADDY_POOL_SIZE = config('GODADDY_POOL_SIZE', default=20, cast=int)  # max kept-alive connections
+GODADDY_CONNECT_TIMEOUT = config('GODADDY_CONNECT_TIMEOUT', default=3.05, cast=float)  # seconds
+GODADDY_READ_TIMEOUT = config('GODADDY_READ_TIMEOUT', default=10.0, cast=float)  # seconds
+GODADDY_MAX_RETRIES = config('GODADDY_MAX_RETRIES', default=2, cast=int)  # retries on 429/5xx and connection errors
+GODADDY_RETRY_BACKOFF = config('GODADDY_RETRY_BACKOFF', default=0.25, cast=float)  # seconds, doubled per retry with full jitter
+
+# Domain search fans out one availability lookup per extension
+GODADDY_SEARCH_CONCURRENCY = config('GODADDY_SEARCH_CONCURRENCY', default=8, cast=int)  # max lookups in flight per search
+GODADDY_SEARCH_DEADLINE = config('GODADDY_SEARCH_DEADLINE', default=5.0, cast=float)  # seconds, slower lookups are reported as pending
+GODADDY_BULK_CHUNK_SIZE = config('GODADDY_BULK_CHUNK_SIZE', default=500, cast=int)  # GoDaddy accepts at most 500 domains per bulk call
+GODADDY_BULK_MIN_DOMAINS = config('GODADDY_BULK_MIN_DOMAINS', default=10, cast=int)  # searches this large use the bulk endpoint
+
+# Availability results are cached per domain for a few seconds to absorb repeated searches.
+# The default backend is per process, point AVAILABILITY_CACHE_BACKEND at e.g.
+# django.core.cache.backends.filebased.FileBasedCache or db.DatabaseCache to share it.
+AVAILABILITY_CACHE_ALIAS = 'availability'
+AVAILABILITY_CACHE_TTL = config('AVAILABILITY_CACHE_TTL', default=10, cast=int)  # seconds
+AVAILABILITY_STALE_TTL = config('AVAILABILITY_STALE_TTL', default=60 * 60, cast=int)  # seconds, served while GoDaddy is unavailable
+
+# Available domains in search results carry a signed quote_id. Checkout and purchase take the price from
+# the quote, as is while it is cached and after a fresh availability check once it dropped out of the
+# cache. Point QUOTE_CACHE_BACKEND at a shared cache so a quote issued by one process is cached for all.
+QUOTE_CACHE_ALIAS = 'quotes'
+QUOTE_TTL = config('QUOTE_TTL', default=5 * 60, cast=int)  # seconds a quote is used without asking GoDaddy again
+QUOTE_MAX_AGE = config('QUOTE_MAX_AGE', default=60 * 60, cast=int)  # seconds after which a quote is refused
+QUOTE_REQUIRED = config('QUOTE_REQUIRED', default=False, cast=bool)  # refuse checkouts and purchases without a quote_id
+
+# Suggestions for taken names (suggest-domains/, or "suggest": true on list-domains/). Candidates in the
+# taken filter below are never looked up.
+SUGGESTIONS_TLDS = config('SUGGESTIONS_TLDS', default='.com,.net,.org,.io,.co', cast=Csv())  # suggested on top of the searched TLDs
+SUGGESTIONS_LIMIT = config('SUGGESTIONS_LIMIT', default=10, cast=int)  # suggestions returned per search
+SUGGESTIONS_MAX_LOOKUPS = config('SUGGESTIONS_MAX_LOOKUPS', default=40, cast=int)  # candidates looked up on GoDaddy per search
+
+# Names known to be registered are answered as taken without asking GoDaddy (searches can opt out with
+# "fresh": true). Run `python manage.py rebuild_taken_filter --every 3600` to create the filter and fold
+# in the names searches saw taken; observations older than the max age are dropped on rebuild.
+TAKEN_FILTER_PATH = config('TAKEN_FILTER_PATH', default=str(BASE_DIR / 'domainserviceprovider' / 'taken_filter.bloom'))
+TAKEN_FILTER_JOURNAL_PATH = config('TAKEN_FILTER_JOURNAL_PATH', default=str(BASE_DIR / 'domainserviceprovider' / 'taken_filter.journal'))
+TAKEN_FILTER_SEED_FILES = config('TAKEN_FILTER_SEED_FILES', default='', cast=Csv())  # zone-style lists, one domain per line
+TAKEN_FILTER_CAPACITY = config('TAKEN_FILTER_CAPACITY', default=1_000_000, cast=int)  # names the filter is sized for at least
+TAKEN_FILTER_ERROR_RATE = config('TAKEN_FILTER_ERROR_RATE', default=0.001, cast=float)  # share of free names reported as taken
+TAKEN_FILTER_MAX_AGE = config('TAKEN_FILTER_MAX_AGE', default=30 * 24 * 60 * 60, cast=int)  # seconds
+
+# Client-side limits for GoDaddy calls. Every call takes a token from a bucket refilled at
+# GODADDY_RATE_LIMIT calls per minute; only purchases (and their agreement lookups) may take the last
+# GODADDY_RATE_LIMIT_RESERVE tokens. The bucket and the circuit breaker live in their own cache, which
+# uses Redis at REDIS_URL when that is set so all processes share them. Otherwise point
+# GODADDY_RATE_LIMIT_CACHE_BACKEND (and GODADDY_RATE_LIMIT_CACHE_LOCATION) at another shared backend
+# whose incr is atomic, which rules out the file and database backends. With a process-local backend
+# every worker process gets the whole quota, `manage.py check` warns about that unless DEBUG is on.
+REDIS_URL = config('REDIS_URL', default='')  # e.g. redis://localhost:6379/0
+GODADDY_RATE_LIMIT_CACHE_ALIAS = 'ratelimit'
+GODADDY_RATE_LIMIT = config('GODADDY_RATE_LIMIT', default=60, cast=int)  # calls per minute, 0 turns the limiter off
+GODADDY_RATE_LIMIT_BURST = config('GODADDY_RATE_LIMIT_BURST', default=10, cast=int)  # tokens saved up while idle
+GODADDY_RATE_LIMIT_RESERVE = config('GODADDY_RATE_LIMIT_RESERVE', default=2, cast=int)  # tokens searches leave to purchases
+GODADDY_RATE_LIMIT_SEARCH_WAIT = config('GODADDY_RATE_LIMIT_SEARCH_WAIT', default=1.0, cast=float)  # seconds a search lookup waits for a token
+GODADDY_RATE_LIMIT_PRIORITY_WAIT = config('GODADDY_RATE_LIMIT_PRIORITY_WAIT', default=10.0, cast=float)  # seconds a purchase call waits for a token
+GODADDY_CIRCUIT_FAILURE_THRESHOLD = config('GODADDY_CIRCUIT_FAILURE_THRESHOLD', default=5, cast=int)  # failures that open the circuit, 0 turns it off
+GODADDY_CIRCUIT_WINDOW = config('GODADDY_CIRCUIT_WINDOW', default=30, cast=int)  # seconds the failures are counted over
+GODADDY_CIRCUIT_COOLDOWN = config('GODADDY_CIRCUIT_COOLDOWN', default=30, cast=int)  # seconds calls fail fast before a trial call
+
+# Legal agreements per TLD almost never change. Entries older than the TTL are refreshed in the
+# background, entries older than the max age are refetched before use.
+GODADDY_AGREEMENT_CACHE_ALIAS = 'default'
+GODADDY_AGREEMENT_TTL = config('GODADDY_AGREEMENT_TTL', default=24 * 60 * 60, cast=int)  # seconds
+GODADDY_AGREEMENT_MAX_AGE = config('GODADDY_AGREEMENT_MAX_AGE', default=7 * 24 * 60 * 60, cast=int)  # seconds
+GODADDY_AGREEMENT_WARM_TLDS = config('GODADDY_AGREEMENT_WARM_TLDS', default='', cast=Csv())  # e.g. com,net,org
+
+# Purchases reference a deduplicated ContactProfile, cached by fingerprint with its prebuilt GoDaddy contact blocks
+CONTACT_PROFILE_CACHE_ALIAS = 'default'
+
+# Purchases can be queued and registered by `python manage.py run_purchase_worker`
+PURCHASE_ASYNC = config('PURCHASE_ASYNC', default=False, cast=bool)  # queue every purchase, clients can also send "async": true
+PURCHASE_WORKERS = config('PURCHASE_WORKERS', default=4, cast=int)  # parallel jobs per worker process
+PURCHASE_JOB_MAX_ATTEMPTS = config('PURCHASE_JOB_MAX_ATTEMPTS', default=5, cast=int)
+PURCHASE_JOB_RETRY_BACKOFF = config('PURCHASE_JOB_RETRY_BACKOFF', default=2.0, cast=float)  # seconds, doubled per attempt with jitter
+PURCHASE_JOB_LOCK_TIMEOUT = config('PURCHASE_JOB_LOCK_TIMEOUT', default=300, cast=int)  # seconds before a running job counts as abandoned
+PURCHASE_BULK_MAX_DOMAINS = config('PURCHASE_BULK_MAX_DOMAINS', default=100, cast=int)  # domains per purchase-domains/ request
+PURCHASE_BULK_CONCURRENCY = config('PURCHASE_BULK_CONCURRENCY', default=4, cast=int)  # registrations in flight per bulk request
+
+# checkout-session-details pages, clients pick a size with ?limit= up to the maximum
+CHECKOUT_SESSIONS_PAGE_SIZE = config('CHECKOUT_SESSIONS_PAGE_SIZE', default=100, cast=int)
+CHECKOUT_SESSIONS_MAX_PAGE_SIZE = config('CHECKOUT_SESSIONS_MAX_PAGE_SIZE', default=1000, cast=int)
+
+# Written by the export_checkout_sessions command, which appends new sessions on each run and keeps
+# its .watermark next to the file (the default directory is not tracked by git)
+EXPORT_BATCH_ROWS = config('EXPORT_BATCH_ROWS', default=20000, cast=int)  # Rows per Parquet row group / Arrow record batch
+CSV_EXPORT_PATH = config('CSV_EXPORT_PATH', default=str(BASE_DIR / 'exports' / 'checkout_sessions.csv'))
+
+# Responses to requests sent with an Idempotency-Key header are kept for replays
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)  # seconds, purge with purge_idempotency_keys
+IDEMPOTENCY_WAIT_TIMEOUT = config('IDEMPOTENCY_WAIT_TIMEOUT', default=30, cast=int)  # seconds a duplicate waits for the first request
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    AVAILABILITY_CACHE_ALIAS: {
+        'BACKEND': config('AVAILABILITY_CACHE_BACKEND', default='service.cache.TTLLRUCache'),
+        'LOCATION': config('AVAILABILITY_CACHE_LOCATION', default='availability'),
+        'TIMEOUT': AVAILABILITY_CACHE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('AVAILABILITY_CACHE_MAX_ENTRIES', default=10000, cast=int),
+            'MAX_BYTES': config('AVAILABILITY_CACHE_MAX_BYTES', default=16 * 1024 * 1024, cast=int),
+        },
+    },
+    QUOTE_CACHE_ALIAS: {
+        'BACKEND': config('QUOTE_CACHE_BACKEND', default='service.cache.TTLLRUCache'),
+        'LOCATION': config('QUOTE_CACHE_LOCATION', default='quotes'),
+        'TIMEOUT': QUOTE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('QUOTE_CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    },
+    GODADDY_RATE_LIMIT_CACHE_ALIAS: {
+        'BACKEND': config(
+            'GODADDY_RATE_LIMIT_CACHE_BACKEND',
+            default='django.core.cache.backends.redis.RedisCache' if REDIS_URL else 'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': config('GODADDY_RATE_LIMIT_CACHE_LOCATION', default=REDIS_URL or 'ratelimit'),
+        'TIMEOUT': None,
+    },
+}
 
 DOMAIN = 'http://localhost:3000'
 WEBHOOK_ENDPOINT_SECRET = config('WEBHOOK_ENDPOINT_SECRET')
+WEBHOOK_BATCH_SIZE = config('WEBHOOK_BATCH_SIZE', default=500, cast=int)  # Events applied per process_webhooks batch
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', default=5, cast=int)  # failed tries before an event is set aside
 
@@ -1,12 +1,12 @@
 from django.contrib import admin
-from .models import CheckoutSession, Purchase
+from .models import CheckoutSession, ContactProfile, IdempotencyKey, Purchase, PurchaseJob, WebhookEvent
 
 
 @admin.register(CheckoutSession)
 class CheckoutSessionAdmin(admin.ModelAdmin):
-    list_display = ['session_id', 'domain_name', 'period', 'price', 'currency', 'created_at']
+    list_display = ['session_id', 'domain_name', 'period', 'price', 'currency', 'payment_status', 'created_at']
     search_fields = ['session_id', 'domain_name']
-    list_filter = ['currency', 'created_at']
+    list_filter = ['currency', 'payment_status', 'created_at']
     readonly_fields = ['created_at']
 
 
@@ -16,20 +16,58 @@ class PurchaseAdmin(admin.ModelAdmin):
         'order_id',
         'checkout_session',
         'get_email',  # Custom method to display email
-        'first_name',
-        'last_name',
+        'contact__first_name',
+        'contact__last_name',
         'amount',
         'currency',
         'status',
         'created_at'
     ]
-    search_fields = ['order_id', 'checkout_session__domain_name', 'first_name', 'last_name']
+    search_fields = ['order_id', 'checkout_session__domain_name', 'contact__first_name', 'contact__last_name']
     list_filter = ['status', 'currency', 'created_at']
+    ordering = ['-created_at']  # Served by the (status, created_at) and created_at indexes
     readonly_fields = ['created_at']
-    raw_id_fields = ['checkout_session']
+    raw_id_fields = ['checkout_session', 'contact']
+    # get_email and __str__ read the session, the names come from the contact profile
+    list_select_related = ['checkout_session', 'contact']
 
     def get_email(self, obj):
         """Retrieve the email from the related CheckoutSession."""
         return obj.checkout_session.email
 
     get_email.short_description = 'Email'  # Column name in the admin interface
+    get_email.admin_order_field = 'checkout_session__email'
+
+
+@admin.register(ContactProfile)
+class ContactProfileAdmin(admin.ModelAdmin):
+    list_display = ['email', 'first_name', 'last_name', 'city', 'country', 'created_at']
+    search_fields = ['email', 'first_name', 'last_name']
+    list_filter = ['country']
+    readonly_fields = ['fingerprint', 'created_at']
+
+
+@admin.register(PurchaseJob)
+class PurchaseJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'purchase', 'status', 'attempts', 'run_after', 'locked_by', 'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'updated_at']
+    raw_id_fields = ['purchase']
+    # Purchase.__str__ shows the session's domain
+    list_select_related = ['purchase__checkout_session']
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'scope', 'status', 'response_status', 'created_at', 'expires_at']
+    search_fields = ['key']
+    list_filter = ['scope', 'status']
+    readonly_fields = ['created_at']
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'type', 'received_at', 'processed_at']
+    search_fields = ['event_id']
+    list_filter = ['type']
+    readonly_fields = ['received_at']
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .godaddy import get_async_client, get_client
+
+
+def fetch_agreements(tlds, privacy="false"):
+    """Fetch the legal agreements GoDaddy requires for registering in ``tlds``."""
+    response = get_client().get_agreements(tlds, privacy)
+    response.raise_for_status()
+    return response.json()
+
+
+class AgreementCache:
+    """
+    Memoizes agreement lookups per (sorted TLDs, privacy flag).
+
+    Entries are kept in the ``GODADDY_AGREEMENT_CACHE_ALIAS`` Django cache, so a
+    shared backend shares them between processes. An entry older than
+    ``GODADDY_AGREEMENT_TTL`` is still served but refreshed on a background
+    thread; only entries older than ``GODADDY_AGREEMENT_MAX_AGE`` (or missing)
+    are fetched on the caller's thread.
+    """
+
+    def __init__(self, fetch=fetch_agreements):
+        self.fetch = fetch
+
+    @property
+    def cache(self):
+        return caches[settings.GODADDY_AGREEMENT_CACHE_ALIAS]
+
+    def key(self, tlds, privacy):
+        tlds = sorted({tld.lower().lstrip(".") for tld in tlds})
+        return f"agreements:{','.join(tlds)}:{str(privacy).lower()}"
+
+    def get(self, tlds, privacy="false"):
+        key = self.key(tlds, privacy)
+        entry = self.cache.get(key)
+        if entry is None:
+            return self.refresh(tlds, privacy)
+
+        agreements, fetched_at = entry
+        if time.time() - fetched_at > settings.GODADDY_AGREEMENT_TTL:
+            self.refresh_in_background(tlds, privacy)
+        return agreements
+
+    def refresh(self, tlds, privacy="false"):
+        agreements = self.fetch(tlds, privacy)
+        self.cache.set(
+            self.key(tlds, privacy),
+            (agreements, time.time()),
+            timeout=settings.GODADDY_AGREEMENT_MAX_AGE,
+        )
+        return agreements
+
+    async def aget(self, tlds, privacy="false"):
+        """Async version of ``get`` for the ASGI views."""
+        entry = await self.cache.aget(self.key(tlds, privacy))
+        if entry is None:
+            return await self.arefresh(tlds, privacy)
+
+        agreements, fetched_at = entry
+        if time.time() - fetched_at > settings.GODADDY_AGREEMENT_TTL:
+            await sync_to_async(self.refresh_in_background)(tlds, privacy)
+        return agreements
+
+    async def arefresh(self, tlds, privacy="false"):
+        response = await get_async_client().get_agreements(tlds, privacy)
+        response.raise_for_status()
+        agreements = response.json()
+        await self.cache.aset(
+            self.key(tlds, privacy),
+            (agreements, time.time()),
+            timeout=settings.GODADDY_AGREEMENT_MAX_AGE,
+        )
+        return agreements
+
+    def refresh_in_background(self, tlds, privacy="false"):
+        # Only one refresh per key at a time, the add() acts as a short lived lock
+        lock_key = f"{self.key(tlds, privacy)}:refreshing"
+        if not self.cache.add(lock_key, True, timeout=60):
+            return
+
+        def run():
+            try:
+                self.refresh(tlds, privacy)
+            except Exception:
+                # Keep serving the stale entry, the next lookup will try again
+                pass
+            finally:
+                self.cache.delete(lock_key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def warm(self, tlds, privacy="false"):
+        """Load the agreements for each TLD on its own, the way purchase_domain asks for them."""
+        for tld in tlds:
+            try:
+                self.refresh([tld], privacy)
+            except Exception:
+                pass
+
+
+agreement_cache = AgreementCache()
@@ -1,6 +1,28 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'service'
+
+    def ready(self):
+        import stripe
+
+        from . import checks  # noqa: F401 (registers the system checks)
+        from .metrics import instrument_stripe
+
+        stripe.api_base = settings.STRIPE_API_BASE
+        instrument_stripe()
+
+        if settings.GODADDY_AGREEMENT_WARM_TLDS:
+            from .agreements import agreement_cache
+
+            # Warm the agreement cache off the startup path for the most purchased TLDs
+            threading.Thread(
+                target=agreement_cache.warm,
+                args=(settings.GODADDY_AGREEMENT_WARM_TLDS,),
+                daemon=True,
+            ).start()
@@ -0,0 +1,195 @@
+"""
+ASGI-native versions of the search, checkout and purchase views.
+
+They behave like their counterparts in ``views.py`` but await GoDaddy through
+the async client, Stripe through its ``*_async`` methods and the database
+through Django's async ORM, so under an ASGI server a request waiting on an
+upstream does not hold a thread.
+"""
+import json
+from datetime import datetime
+
+import httpx
+import stripe
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .agreements import agreement_cache
+from .availability import aiter_search, asearch_available_domains
+from .checkout import checkout_session_params
+from .contacts import find_profile, save_profile
+from .godaddy import get_async_client
+from .idempotency import idempotent, keep
+from .models import CheckoutSession, Purchase
+from .purchasing import (
+    build_purchase_payload,
+    missing_field,
+    purchase_details,
+    purchase_error,
+    purchase_result,
+    purchase_unconfirmed,
+)
+from .quotes import QuoteError, checkout_terms, purchase_terms
+from .ratelimit import UpstreamUnavailable
+from .streaming import stream_format, streaming_search_response
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+
+
+@csrf_exempt
+async def get_list_domains(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method is allowed"}, status=405)
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+        search = (
+            data.get("domain_name", "defaultdomain"),
+            data.get("extensions", []),
+        )
+        options = {"bulk": data.get("bulk"), "fresh": bool(data.get("fresh", False))}
+
+        fmt = stream_format(request, data)
+        if fmt:
+            return streaming_search_response(aiter_search(*search, **options), fmt)
+
+        result = await asearch_available_domains(*search, **options)
+        return JsonResponse(result, safe=False, status=200)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON payload"}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+async def domain_agreement(tlds, privacy="false"):
+    try:
+        return await agreement_cache.aget(tlds, privacy)
+    except httpx.HTTPStatusError as http_err:
+        response = http_err.response
+        try:
+            message = response.json().get("message", "Failed to fetch agreements")
+        except ValueError:
+            message = "Failed to fetch agreements"
+        return JsonResponse({"error": message}, status=response.status_code)
+    except UpstreamUnavailable as unavailable:
+        return JsonResponse({"error": str(unavailable)}, status=503)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+@idempotent
+async def purchase_domain(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    try:
+        data = await sync_to_async(purchase_terms)(json.loads(request.body.decode("utf-8")))
+
+        field = missing_field(data)
+        if field:
+            return JsonResponse({"error": f"{field} is required"}, status=400)
+
+        checkout_session = await CheckoutSession.objects.filter(
+            domain_name=data["domain_name"], email=data["email"]
+        ).afirst()
+        if checkout_session is None:
+            return JsonResponse({"error": "Invalid checkout session"}, status=400)
+
+        domain_name = data["domain_name"]
+        if int(data["amount"]) <= 0:
+            return JsonResponse({"error": "Amount must be greater than 0"}, status=400)
+
+        agreements = await domain_agreement([domain_name.split(".")[-1]])
+        if isinstance(agreements, JsonResponse):
+            return agreements
+        if not agreements or "agreementKey" not in agreements[0]:
+            return JsonResponse(
+                {"error": "Missing legal agreement consent"}, status=400
+            )
+
+        contact = await sync_to_async(find_profile)(data)
+        payload = build_purchase_payload(
+            data,
+            agreements[0]["agreementKey"],
+            datetime.now().isoformat() + "Z",  # ISO8601 format with UTC
+            request.META.get("REMOTE_ADDR", "127.0.0.1"),
+            contact.godaddy_contacts,
+        )
+        try:
+            response = await get_async_client().purchase(payload)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as conn_err:
+            # Never sent, so the client can safely retry
+            return JsonResponse({"error": str(conn_err)}, status=503)
+        except httpx.HTTPError as http_err:
+            # Sent but not answered, GoDaddy may still have registered the domain
+            return keep(JsonResponse(purchase_unconfirmed(domain_name, str(http_err)), status=502))
+        if response.status_code >= 500:
+            return keep(JsonResponse(
+                purchase_unconfirmed(domain_name, f"GoDaddy answered {response.status_code}"), status=502
+            ))
+        try:
+            response_data = response.json()
+        except ValueError as val_err:
+            return keep(JsonResponse(purchase_unconfirmed(domain_name, str(val_err)), status=502))
+        response_data["status"] = "SUCCESS" if response.status_code == 200 else "FAILED"
+        if response.status_code != 200:
+            return JsonResponse(purchase_error(response_data), status=response.status_code)
+
+        await Purchase.objects.acreate(
+            order_id=response_data.get("orderId"),
+            checkout_session=checkout_session,
+            contact=await sync_to_async(save_profile)(contact),
+            status="SUCCESS",
+            **purchase_details(data),
+        )
+        return JsonResponse(purchase_result(domain_name, response_data), status=200)
+    except QuoteError as error:
+        return JsonResponse(error.payload(), status=error.status)
+    except UpstreamUnavailable as unavailable:
+        return JsonResponse({"error": str(unavailable)}, status=503)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+@idempotent
+async def create_checkout_session(request):
+    if request.method != "POST":
+        return JsonResponse(
+            {"error": "Invalid request method, POST only Allowed!"}, status=405
+        )
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+        domain_name, product_price, product_period = await sync_to_async(checkout_terms)(data)
+        user_email = data.get("email")
+
+        checkout_session = await stripe.checkout.Session.create_async(
+            **checkout_session_params(domain_name, product_price, product_period, user_email)
+        )
+        await CheckoutSession.objects.acreate(
+            session_id=checkout_session.id,
+            domain_name=domain_name,
+            email=user_email,
+            period=product_period,
+            price=product_price,
+            currency="usd",
+        )
+        return JsonResponse({"session": checkout_session.url}, status=200)
+    except QuoteError as error:
+        return JsonResponse(error.payload(), status=error.status)
+    except UpstreamUnavailable as unavailable:
+        return JsonResponse({"error": str(unavailable)}, status=503)
+    except Exception as error:
+        return JsonResponse({"error": str(error)}, status=500)
+
+
+@csrf_exempt
+async def success(request):
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+        session = await stripe.checkout.Session.retrieve_async(data.get("session_id"))
+        return JsonResponse({"message": "Payment successful", "session": session})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
@@ -0,0 +1,415 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import chain
+from threading import Lock
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .godaddy import RETRY_STATUSES, get_async_client, get_client
+from .quotes import quote_store
+from .taken_filter import known_taken, observe_taken
+
+
+class AvailabilityCache:
+    """
+    Short lived cache of availability results keyed on the full domain name.
+
+    Entries live in the ``AVAILABILITY_CACHE_ALIAS`` Django cache for
+    ``AVAILABILITY_CACHE_TTL`` seconds, so the backend (and with it LRU eviction,
+    memory cap and whether the cache is shared between processes) is picked in
+    ``settings.CACHES``. Hit and miss counters are kept per process.
+
+    A second copy of each entry is kept for ``AVAILABILITY_STALE_TTL`` seconds
+    and served, marked ``"stale": true``, while GoDaddy cannot be asked.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.AVAILABILITY_CACHE_ALIAS]
+
+    def key(self, domain):
+        return f"availability:{domain.lower()}"
+
+    def stale_key(self, domain):
+        return f"availability-stale:{domain.lower()}"
+
+    def get_many(self, domains):
+        keys = {self.key(domain): domain for domain in domains}
+        found = self.cache.get_many(keys)
+        with self.lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return {keys[key]: result for key, result in found.items()}
+
+    def set_many(self, results):
+        if results:
+            self.cache.set_many(
+                {self.key(domain): result for domain, result in results.items()},
+                timeout=settings.AVAILABILITY_CACHE_TTL,
+            )
+            self.cache.set_many(
+                {self.stale_key(domain): result for domain, result in results.items()},
+                timeout=settings.AVAILABILITY_STALE_TTL,
+            )
+
+    def get_stale(self, domain):
+        """The last known answer for ``domain`` or None, for when GoDaddy cannot be asked."""
+        result = self.cache.get(self.stale_key(domain))
+        return None if result is None else {**result, "stale": True}
+
+    def get_stale_many(self, domains):
+        keys = {self.stale_key(domain): domain for domain in domains}
+        return {keys[key]: {**result, "stale": True} for key, result in self.cache.get_many(keys).items()}
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            # Only backends that track evictions (service.cache.TTLLRUCache) report them
+            "evictions": getattr(self.cache, "evictions", None),
+        }
+
+
+availability_cache = AvailabilityCache()
+
+
+def check_domain(domain):
+    """
+    Ask GoDaddy whether a single fully qualified domain is available.
+
+    When GoDaddy cannot answer (rate limited, circuit open, failing) the last
+    known answer is returned instead, or None so the domain is reported as pending.
+    """
+    try:
+        response = get_client().check_available(domain)
+    except requests.exceptions.RequestException:
+        return availability_cache.get_stale(domain)
+    if response.status_code in RETRY_STATUSES:
+        return availability_cache.get_stale(domain)
+    return response.json()
+
+
+def bulk_results(domains, response):
+    """
+    Split a bulk availability response into ``(results, failed)`` where
+    ``results`` maps each answered domain to its availability and ``failed``
+    lists the domains GoDaddy reported errors for.
+    """
+    if response.status_code not in (200, 203):
+        # The whole chunk failed, let the caller retry each domain on its own
+        return {}, list(domains)
+
+    data = response.json()
+    results = {}
+    for result in data.get("domains", []):
+        results[result.get("domain", "").lower()] = result
+    answered = {domain: results.pop(domain.lower()) for domain in domains if domain.lower() in results}
+    failed = [domain for domain in domains if domain not in answered]
+    return answered, failed
+
+
+def check_domains_bulk(domains):
+    """Check up to ``GODADDY_BULK_CHUNK_SIZE`` domains with one bulk availability call."""
+    try:
+        response = get_client().check_available_bulk(domains)
+    except requests.exceptions.RequestException:
+        return {}, list(domains)
+    return bulk_results(domains, response)
+
+
+def chunked(items, size):
+    return [tuple(items[i:i + size]) for i in range(0, len(items), size)]
+
+
+def iter_lookups(domains, lookup, max_workers=None, deadline=None):
+    """
+    Run ``lookup(domain)`` for every domain concurrently and yield
+    ``(domain, result)`` pairs in completion order.
+
+    At most ``max_workers`` lookups are in flight at once. Once ``deadline``
+    seconds have passed, every lookup that has not finished yet is yielded as
+    ``(domain, None)`` so the caller can report it as pending. Exceptions
+    raised by a lookup are re-raised here. ``domains`` may hold any hashable
+    items, e.g. tuples of domains for bulk lookups.
+    """
+    domains = list(domains)
+    if not domains:
+        return
+    if max_workers is None:
+        max_workers = settings.GODADDY_SEARCH_CONCURRENCY
+    if deadline is None:
+        deadline = settings.GODADDY_SEARCH_DEADLINE
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(domains))))
+    try:
+        futures = {executor.submit(lookup, domain): domain for domain in domains}
+        expires_at = time.monotonic() + deadline
+        not_done = set(futures)
+        while not_done:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                break
+            done, not_done = wait(not_done, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures[future], future.result()
+        # Whatever is still running missed the deadline
+        for future in not_done:
+            yield futures[future], None
+    finally:
+        # Don't hold the response hostage to stragglers, let them finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def lookup_domains(domains, max_workers=None, deadline=None, bulk=False):
+    """
+    Yield ``(domain, result)`` for every domain, ``result`` is None when the
+    lookup missed the deadline.
+
+    In bulk mode the domains are checked in chunks of ``GODADDY_BULK_CHUNK_SIZE``
+    with GoDaddy's bulk endpoint, and any domain the bulk call could not answer
+    falls back to a single lookup within what is left of the deadline.
+    """
+    if deadline is None:
+        deadline = settings.GODADDY_SEARCH_DEADLINE
+    if not bulk:
+        yield from iter_lookups(domains, check_domain, max_workers, deadline)
+        return
+
+    started = time.monotonic()
+    failed = []
+    chunks = chunked(list(domains), settings.GODADDY_BULK_CHUNK_SIZE)
+    for chunk, answer in iter_lookups(chunks, check_domains_bulk, max_workers, deadline):
+        if answer is None:
+            for domain in chunk:
+                yield domain, None
+            continue
+        results, chunk_failed = answer
+        yield from results.items()
+        failed.extend(chunk_failed)
+
+    if failed:
+        remaining = max(0, deadline - (time.monotonic() - started))
+        yield from iter_lookups(failed, check_domain, max_workers, remaining)
+
+
+def use_bulk(domain_count, bulk=None):
+    """Bulk mode is used when asked for, or by default for large searches."""
+    if bulk is not None:
+        return bool(bulk)
+    return domain_count >= settings.GODADDY_BULK_MIN_DOMAINS
+
+
+class DomainSearch:
+    """
+    Collects the lookups of one keyword search into the ``get_list_domains`` payload.
+
+    ``cached`` holds the results already answered by the availability cache
+    or, for names it knows are registered, the taken filter; ``misses`` the
+    domains that still have to be looked up. Fresh answers are written back
+    to the cache by ``finish()``, and the taken ones to the taken filter.
+    Every available domain is returned with a ``quote_id`` for checkout.
+    """
+
+    def __init__(self, domain_keyword, extensions, fresh=False, cached=None):
+        self.domains = [f"{domain_keyword}{ext}" for ext in extensions]
+        self.cached = cached if cached is not None else ({} if fresh else availability_cache.get_many(self.domains))
+        if not fresh:
+            self.cached.update(known_taken([domain for domain in self.domains if domain not in self.cached]))
+        self.misses = [domain for domain in self.domains if domain not in self.cached]
+        self.available = []
+        self.pending = []
+        self.checked = {}
+        self.quotes = {}
+
+    def add(self, domain, result):
+        """Record one lookup, returns the result with its quote when the domain is available."""
+        if result is None:
+            self.pending.append(domain)
+            return None
+        if domain not in self.cached and "available" in result and not result.get("stale"):
+            # Error payloads (rate limits etc.) carry no answer and are not cached
+            self.checked[domain] = result
+        if result.get("available"):
+            quote_id, quote = quote_store.sign(result)
+            if quote_id:
+                self.quotes[quote_id] = quote
+                result = {**result, "quote_id": quote_id}
+            self.available.append((domain, result))
+            return result
+        return None
+
+    def payload(self):
+        # Keep the response order stable, the client sent the extensions in a meaningful order
+        order = {domain: index for index, domain in enumerate(self.domains)}
+        return {
+            "available_domains": [
+                result for domain, result in sorted(self.available, key=lambda item: order[item[0]])
+            ],
+            "partial": bool(self.pending),
+            "pending_domains": sorted(self.pending, key=order.get),
+        }
+
+    def finish(self):
+        availability_cache.set_many(self.checked)
+        observe_taken(self.checked)
+        quote_store.save(self.quotes)
+        return self.payload()
+
+
+def iter_search(domain_keyword, extensions, max_workers=None, deadline=None, bulk=None, fresh=False):
+    """
+    Yield ``("available", result)`` for each available domain as soon as its
+    lookup finishes, then ``("summary", payload)`` with the full
+    ``get_list_domains`` payload once every lookup finished or missed the deadline.
+    """
+    search = DomainSearch(domain_keyword, extensions, fresh)
+    lookups = chain(
+        search.cached.items(),
+        lookup_domains(search.misses, max_workers, deadline, use_bulk(len(search.misses), bulk)),
+    )
+    for domain, result in lookups:
+        available = search.add(domain, result)
+        if available:
+            yield "available", available
+    yield "summary", search.finish()
+
+
+def search_available_domains(domain_keyword, extensions, max_workers=None, deadline=None, bulk=None,
+                             fresh=False):
+    """
+    Check ``domain_keyword`` against every extension and collect the available ones.
+
+    Returns the ``get_list_domains`` payload. ``partial`` is True when some
+    lookups missed the deadline; those domains are listed in ``pending_domains``.
+    ``bulk`` forces bulk mode on or off, by default it is picked from the
+    number of extensions. Results come from the availability cache when
+    possible, ``fresh`` skips it and always asks GoDaddy.
+    """
+    for event, data in iter_search(domain_keyword, extensions, max_workers, deadline, bulk, fresh):
+        if event == "summary":
+            return data
+
+
+# Async counterparts used by the ASGI views. They mirror the functions above
+# but run every lookup as a task on the event loop instead of a thread.
+
+async def acheck_domain(domain):
+    try:
+        response = await get_async_client().check_available(domain)
+    except (requests.exceptions.RequestException, httpx.HTTPError):
+        return await sync_to_async(availability_cache.get_stale)(domain)
+    if response.status_code in RETRY_STATUSES:
+        return await sync_to_async(availability_cache.get_stale)(domain)
+    return response.json()
+
+
+async def acheck_domains_bulk(domains):
+    try:
+        response = await get_async_client().check_available_bulk(domains)
+    except (requests.exceptions.RequestException, httpx.HTTPError):
+        return {}, list(domains)
+    return bulk_results(domains, response)
+
+
+async def aiter_lookups(domains, lookup, max_workers=None, deadline=None):
+    """Async version of ``iter_lookups``, lookups that miss the deadline are cancelled."""
+    domains = list(domains)
+    if not domains:
+        return
+    if max_workers is None:
+        max_workers = settings.GODADDY_SEARCH_CONCURRENCY
+    if deadline is None:
+        deadline = settings.GODADDY_SEARCH_DEADLINE
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def run(domain):
+        async with semaphore:
+            return await lookup(domain)
+
+    tasks = {asyncio.ensure_future(run(domain)): domain for domain in domains}
+    expires_at = loop.time() + deadline
+    not_done = set(tasks)
+    try:
+        while not_done:
+            remaining = expires_at - loop.time()
+            if remaining <= 0:
+                break
+            done, not_done = await asyncio.wait(
+                not_done, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield tasks[task], task.result()
+        for task in not_done:
+            yield tasks[task], None
+    finally:
+        for task in not_done:
+            task.cancel()
+
+
+async def alookup_domains(domains, max_workers=None, deadline=None, bulk=False):
+    """Async version of ``lookup_domains``."""
+    if deadline is None:
+        deadline = settings.GODADDY_SEARCH_DEADLINE
+    if not bulk:
+        async for item in aiter_lookups(domains, acheck_domain, max_workers, deadline):
+            yield item
+        return
+
+    started = time.monotonic()
+    failed = []
+    chunks = chunked(list(domains), settings.GODADDY_BULK_CHUNK_SIZE)
+    async for chunk, answer in aiter_lookups(chunks, acheck_domains_bulk, max_workers, deadline):
+        if answer is None:
+            for domain in chunk:
+                yield domain, None
+            continue
+        results, chunk_failed = answer
+        for item in results.items():
+            yield item
+        failed.extend(chunk_failed)
+
+    if failed:
+        remaining = max(0, deadline - (time.monotonic() - started))
+        async for item in aiter_lookups(failed, acheck_domain, max_workers, remaining):
+            yield item
+
+
+async def aiter_search(domain_keyword, extensions, max_workers=None, deadline=None, bulk=None,
+                       fresh=False):
+    """Async version of ``iter_search``."""
+    domains = [f"{domain_keyword}{ext}" for ext in extensions]
+    cached = {} if fresh else await sync_to_async(availability_cache.get_many)(domains)
+    search = DomainSearch(domain_keyword, extensions, fresh, cached)
+    for domain, result in search.cached.items():
+        available = search.add(domain, result)
+        if available:
+            yield "available", available
+    async for domain, result in alookup_domains(
+        search.misses, max_workers, deadline, use_bulk(len(search.misses), bulk)
+    ):
+        available = search.add(domain, result)
+        if available:
+            yield "available", available
+    yield "summary", await sync_to_async(search.finish)()
+
+
+async def asearch_available_domains(domain_keyword, extensions, max_workers=None, deadline=None,
+                                    bulk=None, fresh=False):
+    """Async version of ``search_available_domains``."""
+    async for event, data in aiter_search(domain_keyword, extensions, max_workers, deadline, bulk, fresh):
+        if event == "summary":
+            return data
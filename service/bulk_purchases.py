@@ -0,0 +1,289 @@
+"""
+Bulk purchases: many domains registered for one contact in a single request.
+
+Each entry of ``domains`` is a purchase_domain request without the contact
+fields, which are sent once next to the list. The checkout sessions are
+loaded with one query and the agreements fetched once per distinct TLD, the
+registrations then run at most ``PURCHASE_BULK_CONCURRENCY`` at a time and
+the purchases GoDaddy accepted are saved with one ``bulk_create`` in a single
+transaction. Every domain gets its own outcome, one failing (even with an
+unexpected error) does not stop the others or the saving of those that were
+registered. Registrations GoDaddy may have made without confirming them are
+reported ``UNCONFIRMED`` and registered purchases that could not be saved
+``UNRECORDED``, both need reconciliation rather than a retry.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from .agreements import agreement_cache
+from .contacts import find_profile, save_profile
+from .godaddy import get_client, never_sent
+from .models import CheckoutSession, Purchase
+from .purchasing import (
+    build_purchase_payload,
+    missing_field,
+    purchase_details,
+    purchase_error,
+    purchase_result,
+)
+from .quotes import QuoteError, purchase_terms
+from .ratelimit import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+class PurchaseFailed(Exception):
+    """One domain of a bulk purchase failed, ``status`` is the HTTP status it would have got on its own."""
+
+    def __init__(self, message, status=400, fields=None):
+        super().__init__(message)
+        self.status = status
+        self.fields = fields
+
+
+class PurchaseUnconfirmed(PurchaseFailed):
+    """GoDaddy got the registration but did not confirm it, it may have gone through."""
+
+    def __init__(self, message, status=502):
+        super().__init__(message, status)
+
+
+def failure(domain_name, error):
+    status = "UNCONFIRMED" if isinstance(error, PurchaseUnconfirmed) else "FAILED"
+    outcome = {"domain_name": domain_name, "status": status, "status_code": error.status, "error": str(error)}
+    if error.fields is not None:
+        outcome["fields"] = error.fields
+    return outcome
+
+
+def request_items(data):
+    """The purchase request of each domain, with the shared contact fields filled in."""
+    contact = {key: value for key, value in data.items() if key != "domains"}
+    return [{**contact, **item} for item in data["domains"]]
+
+
+def resolve_terms(item):
+    """The purchase request priced from its quote if it has one, checked like purchase_domain does."""
+    try:
+        item = purchase_terms(item)
+    except QuoteError as error:
+        raise PurchaseFailed(str(error), error.status)
+    except UpstreamUnavailable as unavailable:
+        raise PurchaseFailed(str(unavailable), 503)
+    field = missing_field(item)
+    if field:
+        raise PurchaseFailed(f"{field} is required")
+    try:
+        amount = int(item["amount"])
+    except (TypeError, ValueError):
+        raise PurchaseFailed("amount must be a whole number of cents")
+    if amount <= 0:
+        raise PurchaseFailed("Amount must be greater than 0")
+    return item
+
+
+def fetch_agreement_keys(tlds):
+    """``{tld: agreement key or PurchaseFailed}``, one agreement lookup per TLD."""
+    keys = {}
+    for tld in tlds:
+        try:
+            agreements = agreement_cache.get([tld])
+        except UpstreamUnavailable as unavailable:
+            keys[tld] = PurchaseFailed(str(unavailable), 503)
+            continue
+        except requests.exceptions.HTTPError as http_err:
+            keys[tld] = PurchaseFailed("Failed to fetch agreements", http_err.response.status_code)
+            continue
+        except requests.exceptions.RequestException as req_err:
+            keys[tld] = PurchaseFailed(str(req_err), 502)
+            continue
+        if not agreements or "agreementKey" not in agreements[0]:
+            keys[tld] = PurchaseFailed("Missing legal agreement consent")
+        else:
+            keys[tld] = agreements[0]["agreementKey"]
+    return keys
+
+
+def register(item, contact, agreement_key, agreed_at, agreed_by):
+    """Send one registration to GoDaddy, returns its response body."""
+    payload = build_purchase_payload(item, agreement_key, agreed_at, agreed_by, contact.godaddy_contacts)
+    try:
+        response = get_client().purchase(payload)
+    except UpstreamUnavailable as unavailable:
+        # Not sent, the domain can be retried
+        raise PurchaseFailed(str(unavailable), 503)
+    except requests.exceptions.ConnectionError as conn_err:
+        if never_sent(conn_err):
+            raise PurchaseFailed(str(conn_err), 503)
+        raise PurchaseUnconfirmed(str(conn_err))
+    except requests.exceptions.RequestException as req_err:
+        raise PurchaseUnconfirmed(str(req_err))  # e.g. a read timeout, GoDaddy may still be processing it
+    if response.status_code >= 500:
+        raise PurchaseUnconfirmed(f"GoDaddy answered {response.status_code}, the order may have gone through")
+    try:
+        response_data = response.json()
+    except ValueError:
+        raise PurchaseUnconfirmed(f"GoDaddy answered {response.status_code} with an unreadable body")
+    if response.status_code != 200:
+        error = purchase_error(response_data)
+        raise PurchaseFailed(error["error"], response.status_code, error["fields"])
+    response_data["status"] = "SUCCESS"
+    return response_data
+
+
+def unexpected(domain_name, error):
+    """PurchaseFailed for an error nothing expected, logged so it is not lost in the domain's outcome."""
+    logger.exception("Bulk purchase of a domain failed", extra={"domain_name": domain_name})
+    return PurchaseFailed(str(error), 500)
+
+
+def save_purchases(purchases):
+    """
+    Save the registered purchases together, or one by one when that fails so
+    one bad row does not lose the rest. Returns the purchases not saved.
+    """
+    try:
+        with transaction.atomic():
+            Purchase.objects.bulk_create(purchases)
+        return []
+    except DatabaseError:
+        logger.exception("Saving the bulk purchase failed, saving its purchases one by one")
+    unsaved = []
+    for purchase in purchases:
+        try:
+            with transaction.atomic():
+                purchase.save()
+        except DatabaseError:
+            logger.exception("Registered purchase not saved", extra={"order_id": purchase.order_id})
+            purchase.pk = None  # bulk_create may have set it before rolling back
+            unsaved.append(purchase)
+    return unsaved
+
+
+def unrecorded(domain_name, purchase):
+    """The outcome of a domain GoDaddy registered but whose purchase could not be saved."""
+    return {
+        "domain_name": domain_name,
+        "status": "UNRECORDED",
+        "status_code": 500,
+        "order_id": purchase.order_id,
+        "error": "Registered with GoDaddy but not saved, it needs reconciliation",
+    }
+
+
+def purchase_many(data, agreed_by):
+    """
+    Register every domain of a bulk purchase request.
+
+    Returns ``{"results": [...], "succeeded": int, "failed": int}`` with one
+    outcome per requested domain, in request order: the purchase_domain
+    success body or ``{"domain_name", "status": "FAILED", "error", ...}``,
+    both with the ``status_code`` the domain would have got on its own.
+    ``status`` is ``UNCONFIRMED`` instead of ``FAILED`` when GoDaddy may
+    have registered the domain, and ``UNRECORDED`` (with its ``order_id``)
+    when it did but the purchase could not be saved. Only saved purchases
+    count as ``succeeded``.
+    """
+    items = request_items(data)
+    outcomes = [None] * len(items)
+    workers = max(1, min(settings.PURCHASE_BULK_CONCURRENCY, len(items)))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Quotes that dropped out of the cache cost a GoDaddy lookup each, check them concurrently too
+        def check(item):
+            try:
+                return resolve_terms(item)
+            except PurchaseFailed as error:
+                return error
+            except Exception as error:
+                return unexpected(item.get("domain_name"), error)
+
+        pending = {}
+        seen = set()
+        for index, (item, terms) in enumerate(zip(items, executor.map(check, items))):
+            if isinstance(terms, PurchaseFailed):
+                outcomes[index] = failure(item.get("domain_name"), terms)
+            elif terms["domain_name"].lower() in seen:
+                outcomes[index] = failure(terms["domain_name"], PurchaseFailed("Domain listed more than once"))
+            else:
+                seen.add(terms["domain_name"].lower())
+                pending[index] = terms
+
+        # One query for every checkout session instead of one per domain
+        sessions = {}
+        candidates = CheckoutSession.objects.filter(
+            domain_name__in={item["domain_name"] for item in pending.values()},
+            email__in={item["email"] for item in pending.values()},
+        ).order_by("id")
+        for session in candidates:
+            sessions.setdefault((session.domain_name, session.email), session)
+        for index, item in list(pending.items()):
+            if (item["domain_name"], item["email"]) not in sessions:
+                outcomes[index] = failure(item["domain_name"], PurchaseFailed("Invalid checkout session"))
+                del pending[index]
+
+        agreement_keys = fetch_agreement_keys(
+            sorted({item["domain_name"].split(".")[-1] for item in pending.values()})
+        )
+        ready = {}
+        for index, item in pending.items():
+            agreement_key = agreement_keys[item["domain_name"].split(".")[-1]]
+            if isinstance(agreement_key, PurchaseFailed):
+                outcomes[index] = failure(item["domain_name"], agreement_key)
+                continue
+            try:
+                # Stored with the purchase, so a domain GoDaddy refuses leaves no profile behind
+                contact = find_profile(item)
+            except Exception as error:
+                outcomes[index] = failure(item["domain_name"], unexpected(item["domain_name"], error))
+                continue
+            ready[index] = (item, sessions[(item["domain_name"], item["email"])], contact, agreement_key)
+
+        agreed_at = datetime.now().isoformat() + "Z"  # ISO8601 format with UTC
+
+        def run(entry):
+            item, _, contact, agreement_key = entry
+            try:
+                return register(item, contact, agreement_key, agreed_at, agreed_by)
+            except PurchaseFailed as error:
+                return error
+            except Exception as error:
+                return unexpected(item["domain_name"], error)
+
+        registered = dict(zip(ready, executor.map(run, ready.values())))
+
+    purchases = {}
+    profiles = {}  # fingerprint -> stored profile, domains sharing a contact store it once
+    for index, response_data in registered.items():
+        item, session, contact, _ = ready[index]
+        if isinstance(response_data, PurchaseFailed):
+            outcomes[index] = failure(item["domain_name"], response_data)
+            continue
+        purchase = Purchase(
+            order_id=response_data.get("orderId"),
+            checkout_session=session,
+            status="SUCCESS",
+            **purchase_details(item),
+        )
+        try:
+            if contact.fingerprint not in profiles:
+                profiles[contact.fingerprint] = save_profile(contact)
+        except DatabaseError:
+            logger.exception("Contact profile of a registered purchase not saved", extra={"order_id": purchase.order_id})
+            outcomes[index] = unrecorded(item["domain_name"], purchase)
+            continue
+        purchase.contact = profiles[contact.fingerprint]
+        outcomes[index] = {**purchase_result(item["domain_name"], response_data), "status_code": 200}
+        purchases[index] = purchase
+    unsaved = save_purchases(list(purchases.values()))
+    for index, purchase in purchases.items():
+        if purchase in unsaved:
+            outcomes[index] = unrecorded(ready[index][0]["domain_name"], purchase)
+
+    succeeded = len(purchases) - len(unsaved)
+    return {"results": outcomes, "succeeded": succeeded, "failed": len(items) - succeeded}
@@ -0,0 +1,144 @@
+import pickle
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Entries are shared by every cache instance with the same LOCATION in this process,
+# the same way Django's LocMemCache does it
+_stores = {}
+_stores_lock = Lock()
+
+
+class _Store:
+    def __init__(self):
+        self.entries = OrderedDict()  # key -> (pickled value, expires at), oldest first
+        self.size = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+
+class TTLLRUCache(BaseCache):
+    """
+    In-process cache backend with per-entry expiry and LRU eviction.
+
+    Unlike ``LocMemCache`` it evicts one least recently used entry at a time,
+    can cap the memory used by the pickled values (``OPTIONS["MAX_BYTES"]``,
+    0 means no cap) on top of ``MAX_ENTRIES``, and counts its evictions.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._max_bytes = int(options.get("MAX_BYTES", 0))
+        with _stores_lock:
+            self._store = _stores.setdefault(name, _Store())
+
+    @property
+    def evictions(self):
+        return self._store.evictions
+
+    @property
+    def size(self):
+        return self._store.size
+
+    def _has_expired(self, key):
+        entry = self._store.entries.get(key)
+        if entry is None:
+            return True
+        expires_at = entry[1]
+        return expires_at is not None and expires_at <= time.time()
+
+    def _delete(self, key):
+        entry = self._store.entries.pop(key, None)
+        if entry is None:
+            return False
+        self._store.size -= len(key) + len(entry[0])
+        return True
+
+    def _set(self, key, pickled, timeout):
+        store = self._store
+        self._delete(key)
+        store.entries[key] = (pickled, self.get_backend_timeout(timeout))
+        store.size += len(key) + len(pickled)
+        # Evict least recently used entries until we are back within both limits,
+        # never evicting the entry that was just written
+        while len(store.entries) > 1 and (
+            len(store.entries) > self._max_entries
+            or (self._max_bytes and store.size > self._max_bytes)
+        ):
+            oldest = next(iter(store.entries))
+            expired = self._has_expired(oldest)
+            self._delete(oldest)
+            if not expired:
+                store.evictions += 1
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._store.lock:
+            if self._has_expired(key):
+                self._set(key, pickled, timeout)
+                return True
+            return False
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            if self._has_expired(key):
+                self._delete(key)
+                return default
+            pickled = self._store.entries[key][0]
+            self._store.entries.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._store.lock:
+            self._set(key, pickled, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            if self._has_expired(key):
+                return False
+            pickled = self._store.entries[key][0]
+            self._store.entries[key] = (pickled, self.get_backend_timeout(timeout))
+            self._store.entries.move_to_end(key)
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            if self._has_expired(key):
+                self._delete(key)
+                raise ValueError("Key '%s' not found" % key)
+            pickled, expires_at = self._store.entries[key]
+            new_value = pickle.loads(pickled) + delta
+            self._delete(key)
+            pickled = pickle.dumps(new_value, self.pickle_protocol)
+            self._store.entries[key] = (pickled, expires_at)
+            self._store.size += len(key) + len(pickled)
+        return new_value
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            if self._has_expired(key):
+                self._delete(key)
+                return False
+            return True
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            return self._delete(key)
+
+    def clear(self):
+        with self._store.lock:
+            self._store.entries.clear()
+            self._store.size = 0
@@ -0,0 +1,34 @@
+from django.conf import settings
+
+
+def checkout_session_params(domain_name, product_price, product_period, user_email):
+    """Parameters for ``stripe.checkout.Session.create``, ``product_price`` is in cents."""
+    return {
+        "line_items": [
+            {
+                "price_data": {
+                    "currency": "usd",
+                    "unit_amount": int(
+                        product_price
+                    ),  # Stripe requires the price in cents
+                    "product_data": {
+                        "name": domain_name,
+                        "description": f"Registration for {product_period} year(s)",
+                        # 'images': ['https://images.unsplash.com/photo-1579202673506-ca3ce28943ef'],
+                    },
+                },
+                "quantity": 1,
+            },
+        ],
+        "mode": "payment",
+        "billing_address_collection": "required",
+        # "success_url": settings.DOMAIN + '/success?session_id={CHECKOUT_SESSION_ID}',
+        "success_url": (
+            f"{settings.DOMAIN}/success?"
+            f"session_id={{CHECKOUT_SESSION_ID}}"
+            f"&domain_name={domain_name}"
+            f"&period={product_period}"
+        ),
+        "cancel_url": settings.DOMAIN + "/cancel",
+        "customer_email": user_email,
+    }
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Cache backends whose entries live in one process, each worker process would keep its own bucket and circuit
+PROCESS_LOCAL_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+    "service.cache.TTLLRUCache",
+}
+
+
+@register(Tags.caches)
+def check_rate_limit_cache(app_configs, **kwargs):
+    """Warn when the GoDaddy rate limiter can not be shared between worker processes."""
+    if settings.DEBUG or not settings.GODADDY_RATE_LIMIT:
+        return []
+    backend = settings.CACHES[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS]["BACKEND"]
+    if backend not in PROCESS_LOCAL_BACKENDS:
+        return []
+    return [Warning(
+        f"The GoDaddy rate limit cache uses {backend}, which is local to each process.",
+        hint=(
+            "Every worker process gets the whole GODADDY_RATE_LIMIT and its own circuit breaker. "
+            "Set REDIS_URL, or GODADDY_RATE_LIMIT_CACHE_BACKEND to a shared backend with an atomic incr."
+        ),
+        id="service.W001",
+    )]
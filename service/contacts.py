@@ -0,0 +1,72 @@
+"""
+Contact profiles: the registrant details of purchases, stored once per customer.
+
+The contact fields of a purchase request are normalized and hashed, and
+purchases with the same details share one ContactProfile row. Profiles never
+change, so they are cached by fingerprint in ``CONTACT_PROFILE_CACHE_ALIAS``
+together with their prebuilt GoDaddy contact blocks: a repeat customer's
+purchase neither queries the profile nor builds the blocks again.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import ContactProfile
+
+PROFILE_CACHE_TTL = 60 * 60  # seconds
+
+
+def contact_details(data):
+    """The normalized ContactProfile fields of a purchase request."""
+    # Collapse whitespace so "1  Main St " and "1 Main St" are one profile
+    details = {field: " ".join(str(data.get(field) or "").split()) for field in ContactProfile.FIELDS}
+    details["email"] = details["email"].lower()
+    details["country"] = details["country"].upper()
+    return details
+
+
+def fingerprint(details):
+    return hashlib.sha256("\0".join(details[field] for field in ContactProfile.FIELDS).encode()).hexdigest()
+
+
+def contact_profile(data):
+    """The ContactProfile for the contact fields of ``data``, created on first use."""
+    return save_profile(find_profile(data))
+
+
+def find_profile(data):
+    """
+    The ContactProfile for the contact fields of ``data``, without creating it.
+
+    Details not seen before get an unsaved profile that builds the same
+    contact blocks. Purchases pass it to ``save_profile`` where they save
+    their Purchase row, so a purchase GoDaddy refuses leaves no profile behind.
+    """
+    details = contact_details(data)
+    key = fingerprint(details)
+    profile = caches[settings.CONTACT_PROFILE_CACHE_ALIAS].get(f"contact-profile:{key}")
+    if profile is None:
+        profile = ContactProfile.objects.filter(fingerprint=key).first()
+        if profile is None:
+            return ContactProfile(fingerprint=key, **details)
+        cache_profile(profile)
+    return profile
+
+
+def save_profile(profile):
+    """Store a profile ``find_profile`` returned unsaved, returns the stored one."""
+    if profile.pk is None:
+        details = {field: getattr(profile, field) for field in ContactProfile.FIELDS}
+        profile, _ = ContactProfile.objects.get_or_create(fingerprint=profile.fingerprint, defaults=details)
+        cache_profile(profile)
+    return profile
+
+
+def cache_profile(profile):
+    profile.godaddy_contacts  # Build the blocks now so they are cached with the profile
+    cache = caches[settings.CONTACT_PROFILE_CACHE_ALIAS]
+    key = f"contact-profile:{profile.fingerprint}"
+    # A profile created in a transaction that is rolled back must not be handed out
+    transaction.on_commit(lambda: cache.set(key, profile, timeout=PROFILE_CACHE_TTL))
@@ -0,0 +1,230 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import CheckoutSession
+
+SESSION_HEADER = ['session id', 'Domain Name', 'Email', 'Period', 'Price', 'Currency', 'Created At']
+SESSION_FIELDS = ['id', 'session_id', 'domain_name', 'email', 'period', 'price', 'currency', 'created_at']
+
+PURCHASE_HEADER = ['Order ID', 'First Name', 'Last Name', 'Amount', 'Purchase Currency', 'Status', 'Purchased At']
+PURCHASE_FIELDS = [
+    'purchases__order_id',
+    'purchases__contact__first_name',
+    'purchases__contact__last_name',
+    'purchases__amount',
+    'purchases__currency',
+    'purchases__status',
+    'purchases__created_at',
+]
+
+# Column names for the typed formats (NDJSON, Parquet, Arrow), in row order
+SESSION_COLUMNS = ['session_id', 'domain_name', 'email', 'period', 'price', 'currency', 'created_at']
+PURCHASE_COLUMNS = [
+    'order_id', 'first_name', 'last_name', 'amount', 'purchase_currency', 'purchase_status', 'purchased_at',
+]
+
+# format: (content type, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+COLUMNAR_FORMATS = {'parquet', 'arrow'}
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def export_rows(since=None, until=None, since_id=None, include_purchases=False):
+    """
+    Checkout sessions as tuples in id order, the id first.
+
+    With ``include_purchases`` the purchases are joined in the same query,
+    one row per purchase (sessions without any get empty purchase columns).
+    """
+    sessions = CheckoutSession.objects.all()
+    if since is not None:
+        sessions = sessions.filter(created_at__gte=since)
+    if until is not None:
+        sessions = sessions.filter(created_at__lt=until)
+    if since_id is not None:
+        sessions = sessions.filter(id__gt=since_id)
+
+    fields = SESSION_FIELDS + (PURCHASE_FIELDS if include_purchases else [])
+    # values_list + iterator streams rows from a server-side cursor without
+    # building model instances or filling the queryset cache
+    return sessions.order_by('id', *(['purchases__id'] if include_purchases else [])).values_list(
+        *fields
+    ).iterator(chunk_size=2000)
+
+
+def header(include_purchases=False):
+    return SESSION_HEADER + (PURCHASE_HEADER if include_purchases else [])
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    return value
+
+
+def iter_csv(rows, include_header=True, include_purchases=False, rows_per_chunk=1000, on_row=None):
+    """
+    Encode ``rows`` (from ``export_rows``) as CSV text, ``rows_per_chunk`` rows per yielded string.
+
+    The id column is dropped from the output; ``on_row`` is called with each
+    row's id, which lets the caller track a watermark.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(header(include_purchases))
+    count = 0
+    for row in rows:
+        writer.writerow([format_value(value) for value in row[1:]])
+        if on_row is not None:
+            on_row(row[0])
+        count += 1
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def columns(include_purchases=False):
+    return SESSION_COLUMNS + (PURCHASE_COLUMNS if include_purchases else [])
+
+
+def iter_ndjson(rows, include_purchases=False, rows_per_chunk=1000):
+    """One JSON object per row, with prices as decimal strings and timestamps in ISO 8601."""
+    names = columns(include_purchases)
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(dict(zip(names, row[1:]))))
+        if len(lines) == rows_per_chunk:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of text or bytes chunks on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def load_pyarrow():
+    """pyarrow is only needed for the columnar formats, so it is an optional dependency."""
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured('The parquet and arrow export formats need pyarrow (pip install pyarrow)')
+    return pyarrow
+
+
+def arrow_schema(pa, include_purchases=False):
+    fields = [
+        ('session_id', pa.string()),
+        ('domain_name', pa.string()),
+        ('email', pa.string()),
+        ('period', pa.int64()),
+        ('price', pa.decimal128(10, 2)),
+        ('currency', pa.string()),
+        ('created_at', pa.timestamp('us', tz='UTC')),
+    ]
+    if include_purchases:
+        fields += [
+            ('order_id', pa.string()),
+            ('first_name', pa.string()),
+            ('last_name', pa.string()),
+            ('amount', pa.decimal128(10, 2)),
+            ('purchase_currency', pa.string()),
+            ('purchase_status', pa.string()),
+            ('purchased_at', pa.timestamp('us', tz='UTC')),
+        ]
+    return pa.schema(fields)
+
+
+class ChunkSink:
+    """A write-only file that hands out what was written since the last ``drain``."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_columnar(rows, fmt, include_purchases=False, batch_rows=None):
+    """
+    Encode ``rows`` as Parquet or an Arrow IPC stream, ``batch_rows`` rows per record batch.
+
+    Only one batch is held in memory at a time; its encoded bytes are
+    yielded as soon as it is written (each Parquet batch is a row group).
+    """
+    batch_rows = batch_rows or settings.EXPORT_BATCH_ROWS
+    pa = load_pyarrow()
+    schema = arrow_schema(pa, include_purchases)
+    sink = ChunkSink()
+    if fmt == 'parquet':
+        writer = pa.parquet.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='snappy')
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema)
+
+    def write(batch):
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+    batch = []
+    for row in rows:
+        batch.append(row[1:])
+        if len(batch) == batch_rows:
+            write(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write(batch)
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(rows, fmt='csv', compress=None, include_purchases=False):
+    """The encoded export of ``rows`` in ``fmt``, gzipped when ``compress == 'gzip'`` (csv and ndjson only)."""
+    if fmt in COLUMNAR_FORMATS:
+        return iter_columnar(rows, fmt, include_purchases)
+    if fmt == 'ndjson':
+        chunks = iter_ndjson(rows, include_purchases)
+    else:
+        chunks = iter_csv(rows, include_purchases=include_purchases)
+    return gzip_chunks(chunks) if compress == 'gzip' else chunks
@@ -0,0 +1,273 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from .metrics import count_rejected, count_retry, observe_upstream
+from .ratelimit import PRIORITY, SEARCH, CircuitOpen, RateLimited, godaddy_bucket, godaddy_circuit
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# A 429 is the rate limit talking, not an outage, so it does not count towards opening the circuit
+FAILURE_STATUSES = RETRY_STATUSES - {429}
+MAX_RETRY_AFTER = 5  # seconds, longer Retry-After waits are not worth holding a request for
+
+# A purchase and the calls it depends on take tokens ahead of searches
+PRIORITY_OPERATIONS = {"purchase", "get_agreements", "verify_registrant_email"}
+
+
+def backoff_delay(backoff, attempt, headers=None):
+    """Honor a short Retry-After, otherwise exponential backoff with full jitter."""
+    if headers is not None and headers.get("Retry-After", "").isdigit():
+        return min(float(headers["Retry-After"]), MAX_RETRY_AFTER)
+    return random.uniform(0, backoff * (2 ** attempt))
+
+
+def should_retry(status_code, idempotent):
+    return status_code == 429 or (idempotent and status_code in RETRY_STATUSES)
+
+
+def never_sent(error):
+    """Whether a requests ConnectionError happened while connecting, before any of the request went out."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # requests wraps urllib3's error in a MaxRetryError, its ``reason`` is what went wrong
+    reason = getattr(error.args[0], "reason", error.args[0]) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def lane(operation):
+    """The rate limit lane of an operation and how long it may wait for a token."""
+    if operation in PRIORITY_OPERATIONS:
+        return PRIORITY, settings.GODADDY_RATE_LIMIT_PRIORITY_WAIT
+    return SEARCH, settings.GODADDY_RATE_LIMIT_SEARCH_WAIT
+
+
+class GoDaddyClient:
+    """
+    Thin wrapper around one pooled ``requests.Session`` for the GoDaddy API.
+
+    Connections are kept alive and reused between calls, the ``sso-key``
+    header is built once, and every call gets connect/read timeouts. Calls
+    answered with 429 or a 5xx status (or that fail to connect) are retried
+    with exponential backoff and full jitter. Non idempotent calls such as a
+    purchase are only retried on 429 and when the connection could not be
+    opened, when GoDaddy cannot have acted on them: a connection dropped
+    after the request was sent is raised instead.
+
+    Every attempt takes a token from the shared rate limit bucket first and
+    none is sent while the circuit breaker is open; both raise a subclass of
+    ``UpstreamUnavailable`` instead.
+    """
+
+    def __init__(self, base_url=None, api_key=None, api_secret=None, pool_size=None,
+                 connect_timeout=None, read_timeout=None, max_retries=None, backoff=None):
+        self._base_url = base_url
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else settings.GODADDY_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else settings.GODADDY_READ_TIMEOUT,
+        )
+        self.max_retries = max_retries if max_retries is not None else settings.GODADDY_MAX_RETRIES
+        self.backoff = backoff if backoff is not None else settings.GODADDY_RETRY_BACKOFF
+        self.bucket = godaddy_bucket
+        self.circuit = godaddy_circuit
+
+        api_key = api_key or settings.GODADDY_API_KEY
+        api_secret = api_secret or settings.GODADDY_API_SECRET_KEY
+        pool_size = pool_size or settings.GODADDY_POOL_SIZE
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "content-type": "application/json",
+            "Authorization": f"sso-key {api_key}:{api_secret}",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def base_url(self):
+        return self._base_url or settings.GODADDY_API_URL
+
+    def admit(self, operation):
+        """Wait for a rate limit token, raises UpstreamUnavailable when the call must not be sent."""
+        if self.circuit.is_open():
+            count_rejected("godaddy", operation, "circuit_open")
+            raise CircuitOpen("GoDaddy is failing, calls are paused")
+        try:
+            self.bucket.acquire(*lane(operation))
+        except RateLimited:
+            count_rejected("godaddy", operation, "rate_limited")
+            raise
+        # Checked again after the wait, and claims the trial call of a half open circuit
+        if not self.circuit.allow():
+            count_rejected("godaddy", operation, "circuit_open")
+            raise CircuitOpen("GoDaddy is failing, calls are paused")
+
+    def request(self, method, path, idempotent=True, operation=None, **kwargs):
+        url = f"{self.base_url}{path}"
+        operation = operation or path
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self.admit(operation)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError as error:
+                observe_upstream("godaddy", operation, started, "error")
+                self.circuit.record(False)
+                if attempt >= self.max_retries or not (idempotent or never_sent(error)):
+                    raise
+                time.sleep(backoff_delay(self.backoff, attempt))
+            except Exception:
+                observe_upstream("godaddy", operation, started, "error")
+                self.circuit.record(False)
+                raise
+            else:
+                observe_upstream("godaddy", operation, started, response.status_code)
+                self.circuit.record(response.status_code not in FAILURE_STATUSES)
+                if not should_retry(response.status_code, idempotent) or attempt >= self.max_retries:
+                    return response
+                time.sleep(backoff_delay(self.backoff, attempt, response.headers))
+            count_retry("godaddy", operation)
+            attempt += 1
+
+    def check_available(self, domain):
+        return self.request(
+            "GET", "/v1/domains/available", operation="check_available", params={"domain": domain}
+        )
+
+    def check_available_bulk(self, domains):
+        # The bulk check only reads, so it is as safe to retry as a GET
+        return self.request(
+            "POST", "/v1/domains/available", operation="check_available_bulk",
+            params={"checkType": "FAST"}, json=list(domains),
+        )
+
+    def get_agreements(self, tlds, privacy="false"):
+        return self.request(
+            "GET", "/v1/domains/agreements", operation="get_agreements",
+            params={"tlds": list(tlds), "privacy": privacy},
+        )
+
+    def purchase(self, payload):
+        return self.request(
+            "POST", "/v1/domains/purchase", idempotent=False, operation="purchase", json=payload
+        )
+
+    def verify_registrant_email(self, domain):
+        return self.request(
+            "POST", f"/v1/domains/{domain}/verifyRegistrantEmail", idempotent=False,
+            operation="verify_registrant_email",
+        )
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return this process' shared client, a forked worker gets its own pool."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = GoDaddyClient()
+                _client_pid = os.getpid()
+    return _client
+
+
+class AsyncGoDaddyClient(GoDaddyClient):
+    """
+    The same API on top of a pooled ``httpx.AsyncClient``, for the async views.
+
+    Responses expose the same ``status_code``/``json()``/``headers`` interface
+    as the sync client's.
+    """
+
+    def __init__(self, base_url=None, api_key=None, api_secret=None, pool_size=None,
+                 connect_timeout=None, read_timeout=None, max_retries=None, backoff=None):
+        self._base_url = base_url
+        connect_timeout = connect_timeout if connect_timeout is not None else settings.GODADDY_CONNECT_TIMEOUT
+        read_timeout = read_timeout if read_timeout is not None else settings.GODADDY_READ_TIMEOUT
+        self.max_retries = max_retries if max_retries is not None else settings.GODADDY_MAX_RETRIES
+        self.backoff = backoff if backoff is not None else settings.GODADDY_RETRY_BACKOFF
+        self.bucket = godaddy_bucket
+        self.circuit = godaddy_circuit
+
+        api_key = api_key or settings.GODADDY_API_KEY
+        api_secret = api_secret or settings.GODADDY_API_SECRET_KEY
+        pool_size = pool_size or settings.GODADDY_POOL_SIZE
+
+        self.session = httpx.AsyncClient(
+            headers={
+                "content-type": "application/json",
+                "Authorization": f"sso-key {api_key}:{api_secret}",
+            },
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size),
+        )
+
+    async def admit(self, operation):
+        if await self.circuit.ais_open():
+            count_rejected("godaddy", operation, "circuit_open")
+            raise CircuitOpen("GoDaddy is failing, calls are paused")
+        try:
+            await self.bucket.aacquire(*lane(operation))
+        except RateLimited:
+            count_rejected("godaddy", operation, "rate_limited")
+            raise
+        if not await self.circuit.aallow():
+            count_rejected("godaddy", operation, "circuit_open")
+            raise CircuitOpen("GoDaddy is failing, calls are paused")
+
+    async def request(self, method, path, idempotent=True, operation=None, **kwargs):
+        url = f"{self.base_url}{path}"
+        operation = operation or path
+        attempt = 0
+        while True:
+            await self.admit(operation)
+            started = time.perf_counter()
+            try:
+                response = await self.session.request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # Both happen before the request is sent, so non idempotent calls are safe to retry too
+                observe_upstream("godaddy", operation, started, "error")
+                await self.circuit.arecord(False)
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(self.backoff, attempt))
+            except Exception:
+                observe_upstream("godaddy", operation, started, "error")
+                await self.circuit.arecord(False)
+                raise
+            else:
+                observe_upstream("godaddy", operation, started, response.status_code)
+                await self.circuit.arecord(response.status_code not in FAILURE_STATUSES)
+                if not should_retry(response.status_code, idempotent) or attempt >= self.max_retries:
+                    return response
+                await asyncio.sleep(backoff_delay(self.backoff, attempt, response.headers))
+            count_retry("godaddy", operation)
+            attempt += 1
+
+
+# httpx connections belong to the event loop that opened them, so keep one client per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Return the shared async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncGoDaddyClient()
+    return client
@@ -0,0 +1,171 @@
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def fingerprint(request):
+    # Keys are scoped per view, so the sync and async URL of a view share them
+    return hashlib.sha256(request.body).hexdigest()
+
+
+def claim(scope, key, request_fingerprint):
+    """
+    Register the key as in flight, returns ``(record, created)``.
+
+    ``created`` is False when the key is already taken, ``record`` then is
+    the existing entry. Expired entries are replaced.
+    """
+    expires_at = timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    scope=scope, key=key, fingerprint=request_fingerprint, expires_at=expires_at
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if record is None:
+                continue  # Released in the meantime, try again
+            if record.expires_at > timezone.now():
+                return record, False
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=timezone.now()).delete()
+    return record, False
+
+
+def wait_for(record):
+    """Wait for a concurrent request with the same key to finish, returns the finished record or None."""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while record is not None and record.status != IdempotencyKey.COMPLETED:
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.1)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+    return record
+
+
+def replay(record):
+    response = HttpResponse(
+        bytes(record.response_body or b""),
+        status=record.response_status,
+        content_type=record.response_content_type,
+    )
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def keep(response):
+    """
+    Mark a 5xx response to be stored like any other. For outcomes that are not
+    known, such as a purchase GoDaddy received but never answered, where
+    running the view again could repeat it.
+    """
+    response.idempotent_keep = True
+    return response
+
+
+def finish(record, response):
+    """Store the response for replays, or release the key when it is worth retrying."""
+    if response.streaming or (response.status_code >= 500 and not getattr(response, "idempotent_keep", False)):
+        record.delete()
+        return
+    record.status = IdempotencyKey.COMPLETED
+    record.response_status = response.status_code
+    record.response_content_type = response.get("Content-Type", "")
+    record.response_body = response.content
+    record.save(update_fields=["status", "response_status", "response_content_type", "response_body"])
+
+
+def resolve(scope, key, request_fingerprint):
+    """
+    Claim the key for this request. Returns ``(record, None)`` when the view
+    should run, or ``(None, response)`` with the response to send instead.
+    """
+    if len(key) > 255:
+        return None, JsonResponse({"error": f"{HEADER} must be at most 255 characters"}, status=400)
+
+    record, created = claim(scope, key, request_fingerprint)
+    if created:
+        return record, None
+    if record is None:
+        return None, JsonResponse(
+            {"error": f"A request with this {HEADER} is still in progress"}, status=409
+        )
+    if record.fingerprint != request_fingerprint:
+        return None, JsonResponse(
+            {"error": f"{HEADER} was already used with a different request"}, status=422
+        )
+    record = wait_for(record)
+    if record is None:
+        return None, JsonResponse(
+            {"error": f"A request with this {HEADER} is still in progress"}, status=409
+        )
+    return None, replay(record)
+
+
+def idempotent(view):
+    """
+    Make a POST view safe to retry with an ``Idempotency-Key`` header.
+
+    The first request with a key runs the view and its response is stored
+    for ``IDEMPOTENCY_KEY_TTL`` seconds; repeats with the same body get the
+    stored response without running the view again, and concurrent repeats
+    wait for the first one to finish. 5xx responses are not stored so the
+    client can retry them, unless the view marked them with ``keep()``.
+    Requests without the header are not affected.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key or request.method != "POST":
+                return await view(request, *args, **kwargs)
+
+            scope = view.__name__
+            # Not thread sensitive: waiting on a concurrent duplicate must not
+            # block the shared thread that duplicate needs to store its response
+            record, response = await sync_to_async(resolve, thread_sensitive=False)(
+                scope, key, fingerprint(request)
+            )
+            if response is not None:
+                return response
+            try:
+                response = await view(request, *args, **kwargs)
+            except Exception:
+                await sync_to_async(record.delete)()
+                raise
+            await sync_to_async(finish)(record, response)
+            return response
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or request.method != "POST":
+            return view(request, *args, **kwargs)
+
+        scope = view.__name__
+        record, response = resolve(scope, key, fingerprint(request))
+        if response is not None:
+            return response
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        finish(record, response)
+        return response
+
+    return wrapper
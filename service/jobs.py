@@ -0,0 +1,211 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .agreements import agreement_cache
+from .contacts import contact_profile
+from .godaddy import RETRY_STATUSES, get_client, never_sent
+from .models import Purchase, PurchaseJob
+from .purchasing import build_purchase_payload, purchase_details, purchase_error, purchase_result
+from .ratelimit import UpstreamUnavailable
+
+# Purchase.status follows its job: PENDING while queued, PROCESSING while a
+# worker registers the domain, then SUCCESS or FAILED, or UNCONFIRMED when
+# nobody knows whether GoDaddy registered it
+PURCHASE_STATUS = {
+    PurchaseJob.QUEUED: "PENDING",
+    PurchaseJob.RUNNING: "PROCESSING",
+    PurchaseJob.SUCCEEDED: "SUCCESS",
+    PurchaseJob.FAILED: "FAILED",
+    PurchaseJob.UNCONFIRMED: "UNCONFIRMED",
+}
+FINISHED = {PurchaseJob.SUCCEEDED, PurchaseJob.FAILED, PurchaseJob.UNCONFIRMED}
+
+
+class TransientError(Exception):
+    """The purchase was not sent to the registrar, it is worth retrying."""
+
+
+class UnconfirmedError(Exception):
+    """The purchase was sent but its outcome is unknown, sending it again could register and charge twice."""
+
+
+def enqueue_purchase(data, checkout_session, agreed_by):
+    """Record a pending purchase and queue its registration, returns the job."""
+    with transaction.atomic():
+        purchase = Purchase.objects.create(
+            checkout_session=checkout_session,
+            contact=contact_profile(data),
+            status=PURCHASE_STATUS[PurchaseJob.QUEUED],
+            **purchase_details(data),
+        )
+        return PurchaseJob.objects.create(purchase=purchase, request_data=data, agreed_by=agreed_by)
+
+
+def set_status(job, status, **fields):
+    job.status = status
+    for name, value in fields.items():
+        setattr(job, name, value)
+    with transaction.atomic():
+        job.save(update_fields=["status", "updated_at", *fields])
+        Purchase.objects.filter(pk=job.purchase_id).update(status=PURCHASE_STATUS[status])
+
+
+def release_stale_jobs():
+    """
+    Set aside jobs whose worker died mid-run. It may have sent the purchase
+    already, so they need reconciliation instead of being sent again.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.PURCHASE_JOB_LOCK_TIMEOUT)
+    stale = PurchaseJob.objects.filter(status=PurchaseJob.RUNNING, locked_at__lt=cutoff)
+    for job in stale:
+        set_status(
+            job,
+            PurchaseJob.UNCONFIRMED,
+            error="The worker stopped while registering the domain",
+            locked_by="",
+            locked_at=None,
+        )
+
+
+def claim_job(worker_id):
+    """
+    Atomically take the next due job, or return None.
+
+    The conditional UPDATE only succeeds for one worker per job, which works
+    the same on SQLite (no SELECT ... FOR UPDATE SKIP LOCKED) and Postgres.
+    """
+    now = timezone.now()
+    due = (
+        PurchaseJob.objects.filter(status=PurchaseJob.QUEUED, run_after__lte=now)
+        .order_by("run_after")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in due:
+        claimed = PurchaseJob.objects.filter(pk=pk, status=PurchaseJob.QUEUED).update(
+            status=PurchaseJob.RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+            updated_at=now,
+        )
+        if claimed:
+            Purchase.objects.filter(job__pk=pk).update(status=PURCHASE_STATUS[PurchaseJob.RUNNING])
+            return PurchaseJob.objects.select_related("purchase__contact").get(pk=pk)
+    return None
+
+
+def register(job):
+    """Run the GoDaddy side of a purchase, returns ``(succeeded, response_data)``."""
+    data = job.request_data
+    domain_name = data["domain_name"]
+    try:
+        agreements = agreement_cache.get([domain_name.split(".")[-1]])
+    except UpstreamUnavailable as unavailable:
+        raise TransientError(str(unavailable))
+    except requests.exceptions.HTTPError as http_err:
+        if http_err.response.status_code in RETRY_STATUSES:
+            raise TransientError(str(http_err))
+        return False, {"message": "Failed to fetch agreements"}
+    except requests.exceptions.RequestException as req_err:
+        raise TransientError(str(req_err))
+
+    if not agreements or "agreementKey" not in agreements[0]:
+        return False, {"message": "Missing legal agreement consent"}
+
+    payload = build_purchase_payload(
+        data,
+        agreements[0]["agreementKey"],
+        datetime.now().isoformat() + "Z",  # ISO8601 format with UTC
+        job.agreed_by,
+        job.purchase.contact.godaddy_contacts,
+    )
+    try:
+        response = get_client().purchase(payload)
+    except UpstreamUnavailable as unavailable:
+        raise TransientError(str(unavailable))  # Held back by the rate limiter or the circuit breaker
+    except requests.exceptions.ConnectionError as conn_err:
+        if never_sent(conn_err):
+            raise TransientError(str(conn_err))
+        raise UnconfirmedError(str(conn_err))
+    except requests.exceptions.RequestException as req_err:
+        raise UnconfirmedError(str(req_err))  # e.g. a read timeout, GoDaddy may still be processing it
+    if response.status_code == 429:
+        raise TransientError("GoDaddy answered 429")
+    if response.status_code in RETRY_STATUSES:
+        raise UnconfirmedError(f"GoDaddy answered {response.status_code}, the order may have gone through")
+
+    response_data = response.json()
+    response_data["status"] = "SUCCESS" if response.status_code == 200 else "FAILED"
+    return response.status_code == 200, response_data
+
+
+def process_job(job):
+    """Register the job's domain and record the outcome on the job and its purchase."""
+    try:
+        succeeded, response_data = register(job)
+    except TransientError as error:
+        if job.attempts >= settings.PURCHASE_JOB_MAX_ATTEMPTS:
+            set_status(job, PurchaseJob.FAILED, error=str(error), locked_by="", locked_at=None)
+        else:
+            # Exponential backoff with jitter before the next attempt
+            delay = random.uniform(0, settings.PURCHASE_JOB_RETRY_BACKOFF * (2 ** job.attempts))
+            set_status(
+                job,
+                PurchaseJob.QUEUED,
+                error=str(error),
+                run_after=timezone.now() + timedelta(seconds=delay),
+                locked_by="",
+                locked_at=None,
+            )
+        return job
+    except UnconfirmedError as error:
+        set_status(job, PurchaseJob.UNCONFIRMED, error=str(error), locked_by="", locked_at=None)
+        return job
+    except Exception as error:
+        set_status(job, PurchaseJob.FAILED, error=str(error), locked_by="", locked_at=None)
+        return job
+
+    domain_name = job.request_data["domain_name"]
+    if succeeded:
+        Purchase.objects.filter(pk=job.purchase_id).update(order_id=response_data.get("orderId"))
+        set_status(job, PurchaseJob.SUCCEEDED, result=purchase_result(domain_name, response_data), error="")
+    else:
+        result = purchase_error(response_data)
+        set_status(job, PurchaseJob.FAILED, result=result, error=result["error"])
+    return job
+
+
+def job_status(job):
+    """The body served for a job by purchase_job_status."""
+    return {
+        "job_id": job.pk,
+        "status": job.status,
+        "purchase_status": PURCHASE_STATUS[job.status],
+        "attempts": job.attempts,
+        "result": job.result,
+        "error": job.error or None,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat(),
+    }
+
+
+def iter_job_status(job_id, poll_interval=0.5, timeout=60):
+    """Yield ``("status", body)`` whenever the job changes, until it finishes or ``timeout`` passes."""
+    deadline = time.monotonic() + timeout
+    last = None
+    while True:
+        job = PurchaseJob.objects.get(pk=job_id)
+        body = job_status(job)
+        if body != last:
+            yield "status", body
+            last = body
+        if job.status in FINISHED or time.monotonic() >= deadline:
+            return
+        time.sleep(poll_interval)
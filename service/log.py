@@ -0,0 +1,106 @@
+"""
+Structured logging: JSON lines written by a background thread.
+
+``BackgroundJSONHandler`` only puts records on a queue, so a request never
+waits on the output stream; a ``QueueListener`` thread redacts, formats and
+writes them. ``SamplingFilter`` keeps a fraction of DEBUG records so debug
+logging can stay on under load. Both are wired up in ``settings.LOGGING``.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has, anything else was passed with extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+REDACTED = "[redacted]"
+# Purchase request fields and their GoDaddy contact payload counterparts
+PII_FIELDS = {
+    "email", "phone", "address1", "address2", "city", "state", "postal_code", "first_name", "last_name",
+    "addressMailing", "postalCode", "nameFirst", "nameLast", "nameMiddle", "fax",
+}
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+
+
+def redact(value):
+    """``value`` with PII fields masked, recursing into dicts and lists."""
+    if isinstance(value, dict):
+        return {key: REDACTED if key in PII_FIELDS else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return EMAIL.sub(REDACTED, value)
+    return value
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record with the ``extra=`` fields at the top level, PII redacted."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": EMAIL.sub(REDACTED, record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = REDACTED if key in PII_FIELDS else redact(value)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Let through ``rate`` of the DEBUG records (at random) and every record above DEBUG."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class BackgroundJSONHandler(QueueHandler):
+    """
+    Queue records for a background thread that writes them as JSON to ``stream``.
+
+    The queue is bounded; when the writer falls behind, records are dropped
+    rather than blocking the request that logged them.
+    """
+
+    def __init__(self, stream=None, max_queue_size=10000):
+        super().__init__(queue.Queue(max_queue_size))
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(JSONFormatter())
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        # Flush what is still queued when the process exits
+        atexit.register(self.stop)
+
+    def prepare(self, record):
+        # The base class formats the message here, on the logging thread; keep
+        # the record as is and let the listener thread do the formatting
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def stop(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.stop()
+        super().close()
+
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, Length
+
+from service.models import ContactProfile, Purchase
+
+# The columns Purchase carried itself before contact profiles, email was always the checkout session's
+PURCHASE_COLUMNS = ["first_name", "last_name", "phone", "address1", "address2", "city", "state", "postal_code", "country"]
+FOREIGN_KEY_BYTES = 8
+
+
+def text_bytes(prefix, fields):
+    # Character counts, the same as bytes for the ASCII most contact details are
+    return Coalesce(Sum(sum((Length(f"{prefix}{field}") for field in fields), Value(0))), 0)
+
+
+class Command(BaseCommand):
+    help = "Report the contact storage ContactProfile saves over one copy of the details per purchase."
+
+    def handle(self, *args, **options):
+        purchases = Purchase.objects.aggregate(
+            count=Count("id"), inline=text_bytes("contact__", PURCHASE_COLUMNS)
+        )
+        profiles = ContactProfile.objects.aggregate(
+            count=Count("id"), stored=text_bytes("", ["fingerprint", *ContactProfile.FIELDS])
+        )
+        inline = purchases["inline"]
+        stored = profiles["stored"] + FOREIGN_KEY_BYTES * purchases["count"]
+        saved = inline - stored
+        self.stdout.write(f"Purchases:              {purchases['count']}")
+        self.stdout.write(f"Contact profiles:       {profiles['count']}")
+        if profiles["count"]:
+            self.stdout.write(f"Purchases per profile:  {purchases['count'] / profiles['count']:.2f}")
+        self.stdout.write(f"Copied per purchase:    {inline} bytes")
+        self.stdout.write(f"Profiles + references:  {stored} bytes")
+        percent = f" ({saved / inline:.1%})" if inline else ""
+        self.stdout.write(f"Saved:                  {saved} bytes{percent}")
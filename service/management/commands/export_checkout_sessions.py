@@ -0,0 +1,51 @@
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from service.exports import export_rows, iter_csv
+
+
+class Command(BaseCommand):
+    help = "Append the checkout sessions created since the last run to the CSV export."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=settings.CSV_EXPORT_PATH, help="CSV file to append to")
+        parser.add_argument(
+            "--full", action="store_true",
+            help="rewrite the file from scratch instead of appending",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        # The id of the last exported session, kept next to the CSV file
+        watermark_path = path.with_name(path.name + ".watermark")
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        since_id = None
+        if not options["full"] and path.exists() and watermark_path.exists():
+            since_id = json.loads(watermark_path.read_text())["last_id"]
+        mode = "a" if since_id is not None else "w"
+
+        last_id = since_id
+        count = 0
+
+        def on_row(pk):
+            nonlocal last_id, count
+            last_id = pk
+            count += 1
+
+        with open(path, mode, newline="", encoding="utf-8") as csv_file:
+            for chunk in iter_csv(export_rows(since_id=since_id), include_header=mode == "w", on_row=on_row):
+                csv_file.write(chunk)
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
+
+        if last_id is not None:
+            # Written after the rows so a crash in between re-exports rather than skips rows
+            tmp_path = watermark_path.with_name(watermark_path.name + ".tmp")
+            tmp_path.write_text(json.dumps({"last_id": last_id}))
+            os.replace(tmp_path, watermark_path)
+        self.stdout.write(f"Exported {count} checkout sessions to {path}")
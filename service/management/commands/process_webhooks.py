@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from service.webhooks import process_batch
+
+
+class Command(BaseCommand):
+    help = "Apply the Stripe webhook events queued by the stripe-webhook endpoint in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.WEBHOOK_BATCH_SIZE,
+            help="events applied per transaction",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0,
+            help="seconds to wait when the inbox is empty",
+        )
+        parser.add_argument(
+            "--burst", action="store_true",
+            help="exit once the inbox is empty instead of waiting for more",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                processed = process_batch(options["batch_size"])
+                if processed:
+                    self.stdout.write(f"applied {processed} events")
+                    continue
+                if options["burst"]:
+                    return
+                time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,53 @@
+import time
+from itertools import chain
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from service.models import Purchase
+from service.taken_filter import read_domains, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the taken-domain Bloom filter from seed files, purchases and the names searches saw taken."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "files", nargs="*",
+            help="seed domain lists (e.g. zone exports) on top of TAKEN_FILTER_SEED_FILES, - reads stdin",
+        )
+        parser.add_argument("--capacity", type=int, help="names to size the filter for, at least TAKEN_FILTER_CAPACITY")
+        parser.add_argument("--error-rate", type=float, help="false positive rate, default TAKEN_FILTER_ERROR_RATE")
+        parser.add_argument(
+            "--every", type=float,
+            help="keep running and rebuild every this many seconds",
+        )
+
+    def seeds(self, files):
+        purchased = (
+            Purchase.objects.filter(status="SUCCESS")
+            .values_list("checkout_session__domain_name", flat=True)
+            .iterator(chunk_size=10000)
+        )
+        return chain(purchased, *(read_domains(path) for path in [*settings.TAKEN_FILTER_SEED_FILES, *files]))
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                started = time.monotonic()
+                seeds, observed, capacity = rebuild(
+                    (domain.lower() for domain in self.seeds(options["files"])),
+                    options["capacity"],
+                    options["error_rate"],
+                )
+                self.stdout.write(
+                    f"Wrote {settings.TAKEN_FILTER_PATH}: {seeds} seeded and {observed} observed names, "
+                    f"capacity {capacity}, in {time.monotonic() - started:.1f}s"
+                )
+                if not options["every"]:
+                    return
+                time.sleep(options["every"])
+        except KeyboardInterrupt:
+            pass
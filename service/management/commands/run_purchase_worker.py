@@ -0,0 +1,69 @@
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from service.jobs import claim_job, process_job, release_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued domain purchases with a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=settings.PURCHASE_WORKERS,
+            help="number of jobs processed in parallel",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0,
+            help="seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--burst", action="store_true",
+            help="exit once no job is due instead of waiting for more",
+        )
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stop = threading.Event()
+        release_stale_jobs()
+
+        def work(name):
+            try:
+                while not stop.is_set():
+                    close_old_connections()
+                    job = claim_job(name)
+                    if job is None:
+                        if options["burst"]:
+                            return
+                        stop.wait(options["poll_interval"])
+                        continue
+                    process_job(job)
+                    self.stdout.write(f"job {job.pk} {job.status} (attempt {job.attempts})")
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=work, args=(f"{worker_id}:{i}",), daemon=True)
+            for i in range(options["workers"])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            released_at = time.monotonic()
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.5)
+                if time.monotonic() - released_at >= settings.PURCHASE_JOB_LOCK_TIMEOUT:
+                    # Catch jobs abandoned by other workers while this one runs
+                    close_old_connections()
+                    release_stale_jobs()
+                    released_at = time.monotonic()
+        except KeyboardInterrupt:
+            # Let the running jobs finish before exiting
+            stop.set()
+            for thread in threads:
+                thread.join()
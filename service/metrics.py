@@ -0,0 +1,126 @@
+"""
+Prometheus metrics for views and outbound GoDaddy/Stripe calls.
+
+With ``PROMETHEUS_MULTIPROC_DIR`` set (before the process starts) every
+worker process writes its samples to its own memory-mapped files in that
+directory and ``/metrics`` sums them, so any worker can serve the totals.
+Without it the metrics cover the serving process only.
+"""
+import contextvars
+import os
+import re
+import time
+
+import stripe
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client import CONTENT_TYPE_LATEST  # noqa: F401 (re-exported for the metrics view)
+
+# Upstream calls take from milliseconds (cached agreements) to the read timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Duration of one outbound request attempt.",
+    ["upstream", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_REQUESTS = Counter(
+    "upstream_requests_total",
+    "Outbound request attempts by response status, 'error' when no response came back.",
+    ["upstream", "operation", "status"],
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total",
+    "Outbound requests retried after a failed attempt.",
+    ["upstream", "operation"],
+)
+UPSTREAM_REJECTED = Counter(
+    "upstream_rejected_total",
+    "Outbound requests not sent because of the client-side rate limit or an open circuit.",
+    ["upstream", "operation", "reason"],
+)
+VIEW_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time until a view returned its response (the first chunk for streaming responses).",
+    ["view", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+VIEW_RESPONSES = Counter(
+    "http_responses_total",
+    "Responses by view and status code.",
+    ["view", "method", "status"],
+)
+
+
+def observe_upstream(upstream, operation, started, status):
+    UPSTREAM_LATENCY.labels(upstream, operation).observe(time.perf_counter() - started)
+    UPSTREAM_REQUESTS.labels(upstream, operation, str(status)).inc()
+
+
+def count_retry(upstream, operation):
+    UPSTREAM_RETRIES.labels(upstream, operation).inc()
+
+
+def count_rejected(upstream, operation, reason):
+    UPSTREAM_REJECTED.labels(upstream, operation, reason).inc()
+
+
+def render():
+    """The current metrics in the Prometheus text format."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+# Stripe object ids (cs_test_..., evt_...) in URLs, collapsed to keep the label cardinality bounded
+STRIPE_ID = re.compile(r"/[a-z]+_(?:test_|live_)?[A-Za-z0-9]*[0-9A-Z][A-Za-z0-9]*")
+_stripe_operation = contextvars.ContextVar("stripe_operation", default="unknown")
+
+
+def stripe_operation(method, url):
+    path = STRIPE_ID.sub("/:id", url.split("://", 1)[-1].split("?", 1)[0].partition("/")[2])
+    return f"{method.upper()} /{path}"
+
+
+class StripeHTTPClient(stripe.RequestsClient):
+    """Stripe's default HTTP client, timing every attempt and counting its retries."""
+
+    def request(self, method, url, headers, post_data=None):
+        operation = stripe_operation(method, url)
+        _stripe_operation.set(operation)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = super().request(method, url, headers, post_data)
+            status = response[1]
+            return response
+        finally:
+            observe_upstream("stripe", operation, started, status)
+
+    async def request_async(self, method, url, headers, post_data=None):
+        operation = stripe_operation(method, url)
+        _stripe_operation.set(operation)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await super().request_async(method, url, headers, post_data)
+            status = response[1]
+            return response
+        finally:
+            observe_upstream("stripe", operation, started, status)
+
+    def _sleep_time_seconds(self, num_retries, response=None):
+        # Called once before each retry, right after the attempt that failed
+        count_retry("stripe", _stripe_operation.get())
+        return super()._sleep_time_seconds(num_retries, response)
+
+
+def instrument_stripe():
+    """Route the stripe library's requests through ``StripeHTTPClient``."""
+    stripe.default_http_client = StripeHTTPClient(
+        verify_ssl_certs=stripe.verify_ssl_certs,
+        proxy=stripe.proxy,
+        async_fallback_client=stripe.HTTPXClient(verify_ssl_certs=stripe.verify_ssl_certs, proxy=stripe.proxy),
+    )
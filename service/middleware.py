@@ -0,0 +1,37 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import VIEW_LATENCY, VIEW_RESPONSES
+
+
+class MetricsMiddleware:
+    """Record the latency and status of every response, labelled with the URL name of its view."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    def observe(self, request, response, started):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        VIEW_LATENCY.labels(view, request.method).observe(time.perf_counter() - started)
+        VIEW_RESPONSES.labels(view, request.method, str(response.status_code)).inc()
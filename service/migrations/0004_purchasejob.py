@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchase',
+            name='order_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='PurchaseJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_data', models.JSONField()),
+                ('agreed_by', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('SUCCEEDED', 'Succeeded'), ('FAILED', 'Failed')], default='QUEUED', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=255)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('purchase', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='job', to='service.purchase')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='purchasejob_status_due_idx')],
+            },
+        ),
+    ]
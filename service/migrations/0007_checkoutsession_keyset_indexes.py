@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0006_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checkoutsession',
+            index=models.Index(fields=['created_at', 'id'], name='checkout_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkoutsession',
+            index=models.Index(fields=['email', 'created_at', 'id'], name='checkout_email_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkoutsession',
+            index=models.Index(fields=['domain_name', 'created_at', 'id'], name='checkout_domain_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0007_checkoutsession_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checkoutsession',
+            index=models.Index(fields=['domain_name', 'email'], name='checkout_domain_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['status', 'created_at'], name='purchase_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['created_at'], name='purchase_created_idx'),
+        ),
+    ]
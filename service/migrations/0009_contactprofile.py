@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0008_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('email', models.EmailField(max_length=254)),
+                ('first_name', models.CharField(max_length=50)),
+                ('last_name', models.CharField(max_length=50)),
+                ('phone', models.CharField(max_length=20)),
+                ('address1', models.CharField(max_length=255)),
+                ('address2', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(max_length=50)),
+                ('state', models.CharField(max_length=50)),
+                ('postal_code', models.CharField(max_length=20)),
+                ('country', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='purchase',
+            name='contact',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='purchases', to='service.contactprofile'),
+        ),
+    ]
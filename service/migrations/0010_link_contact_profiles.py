@@ -0,0 +1,70 @@
+import hashlib
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+CONTACT_COLUMNS = [
+    'first_name', 'last_name', 'phone', 'address1', 'address2', 'city', 'state', 'postal_code', 'country',
+]
+# Frozen copies of service.contacts as of this migration, so later changes there do not change what it does
+PROFILE_FIELDS = ['email', *CONTACT_COLUMNS]
+
+
+def contact_details(data):
+    details = {field: ' '.join(str(data.get(field) or '').split()) for field in PROFILE_FIELDS}
+    details['email'] = details['email'].lower()
+    details['country'] = details['country'].upper()
+    return details
+
+
+def fingerprint(details):
+    return hashlib.sha256('\0'.join(details[field] for field in PROFILE_FIELDS).encode()).hexdigest()
+
+
+def batches(items):
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
+
+
+def link_contact_profiles(apps, schema_editor):
+    """Point every purchase at the profile of its contact columns, one profile per distinct contact."""
+    ContactProfile = apps.get_model('service', 'ContactProfile')
+    Purchase = apps.get_model('service', 'Purchase')
+    details = {}  # fingerprint -> profile fields
+    purchase_ids = {}  # fingerprint -> ids of the purchases with that contact
+    # Purchases never stored an email, it was the checkout session's
+    rows = Purchase.objects.values_list('pk', 'checkout_session__email', *CONTACT_COLUMNS).order_by('pk')
+    for pk, email, *columns in rows.iterator(chunk_size=BATCH_SIZE):
+        contact = contact_details({**dict(zip(CONTACT_COLUMNS, columns)), 'email': email})
+        key = fingerprint(contact)
+        details.setdefault(key, contact)
+        purchase_ids.setdefault(key, []).append(pk)
+
+    for keys in batches(list(details)):
+        ContactProfile.objects.bulk_create([ContactProfile(fingerprint=key, **details[key]) for key in keys])
+        # bulk_create does not set primary keys on every backend, read them back
+        for key, profile_id in ContactProfile.objects.filter(fingerprint__in=keys).values_list('fingerprint', 'pk'):
+            # One UPDATE per profile instead of a CASE over every purchase
+            for ids in batches(purchase_ids[key]):
+                Purchase.objects.filter(pk__in=ids).update(contact_id=profile_id)
+
+
+def copy_contacts_back(apps, schema_editor):
+    ContactProfile = apps.get_model('service', 'ContactProfile')
+    Purchase = apps.get_model('service', 'Purchase')
+    for profile in ContactProfile.objects.values('pk', *CONTACT_COLUMNS).iterator(chunk_size=BATCH_SIZE):
+        Purchase.objects.filter(contact_id=profile.pop('pk')).update(**profile)
+    # Every purchase has its contact columns back, so no profile is left behind
+    Purchase.objects.update(contact_id=None)
+    ContactProfile.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0009_contactprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_contact_profiles, copy_contacts_back),
+    ]
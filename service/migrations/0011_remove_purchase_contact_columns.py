@@ -0,0 +1,94 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0010_link_contact_profiles'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchase',
+            name='contact',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='purchases', to='service.contactprofile'),
+        ),
+        # Unapplying adds the columns back to existing rows, 0010 then copies the contacts into them
+        migrations.AlterField(
+            model_name='purchase',
+            name='first_name',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='last_name',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='phone',
+            field=models.CharField(default='', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='address1',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='city',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='state',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='postal_code',
+            field=models.CharField(default='', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='country',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.RemoveField(
+            model_name='purchase',
+            name='address1',
+        ),
+        migrations.RemoveField(
+            model_name='purchase',
+            name='address2',
+        ),
+        migrations.RemoveField(
+            model_name='purchase',
+            name='city',
+        ),
+        migrations.RemoveField(
+            model_name='purchase',
+            name='country',
+        ),
+        migrations.RemoveField(
+            model_name='purchase',
+            name='first_name',
+        ),
+        migrations.RemoveField(
+            model_name='purchase',
+            name='last_name',
+        ),
+        migrations.RemoveField(
+            model_name='purchase',
+            name='phone',
+        ),
+        migrations.RemoveField(
+            model_name='purchase',
+            name='postal_code',
+        ),
+        migrations.RemoveField(
+            model_name='purchase',
+            name='state',
+        ),
+    ]
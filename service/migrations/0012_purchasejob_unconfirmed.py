@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0011_remove_purchase_contact_columns'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchasejob',
+            name='status',
+            field=models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('SUCCEEDED', 'Succeeded'), ('FAILED', 'Failed'), ('UNCONFIRMED', 'Needs reconciliation')], default='QUEUED', max_length=20),
+        ),
+    ]
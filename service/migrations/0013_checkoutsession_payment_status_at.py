@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0012_purchasejob_unconfirmed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkoutsession',
+            name='payment_status_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0013_checkoutsession_payment_status_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+    ]
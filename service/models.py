@@ -1,4 +1,8 @@
 from django.db import models
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .purchasing import build_contacts
 
 class CheckoutSession(models.Model):
     session_id = models.CharField(max_length=255, unique=True)
@@ -7,28 +11,168 @@ class CheckoutSession(models.Model):
     period = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=10)
+    payment_status = models.CharField(max_length=20, blank=True)  # Stripe's payment_status, set from webhooks
+    paid_at = models.DateTimeField(blank=True, null=True)
+    # Stripe's created time of the event payment_status came from, older events do not overwrite it
+    payment_status_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # checkout-session-details pages newest first on (created_at, id),
+            # optionally filtered by email or domain name
+            models.Index(fields=['created_at', 'id'], name='checkout_created_id_idx'),
+            models.Index(fields=['email', 'created_at', 'id'], name='checkout_email_created_idx'),
+            models.Index(fields=['domain_name', 'created_at', 'id'], name='checkout_domain_created_idx'),
+            # purchase_domain looks the session up by domain name and email
+            models.Index(fields=['domain_name', 'email'], name='checkout_domain_email_idx'),
+        ]
+
     def __str__(self):
         return f"Session ID: {self.session_id} - Domain: {self.domain_name}"
 
 
-class Purchase(models.Model):
-    order_id = models.CharField(max_length=255, unique=True)
-    checkout_session = models.ForeignKey(CheckoutSession, on_delete=models.CASCADE, related_name='purchases')
+class ContactProfile(models.Model):
+    """
+    A registrant's contact details, stored once however many domains they buy.
+
+    ``fingerprint`` is the sha256 of the normalized fields (see
+    ``service.contacts``), so the same details always map to the same row and
+    a profile never changes: other details make another profile.
+    """
+
+    FIELDS = [
+        'email', 'first_name', 'last_name', 'phone', 'address1', 'address2', 'city', 'state', 'postal_code', 'country',
+    ]
+
+    fingerprint = models.CharField(max_length=64, unique=True)
+    email = models.EmailField()
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
     phone = models.CharField(max_length=20)
     address1 = models.CharField(max_length=255)
-    address2 = models.CharField(max_length=255, blank=True, null=True)
+    address2 = models.CharField(max_length=255, blank=True)
     city = models.CharField(max_length=50)
     state = models.CharField(max_length=50)
     postal_code = models.CharField(max_length=20)
     country = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.first_name} {self.last_name} <{self.email}>"
+
+    @cached_property
+    def godaddy_contacts(self):
+        """The four contact blocks of a GoDaddy purchase payload, built once per instance."""
+        return build_contacts({field: getattr(self, field) for field in self.FIELDS})
+
+
+class Purchase(models.Model):
+    order_id = models.CharField(max_length=255, unique=True, blank=True, null=True)  # Set once GoDaddy accepts the order
+    checkout_session = models.ForeignKey(CheckoutSession, on_delete=models.CASCADE, related_name='purchases')
+    # Shared by every purchase with the same contact details instead of copied per row
+    contact = models.ForeignKey(ContactProfile, on_delete=models.PROTECT, related_name='purchases')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=10)
     status = models.CharField(max_length=50, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # The admin changelist filters on status and created_at, newest first
+            models.Index(fields=['status', 'created_at'], name='purchase_status_created_idx'),
+            models.Index(fields=['created_at'], name='purchase_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order ID: {self.order_id} - Domain: {self.checkout_session.domain_name}"
+
+
+class PurchaseJob(models.Model):
+    """A queued domain registration, processed by the run_purchase_worker command."""
+
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    SUCCEEDED = 'SUCCEEDED'
+    FAILED = 'FAILED'
+    # The purchase may have reached GoDaddy but its outcome is unknown, check the account before retrying
+    UNCONFIRMED = 'UNCONFIRMED'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (UNCONFIRMED, 'Needs reconciliation'),
+    ]
+
+    purchase = models.OneToOneField(Purchase, on_delete=models.CASCADE, related_name='job')
+    request_data = models.JSONField()  # The purchase_domain request body
+    agreed_by = models.CharField(max_length=255)  # Client IP recorded as the agreements' consent
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Workers pick the next due job with status=QUEUED ordered by run_after
+            models.Index(fields=['status', 'run_after'], name='purchasejob_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} - {self.status} - Domain: {self.request_data.get('domain_name')}"
+
+
+class IdempotencyKey(models.Model):
+    """The stored outcome of a request sent with an Idempotency-Key header."""
+
+    PROCESSING = 'PROCESSING'
+    COMPLETED = 'COMPLETED'
+
+    scope = models.CharField(max_length=100)  # The endpoint the key was used on
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of the request body
+    status = models.CharField(max_length=20, default=PROCESSING)
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_content_type = models.CharField(max_length=255, blank=True)
+    response_body = models.BinaryField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotencykey_scope_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} - {self.status}"
+
+
+class WebhookEvent(models.Model):
+    """A verified Stripe webhook event, applied in batches by the process_webhooks command."""
+
+    event_id = models.CharField(max_length=255, unique=True)  # Stripe retries deliver the same id
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)  # failed tries at applying the event
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker drains unprocessed events in arrival order
+            models.Index(
+                fields=['id'],
+                name='webhookevent_pending_idx',
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} - {self.type}"
@@ -0,0 +1,59 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    position = json.dumps([created_at.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(position).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, pk = json.loads(base64.urlsafe_b64decode(padded))
+        created_at = parse_datetime(created_at)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if created_at is None or not isinstance(pk, int):
+        raise InvalidCursor("Invalid cursor")
+    return created_at, pk
+
+
+def keyset_page(queryset, cursor=None, limit=100):
+    """
+    One page of ``queryset`` ordered newest first on ``(created_at, id)``.
+
+    Instead of an OFFSET the page starts right after the cursor's row, so
+    every page is an index range scan no matter how deep it is. Returns
+    ``(rows, next_cursor)``, ``next_cursor`` is None on the last page.
+    """
+    queryset = queryset.order_by("-created_at", "-id")
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].pk)
+
+
+def parse_bound(value, name):
+    """A ``created_after``/``created_before`` query parameter, an ISO date or datetime."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"{name} must be an ISO date or datetime")
+        parsed = parse_datetime(f"{day.isoformat()}T00:00:00")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
@@ -0,0 +1,121 @@
+from decimal import Decimal
+
+REQUIRED_FIELDS = [
+    "domain_name",
+    "email",
+    "period",
+    "first_name",
+    "last_name",
+    "phone",
+    "address1",
+    "city",
+    "state",
+    "postal_code",
+    "country",
+    "amount",
+]
+
+
+def missing_field(data):
+    """Return the first required purchase field missing from ``data``, if any."""
+    for field in REQUIRED_FIELDS:
+        if not data.get(field):
+            return field
+    return None
+
+
+def build_contacts(details):
+    """
+    The ``contactAdmin``/``contactBilling``/``contactRegistrant``/``contactTech``
+    blocks of a GoDaddy purchase payload, all four from the same ``details``.
+    """
+    address = {
+        "address1": details["address1"],
+        "address2": details.get("address2") or "",
+        "city": details["city"],
+        "country": details["country"],
+        "postalCode": details["postal_code"],
+        "state": details["state"],
+    }
+    contact = {
+        "addressMailing": address,
+        "email": details["email"],
+        "phone": details["phone"],
+        "nameFirst": details["first_name"],
+        "nameLast": details["last_name"],
+    }
+    billing = {
+        **contact,
+        "fax": details["phone"],
+        "jobTitle": "string",
+        "nameMiddle": "string",
+        "organization": "string",
+    }
+    return {
+        "contactAdmin": contact,
+        "contactBilling": billing,
+        "contactRegistrant": contact,
+        # "entityType": "INDIVIDUAL" and "language": "en" could be added to the registrant
+        "contactTech": billing,
+    }
+
+
+def build_purchase_payload(data, agreement_key, agreed_at, agreed_by, contacts):
+    """
+    Build the GoDaddy ``/v1/domains/purchase`` body from the purchase request
+    fields and the contact blocks of its ContactProfile (``godaddy_contacts``).
+    """
+    # Data payload for domain registration
+    return {
+        "consent": {
+            "agreedAt": agreed_at,
+            "agreedBy": agreed_by,
+            "agreementKeys": [agreement_key],
+        },
+        **contacts,
+        "domain": data["domain_name"],
+        "nameServers": [
+            "ns01.domaincontrol.com",
+            "ns02.domaincontrol.com",
+        ],
+        "period": int(data["period"]),
+        # "privacy": False,
+        "renewAuto": True,
+    }
+
+
+def purchase_details(data):
+    """The ``Purchase`` columns taken from the purchase request, the contact details go to its ContactProfile."""
+    return {
+        "amount": Decimal(data["amount"]),
+        "currency": data.get("currency", "USD").upper(),
+    }
+
+
+def purchase_result(domain_name, response_data):
+    """The purchase_domain response body for a successful GoDaddy purchase."""
+    return {
+        "domain_name": domain_name,
+        "status": response_data.get("status", "PENDING"),
+        "order_id": response_data.get("orderId"),
+        "currency": response_data.get("currency"),
+        "total": response_data.get("total"),
+        "item_count": response_data.get("itemCount"),
+    }
+
+
+def purchase_error(response_data):
+    """The purchase_domain response body for a purchase GoDaddy rejected."""
+    return {
+        "error": response_data.get("message", "An error occurred"),
+        "fields": response_data.get("fields", {}),
+    }
+
+
+def purchase_unconfirmed(domain_name, reason):
+    """The purchase_domain response body when GoDaddy got the purchase but its outcome is not known."""
+    return {
+        "domain_name": domain_name,
+        "status": "UNCONFIRMED",
+        "error": f"The purchase may have gone through, it needs reconciliation: {reason}",
+    }
@@ -0,0 +1,227 @@
+"""
+Signed price quotes that carry a search result over to checkout and purchase.
+
+Every available domain a search returns gets a ``quote_id``: the domain,
+price, currency and period signed with ``SECRET_KEY``, so a client can not
+change the price it is charged. The quote is also kept in the
+``QUOTE_CACHE_ALIAS`` cache for ``QUOTE_TTL`` seconds, and while it is there
+checkout and purchase use it as is. A quote that dropped out of the cache
+(expired, evicted or issued by another process) is checked with GoDaddy once
+more before it is used, and refused after ``QUOTE_MAX_AGE`` seconds.
+"""
+import hashlib
+from decimal import Decimal
+from threading import Lock
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+from .godaddy import RETRY_STATUSES, get_client
+from .ratelimit import UpstreamUnavailable
+
+SALT = "service.quotes"
+MAX_PERIOD = 10  # years, the longest registration GoDaddy accepts
+
+
+class QuoteError(Exception):
+    """The quote can not be used, ``status`` is the HTTP status to answer with."""
+
+    status = 400
+
+    def payload(self):
+        return {"error": str(self)}
+
+
+class InvalidQuote(QuoteError):
+    pass
+
+
+class QuoteExpired(QuoteError):
+    status = 410
+
+
+class QuoteChanged(QuoteError):
+    """GoDaddy's answer changed since the quote, ``quote`` is the new one or None when the domain is taken."""
+
+    status = 409
+
+    def __init__(self, message, quote=None):
+        super().__init__(message)
+        self.quote = quote
+
+    def payload(self):
+        return {"error": str(self), "quote": self.quote}
+
+
+def minor_units(price):
+    # GoDaddy prices are in micro-units, Stripe and Purchase.amount use cents
+    return int(price) // 10_000
+
+
+class QuoteStore:
+    """
+    Issues quotes for availability results and looks them up again.
+
+    A quote is ``{"domain", "price", "currency", "period", "amount"}`` with the
+    GoDaddy price in micro-units and ``amount`` in cents. Hit and miss
+    counters are kept per process, every miss costs a GoDaddy lookup.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.QUOTE_CACHE_ALIAS]
+
+    def key(self, quote_id):
+        # Quote ids are a few hundred characters, too long for e.g. memcached keys
+        return f"quote:{hashlib.sha256(quote_id.encode()).hexdigest()[:32]}"
+
+    def sign(self, result):
+        """``(quote_id, quote)`` for an availability result, or ``(None, None)`` if it can not be quoted."""
+        if not result.get("available") or result.get("stale") or not result.get("definitive", True):
+            return None, None
+        if result.get("price") is None:
+            return None, None
+        quote = {
+            "domain": result["domain"].lower(),
+            "price": int(result["price"]),
+            "currency": result.get("currency", "USD"),
+            "period": int(result.get("period", 1)),
+        }
+        quote["amount"] = minor_units(quote["price"])
+        return signing.dumps(quote, salt=SALT, compress=True), quote
+
+    def save(self, quotes):
+        """Keep ``{quote_id: quote}`` for ``QUOTE_TTL`` seconds."""
+        if quotes:
+            self.cache.set_many(
+                {self.key(quote_id): quote for quote_id, quote in quotes.items()},
+                timeout=settings.QUOTE_TTL,
+            )
+
+    def attach(self, results):
+        """``results`` with a ``quote_id`` added to each one that can be quoted."""
+        quotes = {}
+        quoted = []
+        for result in results:
+            quote_id, quote = self.sign(result)
+            if quote_id:
+                quotes[quote_id] = quote
+                result = {**result, "quote_id": quote_id}
+            quoted.append(result)
+        self.save(quotes)
+        return quoted
+
+    def get(self, quote_id, domain=None):
+        """
+        The quote behind ``quote_id``, checked with GoDaddy again when it is no longer cached.
+
+        Raises InvalidQuote when the id was tampered with or is for another
+        ``domain``, QuoteExpired past ``QUOTE_MAX_AGE``, QuoteChanged when
+        GoDaddy now answers differently and UpstreamUnavailable when it can
+        not be asked.
+        """
+        try:
+            signed = signing.loads(quote_id, salt=SALT, max_age=settings.QUOTE_MAX_AGE)
+        except signing.SignatureExpired:
+            raise QuoteExpired("The quote expired, search for the domain again")
+        except signing.BadSignature:
+            raise InvalidQuote("Invalid quote_id")
+        if domain and domain.lower() != signed["domain"]:
+            raise InvalidQuote(f"The quote is for {signed['domain']}")
+
+        quote = self.cache.get(self.key(quote_id))
+        with self.lock:
+            if quote is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if quote is not None:
+            return quote
+        return self.recheck(quote_id, signed)
+
+    def recheck(self, quote_id, signed):
+        response = get_client().check_available(signed["domain"])
+        if response.status_code in RETRY_STATUSES:
+            raise UpstreamUnavailable(f"GoDaddy could not confirm the quote (status {response.status_code})")
+        result = response.json()
+        if not result.get("available"):
+            raise QuoteChanged(f"{signed['domain']} is no longer available")
+
+        new_id, quote = self.sign({**result, "domain": signed["domain"]})
+        if quote is None:
+            raise QuoteChanged(f"GoDaddy did not confirm the price of {signed['domain']}")
+        if quote != signed:
+            self.save({new_id: quote})
+            raise QuoteChanged(f"The price of {signed['domain']} changed", {**quote, "quote_id": new_id})
+        self.save({quote_id: quote})
+        return quote
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+quote_store = QuoteStore()
+
+
+def quoted_price(quote, period):
+    """The price in cents of registering the quoted domain for ``period`` years."""
+    return quote["amount"] * int(period) // quote["period"]
+
+
+def requested_period(data, quote):
+    """The period ``data`` asks for, the quote's when it sends none, raises InvalidQuote unless 1 to MAX_PERIOD years."""
+    period = data.get("period")
+    if period is None or period == "":
+        return quote["period"]
+    try:
+        # Through str so 1.5 and true are refused instead of truncated to 1
+        period = int(str(period))
+    except ValueError:
+        raise InvalidQuote("period must be a whole number of years")
+    if not 1 <= period <= MAX_PERIOD:
+        raise InvalidQuote(f"period must be between 1 and {MAX_PERIOD} years")
+    return period
+
+
+def checkout_terms(data):
+    """
+    ``(domain_name, price in cents, period)`` for a checkout request, from its
+    quote when it sent a ``quote_id`` and else from the posted ``price``.
+    """
+    quote_id = data.get("quote_id")
+    if not quote_id:
+        if settings.QUOTE_REQUIRED:
+            raise InvalidQuote("quote_id is required")
+        return data.get("name"), Decimal(data.get("price")) * 100, data.get("period")
+    quote = quote_store.get(quote_id, domain=data.get("name"))
+    period = requested_period(data, quote)
+    return quote["domain"], Decimal(quoted_price(quote, period)), period
+
+
+def purchase_terms(data):
+    """The purchase request ``data`` with the domain, amount and currency of its quote, if it sent one."""
+    quote_id = data.get("quote_id")
+    if not quote_id:
+        if settings.QUOTE_REQUIRED:
+            raise InvalidQuote("quote_id is required")
+        return data
+    quote = quote_store.get(quote_id, domain=data.get("domain_name"))
+    period = requested_period(data, quote)
+    return {
+        **data,
+        "domain_name": quote["domain"],
+        "period": period,
+        "amount": quoted_price(quote, period),
+        "currency": quote["currency"],
+    }
@@ -0,0 +1,246 @@
+"""
+Client-side rate limiting and circuit breaking for the GoDaddy API.
+
+GoDaddy limits each API key (about 60 requests a minute on OTE) and answers
+429 past that. Every call first takes a token from a bucket kept in the
+``GODADDY_RATE_LIMIT_CACHE_ALIAS`` cache, and is not sent while the circuit
+breaker in the same cache is open. With a shared backend whose ``incr`` is
+atomic (Redis, Memcached) all processes draw from one bucket and see one
+circuit; the default local memory backend limits each process on its own.
+"""
+import asyncio
+import time
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+# Lanes: purchases and the calls they depend on may take the tokens kept in
+# reserve and go ahead of waiting searches
+PRIORITY = "priority"
+SEARCH = "search"
+
+
+class UpstreamUnavailable(requests.exceptions.ConnectionError):
+    """
+    The call was not sent to the upstream.
+
+    A ConnectionError, so callers that already treat a failed connection as
+    transient (the purchase worker, agreement lookups) handle it the same way.
+    """
+
+
+class RateLimited(UpstreamUnavailable):
+    """No token came free before the caller's wait ran out."""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """The upstream failed too often recently, calls fail fast until it recovers."""
+
+
+class TokenBucket:
+    """
+    Token bucket holding up to ``GODADDY_RATE_LIMIT_BURST`` tokens, refilled
+    at ``GODADDY_RATE_LIMIT`` tokens per minute.
+
+    Its state is a start time and a counter of the tokens taken since, which is
+    only changed with the cache's atomic ``incr``/``decr``: by time ``t`` at
+    most ``burst + rate * t`` tokens can have been taken. A caller takes a
+    token by incrementing the counter and gives it back when that went over.
+    The counter of an idle bucket is moved up so idle time never saves more
+    than ``burst`` tokens.
+
+    Search calls leave the last ``GODADDY_RATE_LIMIT_RESERVE`` tokens to the
+    priority lane and take none while a priority call is waiting for one.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def cache(self):
+        return caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS]
+
+    @property
+    def rate(self):
+        return settings.GODADDY_RATE_LIMIT / 60  # tokens per second
+
+    @property
+    def enabled(self):
+        return settings.GODADDY_RATE_LIMIT > 0
+
+    def key(self, part):
+        return f"ratelimit:{self.name}:{part}"
+
+    def take(self, lane):
+        """Take one token, returns 0 or the seconds until one may be free for ``lane``."""
+        cache = self.cache
+        burst = max(1, settings.GODADDY_RATE_LIMIT_BURST)
+        floor = 0
+        if lane == SEARCH:
+            if (cache.get(self.key("waiting")) or 0) > 0:
+                return 1 / self.rate
+            floor = min(settings.GODADDY_RATE_LIMIT_RESERVE, burst - 1)
+
+        if cache.add(self.key("start"), time.time(), timeout=None):
+            cache.set(self.key("taken"), 0, timeout=None)
+        start = cache.get(self.key("start"))
+        if start is None:
+            return 1 / self.rate  # Evicted right now, the next try starts over
+        try:
+            taken = cache.incr(self.key("taken"))
+        except ValueError:
+            cache.add(self.key("taken"), 0, timeout=None)
+            taken = cache.incr(self.key("taken"))
+
+        left = burst + self.rate * (time.time() - start) - taken
+        if left < floor:
+            cache.decr(self.key("taken"))
+            return (floor - left) / self.rate
+        if left > burst - 1:
+            self.catch_up(burst, start)
+        return 0
+
+    def catch_up(self, burst, start):
+        # Concurrent callers would each add the idle tokens, only one at a time moves the counter
+        lock = self.key("catching-up")
+        if not self.cache.add(lock, True, timeout=1):
+            return
+        try:
+            left = burst + self.rate * (time.time() - start) - (self.cache.get(self.key("taken")) or 0)
+            idle = int(left - (burst - 1))
+            if idle > 0:
+                self.cache.incr(self.key("taken"), idle)
+        finally:
+            self.cache.delete(lock)
+
+    def queue(self, delta):
+        # Searches stand back while priority calls wait. A crashed waiter is
+        # forgotten when the key expires.
+        key = self.key("waiting")
+        self.cache.add(key, 0, timeout=int(settings.GODADDY_RATE_LIMIT_PRIORITY_WAIT) + 1)
+        try:
+            self.cache.incr(key, delta)
+        except ValueError:
+            pass
+
+    def acquire(self, lane, timeout):
+        """Wait up to ``timeout`` seconds for a token, raises RateLimited if none came free."""
+        if not self.enabled:
+            return
+        deadline = time.monotonic() + timeout
+        queued = False
+        try:
+            while True:
+                wait = self.take(lane)
+                if not wait:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimited(f"No {self.name} rate limit token came free within {timeout:g}s")
+                if lane == PRIORITY and not queued:
+                    self.queue(1)
+                    queued = True
+                time.sleep(min(wait, remaining))
+        finally:
+            if queued:
+                self.queue(-1)
+
+    async def aacquire(self, lane, timeout):
+        """Async version of ``acquire``."""
+        if not self.enabled:
+            return
+        take = sync_to_async(self.take, thread_sensitive=False)
+        queue = sync_to_async(self.queue, thread_sensitive=False)
+        deadline = time.monotonic() + timeout
+        queued = False
+        try:
+            while True:
+                wait = await take(lane)
+                if not wait:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimited(f"No {self.name} rate limit token came free within {timeout:g}s")
+                if lane == PRIORITY and not queued:
+                    await queue(1)
+                    queued = True
+                await asyncio.sleep(min(wait, remaining))
+        finally:
+            if queued:
+                await queue(-1)
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing.
+
+    ``GODADDY_CIRCUIT_FAILURE_THRESHOLD`` failed calls (no answer or a 5xx)
+    within ``GODADDY_CIRCUIT_WINDOW`` seconds open the circuit: calls fail fast
+    for ``GODADDY_CIRCUIT_COOLDOWN`` seconds. Then a single trial call is let
+    through; the circuit closes if it succeeds and opens again if it fails.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def cache(self):
+        return caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS]
+
+    @property
+    def enabled(self):
+        return settings.GODADDY_CIRCUIT_FAILURE_THRESHOLD > 0
+
+    def key(self, part):
+        return f"circuit:{self.name}:{part}"
+
+    def is_open(self):
+        return self.enabled and bool(self.cache.get(self.key("open")))
+
+    def allow(self):
+        """Whether a call may be sent now, the caller must ``record()`` how it went."""
+        if not self.enabled:
+            return True
+        cache = self.cache
+        if cache.get(self.key("open")):
+            return False
+        if cache.get(self.key("tripped")):
+            # Half open: only the caller that claims the trial goes through
+            return cache.add(self.key("trial"), True, timeout=settings.GODADDY_CIRCUIT_COOLDOWN)
+        return True
+
+    def record(self, succeeded):
+        if not self.enabled:
+            return
+        cache = self.cache
+        tripped = cache.get(self.key("tripped"))
+        if succeeded:
+            if tripped:
+                cache.delete_many([self.key("tripped"), self.key("trial"), self.key("failures")])
+            return
+
+        window = settings.GODADDY_CIRCUIT_WINDOW
+        cache.add(self.key("failures"), 0, timeout=window)
+        try:
+            failures = cache.incr(self.key("failures"))
+        except ValueError:
+            failures = 1  # The window ended in between
+        if tripped or failures >= settings.GODADDY_CIRCUIT_FAILURE_THRESHOLD:
+            cache.set(self.key("open"), True, timeout=settings.GODADDY_CIRCUIT_COOLDOWN)
+            cache.set(self.key("tripped"), True, timeout=None)
+            cache.delete_many([self.key("failures"), self.key("trial")])
+
+    async def ais_open(self):
+        return await sync_to_async(self.is_open, thread_sensitive=False)()
+
+    async def aallow(self):
+        return await sync_to_async(self.allow, thread_sensitive=False)()
+
+    async def arecord(self, succeeded):
+        await sync_to_async(self.record, thread_sensitive=False)(succeeded)
+
+
+godaddy_bucket = TokenBucket("godaddy")
+godaddy_circuit = CircuitBreaker("godaddy")
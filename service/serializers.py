@@ -1,7 +1,15 @@
 from rest_framework import serializers
+from .contacts import contact_profile
 from .models import CheckoutSession, Purchase
 
 class CheckoutSessionSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            # Only serialize the requested fields
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = CheckoutSession
         fields = [
@@ -11,11 +19,29 @@ class CheckoutSessionSerializer(serializers.ModelSerializer):
             'period',
             'price',
             'currency',
+            'payment_status',
+            'paid_at',
             'created_at',
         ]
 
 
 class PurchaseSerializer(serializers.ModelSerializer):
+    # The contact details are stored on the purchase's ContactProfile
+    first_name = serializers.CharField(source='contact.first_name', max_length=50)
+    last_name = serializers.CharField(source='contact.last_name', max_length=50)
+    phone = serializers.CharField(source='contact.phone', max_length=20)
+    address1 = serializers.CharField(source='contact.address1', max_length=255)
+    address2 = serializers.CharField(source='contact.address2', max_length=255, required=False, allow_blank=True)
+    city = serializers.CharField(source='contact.city', max_length=50)
+    state = serializers.CharField(source='contact.state', max_length=50)
+    postal_code = serializers.CharField(source='contact.postal_code', max_length=20)
+    country = serializers.CharField(source='contact.country', max_length=50)
+
+    def create(self, validated_data):
+        details = validated_data.pop('contact')
+        details['email'] = validated_data['checkout_session'].email
+        return super().create({**validated_data, 'contact': contact_profile(details)})
+
     class Meta:
         model = Purchase
         fields = [
@@ -35,3 +61,15 @@ class PurchaseSerializer(serializers.ModelSerializer):
             'status',
             'created_at',
         ]
+
+
+class CheckoutSessionSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CheckoutSession
+        fields = ['session_id', 'domain_name', 'email']
+
+
+class PurchaseReadSerializer(PurchaseSerializer):
+    """Purchases with their checkout session nested, query them with select_related('checkout_session', 'contact')."""
+
+    checkout_session = CheckoutSessionSummarySerializer(read_only=True)
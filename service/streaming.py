@@ -0,0 +1,79 @@
+import json
+
+from django.http import StreamingHttpResponse
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def stream_format(request, data):
+    """
+    Return the streaming format asked for by the search request, or None.
+
+    Clients either send ``"stream": "ndjson"`` / ``"stream": "sse"``
+    (``true`` means NDJSON) or ask for one of the content types in ``Accept``.
+    """
+    stream = data.get("stream")
+    if stream is True:
+        return "ndjson"
+    if stream in CONTENT_TYPES:
+        return stream
+    accept = request.headers.get("Accept", "")
+    for fmt, content_type in CONTENT_TYPES.items():
+        if content_type in accept:
+            return fmt
+    return None
+
+
+def encode(fmt, event, data):
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+
+def streaming_response(events, fmt):
+    """
+    Stream ``(event, data)`` pairs as NDJSON lines or Server-Sent Events.
+    ``events`` may be a sync or an async iterator.
+    """
+    if hasattr(events, "__aiter__"):
+        async def content():
+            async for event, data in events:
+                yield encode(fmt, event, data)
+        content = content()
+    else:
+        content = (encode(fmt, event, data) for event, data in events)
+
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[fmt])
+    # Make sure proxies hand every record to the client right away
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def search_summary(data):
+    # The available domains were already streamed one by one
+    return {
+        "available_count": len(data["available_domains"]),
+        "partial": data["partial"],
+        "pending_domains": data["pending_domains"],
+    }
+
+
+def streaming_search_response(events, fmt):
+    """
+    Stream ``("available", result)`` events followed by one ``("summary", payload)``
+    event from a domain search.
+    """
+    if hasattr(events, "__aiter__"):
+        async def search_events():
+            async for event, data in events:
+                yield event, search_summary(data) if event == "summary" else data
+        return streaming_response(search_events(), fmt)
+
+    return streaming_response(
+        ((event, search_summary(data) if event == "summary" else data) for event, data in events),
+        fmt,
+    )
@@ -0,0 +1,204 @@
+"""
+Ranked domain name suggestions for a keyword whose exact names are taken.
+
+Candidates are generated from a word index loaded once per process (affixes,
+synonym groups and TLD weights in ``data/suggestion_words.json``): TLD swaps,
+hyphenation, synonym swaps and prefixes/suffixes. They are pruned locally
+before GoDaddy is asked: names in the taken filter (seeded with zone exports
+and purchases by ``manage.py rebuild_taken_filter``) or that the
+availability cache already knows are taken never cost an upstream lookup.
+"""
+import json
+import re
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from .availability import availability_cache, lookup_domains, use_bulk
+from .quotes import quote_store
+from .taken_filter import observe_taken, taken_filter
+
+WORDS_PATH = Path(__file__).resolve().parent / "data" / "suggestion_words.json"
+
+# How much a kind of candidate is worth before its TLD and length are weighed in
+KIND_WEIGHTS = {"tld": 1.0, "hyphen": 0.8, "synonym": 0.75, "prefix": 0.6, "suffix": 0.6}
+LABEL = re.compile(r"^[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$")
+
+
+def normalize(keyword):
+    """The bare second level label of ``keyword``: lowercased, without TLD, scheme or stray characters."""
+    keyword = keyword.strip().lower().split("://")[-1].split("/")[0]
+    keyword = keyword.removeprefix("www.").split(".")[0]
+    return re.sub(r"[^a-z0-9-]", "", keyword).strip("-")
+
+
+class SuggestionIndex:
+    """
+    The word lists, indexed for candidate generation.
+
+    Every synonym group is expanded into a word -> alternatives map, and the
+    vocabulary of all known words is kept with its longest entry so keywords
+    can be split into words without a dictionary scan.
+    """
+
+    def __init__(self, prefixes, suffixes, synonyms, tlds):
+        self.prefixes = tuple(prefixes)
+        self.suffixes = tuple(suffixes)
+        self.tlds = {tld.lower(): weight for tld, weight in tlds.items()}
+        self.synonyms = {}
+        for group in synonyms:
+            for word in group:
+                alternatives = self.synonyms.setdefault(word, [])
+                alternatives.extend(other for other in group if other != word and other not in alternatives)
+        self.vocabulary = set(self.synonyms) | set(self.prefixes) | set(self.suffixes)
+        self.longest = max(map(len, self.vocabulary), default=0)
+
+    @classmethod
+    def load(cls, path=WORDS_PATH):
+        with open(path, encoding="utf-8") as words:
+            return cls(**json.load(words))
+
+    def segment(self, label):
+        """
+        Split ``label`` into known words, e.g. ``bestpizza`` -> ``["best", "pizza"]``.
+
+        Picks the split with the fewest characters outside the vocabulary, then
+        the fewest pieces; runs of unknown characters stay together.
+        """
+        # best[i]: (unknown characters, pieces, words, ends in an unknown run) for label[:i]
+        best = [(0, 0, [], False)] + [None] * len(label)
+        for end in range(1, len(label) + 1):
+            unknown, pieces, words, in_run = best[end - 1]
+            if in_run:
+                options = [(unknown + 1, pieces, words[:-1] + [words[-1] + label[end - 1]], True)]
+            else:
+                options = [(unknown + 1, pieces + 1, words + [label[end - 1]], True)]
+            for start in range(max(0, end - self.longest), end):
+                word = label[start:end]
+                if word in self.vocabulary:
+                    unknown, pieces, words, _ = best[start]
+                    options.append((unknown, pieces + 1, words + [word], False))
+            best[end] = min(options, key=lambda option: option[:2])
+        return best[-1][2]
+
+    def names(self, label):
+        """Yield ``(name, kind)`` for every alternative second level name of ``label``."""
+        words = self.segment(label)
+        if len(words) > 1:
+            yield "-".join(words), "hyphen"
+        for position, word in enumerate(words):
+            for alternative in self.synonyms.get(word, ()):
+                yield "".join(words[:position] + [alternative] + words[position + 1:]), "synonym"
+        for prefix in self.prefixes:
+            if not label.startswith(prefix):
+                yield prefix + label, "prefix"
+        for suffix in self.suffixes:
+            if not label.endswith(suffix):
+                yield label + suffix, "suffix"
+
+    def score(self, name, tld, kind):
+        # Short names on popular TLDs first
+        length_penalty = 1 + max(0, len(name) - 8) * 0.05
+        return round(KIND_WEIGHTS[kind] * self.tlds.get(tld, 0.2) / length_penalty, 4)
+
+    def candidates(self, keyword, extensions=()):
+        """
+        Every candidate for ``keyword`` as ``(domain, kind, score)``, best first.
+
+        ``extensions`` are the TLDs the client searched; the keyword itself is
+        only suggested on the other ``SUGGESTIONS_TLDS``, new names on both.
+        """
+        label = normalize(keyword)
+        if not label:
+            return []
+        searched = [ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in extensions]
+        tlds = list(dict.fromkeys(searched + list(settings.SUGGESTIONS_TLDS)))
+
+        found = {}
+        for tld in tlds:
+            if tld not in searched:
+                found[f"{label}{tld}"] = ("tld", self.score(label, tld, "tld"))
+        for name, kind in self.names(label):
+            if not LABEL.match(name):
+                continue
+            for tld in tlds:
+                domain = f"{name}{tld}"
+                score = self.score(name, tld, kind)
+                if domain not in found or found[domain][1] < score:
+                    found[domain] = (kind, score)
+        return sorted(
+            ((domain, kind, score) for domain, (kind, score) in found.items()),
+            key=lambda candidate: (-candidate[2], candidate[0]),
+        )
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """This process' word index, loaded on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SuggestionIndex.load()
+    return _index
+
+
+def suggest_domains(keyword, extensions=(), limit=None, max_lookups=None):
+    """
+    Up to ``limit`` available alternatives to ``keyword``, best first.
+
+    Candidates are looked up in rank order, a window of ``2 * limit`` at a
+    time, and at most ``max_lookups`` of them are sent to GoDaddy per call.
+    Returns ``{"suggestions": [...], "partial": bool, "stats": {...}}``, each
+    suggestion with a ``quote_id`` for checkout, where
+    the stats count candidates generated, pruned by the taken filter and by
+    the availability cache, and looked up upstream.
+    """
+    limit = limit or settings.SUGGESTIONS_LIMIT
+    max_lookups = settings.SUGGESTIONS_MAX_LOOKUPS if max_lookups is None else max_lookups
+    candidates = get_index().candidates(keyword, extensions)
+    stats = {"generated": len(candidates), "known_taken": 0, "cached": 0, "looked_up": 0}
+
+    taken = set(taken_filter().known_taken(domain for domain, _, _ in candidates))
+    candidates = [candidate for candidate in candidates if candidate[0] not in taken]
+    stats["known_taken"] = stats["generated"] - len(candidates)
+
+    domains = [domain for domain, _, _ in candidates]
+    known = availability_cache.get_many(domains)
+    for domain, result in availability_cache.get_stale_many(
+        [domain for domain in domains if domain not in known]
+    ).items():
+        if not result.get("available"):
+            known[domain] = result  # Taken an hour ago is taken now, free names get checked again
+    stats["cached"] = len(known)
+
+    suggestions = []
+    partial = False
+    window = 2 * limit
+    for start in range(0, len(candidates), window):
+        batch = candidates[start:start + window]
+        unknown = [domain for domain, _, _ in batch if domain not in known]
+        unknown = unknown[:max(0, max_lookups - stats["looked_up"])]
+        checked = {}
+        for domain, result in lookup_domains(unknown, bulk=use_bulk(len(unknown))):
+            if result is None:
+                partial = True
+                continue
+            known[domain] = result
+            if "available" in result and not result.get("stale"):
+                checked[domain] = result
+        stats["looked_up"] += len(unknown)
+        availability_cache.set_many(checked)
+        observe_taken(checked)
+
+        for domain, kind, score in batch:
+            result = known.get(domain)
+            if result and result.get("available"):
+                suggestions.append({**result, "domain": domain, "kind": kind, "score": score})
+        if len(suggestions) >= limit or stats["looked_up"] >= max_lookups:
+            break
+    return {"suggestions": quote_store.attach(suggestions[:limit]), "partial": partial, "stats": stats}
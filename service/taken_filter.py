@@ -0,0 +1,225 @@
+"""
+Bloom filter of domain names known to be registered.
+
+Short popular names are almost always taken, so searches answer "taken" for
+names in the filter without asking GoDaddy (``"fresh": true`` skips it). The
+filter lives in ``TAKEN_FILTER_PATH`` and every worker maps the file shared
+and writable: a name one worker sees answered as taken is visible to all of
+them right away. Each new observation is also appended to a journal, which
+``manage.py rebuild_taken_filter`` periodically folds into a fresh, right
+sized filter together with the seed files, dropping observations older than
+``TAKEN_FILTER_MAX_AGE`` so names that expired become searchable again.
+"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+
+def read_domains(path):
+    """One domain per line, the first comma or whitespace separated column of e.g. a zone export."""
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as domains:
+        for line in domains:
+            domain = line.replace(",", " ").split(maxsplit=1)[0] if line.strip() else ""
+            if domain and not domain.startswith("#"):
+                yield domain.rstrip(".").lower()
+
+
+class TakenFilter:
+    """
+    A Bloom filter over lowercased domain names in a memory-mapped file.
+
+    Sized for ``capacity`` names at ``error_rate`` false positives: about
+    1.44 * log2(1 / error_rate) bits per name, e.g. 1.8MB for a million names
+    at 0.1%. Bits are set in place. Without a file the filter is empty and
+    nothing is observed until the first rebuild.
+    """
+
+    MAGIC = b"BLOOM1\0\0"
+    HEADER = struct.Struct("<8sQIQ")  # magic, bits, hashes per name, capacity
+
+    def __init__(self, path):
+        self.path = path
+        self.version = None
+        self.bits = None
+        self.size = self.hashes = self.capacity = 0
+        self.hits = 0
+        try:
+            with open(path, "r+b") as filter_file:
+                self.version = os.fstat(filter_file.fileno()).st_ino
+                magic, self.size, self.hashes, self.capacity = self.HEADER.unpack(
+                    filter_file.read(self.HEADER.size)
+                )
+                if magic != self.MAGIC:
+                    raise ValueError(f"{path} is not a taken filter file")
+                self.map = mmap.mmap(filter_file.fileno(), 0)
+                self.bits = memoryview(self.map)[self.HEADER.size:]
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def dimensions(capacity, error_rate):
+        """The number of bits and of hashes per name for ``capacity`` names at ``error_rate``."""
+        size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        return size, max(1, round(size / capacity * math.log(2)))
+
+    @staticmethod
+    def positions(domain, size, hashes):
+        # Double hashing: two 64 bit halves of one digest stand in for ``hashes`` hash functions
+        digest = hashlib.blake2b(domain.lower().encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % size for i in range(hashes)]
+
+    def __contains__(self, domain):
+        if self.bits is None:
+            return False
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(domain, self.size, self.hashes)
+        )
+
+    def add(self, domain):
+        if self.bits is None:
+            return
+        bits = self.bits
+        for position in self.positions(domain, self.size, self.hashes):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def known_taken(self, domains):
+        """The subset of ``domains`` in the filter."""
+        taken = [domain for domain in domains if domain in self]
+        self.hits += len(taken)
+        return taken
+
+    def stats(self):
+        return {
+            "enabled": self.bits is not None,
+            "capacity": self.capacity,
+            "bytes": len(self.bits) if self.bits is not None else 0,
+            "hashes": self.hashes,
+            "hits": self.hits,
+        }
+
+    @classmethod
+    def create(cls, path, domains, capacity, error_rate):
+        """Write a filter holding ``domains`` to ``path``, replacing the old file atomically."""
+        size, hashes = cls.dimensions(capacity, error_rate)
+        bits = bytearray((size + 7) // 8)
+        for domain in domains:
+            for position in cls.positions(domain, size, hashes):
+                bits[position >> 3] |= 1 << (position & 7)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as filter_file:
+            filter_file.write(cls.HEADER.pack(cls.MAGIC, size, hashes, capacity))
+            filter_file.write(bits)
+        os.replace(tmp_path, path)
+
+
+_filter = None
+_filter_checked_at = 0
+_filter_lock = threading.Lock()
+FILTER_RECHECK = 30  # seconds between checks for a rebuilt file
+
+
+def taken_filter():
+    """This process' view of the taken filter, remapped when a rebuild replaced the file."""
+    global _filter, _filter_checked_at
+    path = settings.TAKEN_FILTER_PATH
+    if _filter is not None and _filter.path == path and time.monotonic() - _filter_checked_at < FILTER_RECHECK:
+        return _filter
+    with _filter_lock:
+        try:
+            # Bits are written in place, so only a new inode means a new file
+            version = os.stat(path).st_ino
+        except FileNotFoundError:
+            version = None
+        if _filter is None or _filter.path != path or _filter.version != version:
+            _filter = TakenFilter(path)
+        _filter_checked_at = time.monotonic()
+    return _filter
+
+
+def known_taken(domains):
+    """``{domain: result}`` for the ``domains`` the filter knows are taken, in the shape of a GoDaddy answer."""
+    return {domain: {"domain": domain, "available": False} for domain in taken_filter().known_taken(domains)}
+
+
+def observe_taken(results):
+    """
+    Remember the domains of ``{domain: GoDaddy answer}`` that are definitely
+    taken, in the filter and in the journal for the next rebuild.
+    """
+    current = taken_filter()
+    if current.bits is None:
+        return  # Off until rebuild_taken_filter wrote the first filter
+    new = [
+        domain.lower() for domain, result in results.items()
+        if result.get("available") is False and result.get("definitive", True) and domain not in current
+    ]
+    if not new:
+        return
+    for domain in new:
+        current.add(domain)
+    now = int(time.time())
+    # One short append per search, O_APPEND keeps lines from concurrent workers whole
+    with open(settings.TAKEN_FILTER_JOURNAL_PATH, "a", encoding="utf-8") as journal:
+        journal.write("".join(f"{now} {domain}\n" for domain in new))
+
+
+def read_journal(path, since):
+    """``{domain: last seen}`` for the journal entries newer than ``since``."""
+    seen = {}
+    try:
+        with open(path, encoding="utf-8") as journal:
+            for line in journal:
+                timestamp, _, domain = line.strip().partition(" ")
+                if domain and timestamp.isdigit() and int(timestamp) >= since:
+                    seen[domain] = max(int(timestamp), seen.get(domain, 0))
+    except FileNotFoundError:
+        pass
+    return seen
+
+
+def rebuild(seed_domains=(), capacity=None, error_rate=None):
+    """
+    Write a new filter from ``seed_domains`` and the journal, returns ``(seeds, observed, capacity)``.
+
+    The journal is moved aside first so workers keep appending to a new one,
+    then its recent entries are carried over into that new journal.
+    """
+    journal_path = settings.TAKEN_FILTER_JOURNAL_PATH
+    rebuilding_path = f"{journal_path}.rebuilding"
+    if os.path.exists(journal_path):
+        if os.path.exists(rebuilding_path):
+            # Left over by a rebuild that crashed, keep its entries
+            with open(journal_path, encoding="utf-8") as journal, open(rebuilding_path, "a", encoding="utf-8") as old:
+                old.write(journal.read())
+            os.remove(journal_path)
+        else:
+            os.replace(journal_path, rebuilding_path)
+    observed = read_journal(rebuilding_path, since=time.time() - settings.TAKEN_FILTER_MAX_AGE)
+
+    seeds = set(seed_domains)
+    capacity = max(
+        capacity or settings.TAKEN_FILTER_CAPACITY,
+        math.ceil(1.25 * (len(seeds) + len(observed))),  # Room for the names observed until the next rebuild
+    )
+    TakenFilter.create(
+        settings.TAKEN_FILTER_PATH,
+        seeds.union(observed),
+        capacity,
+        error_rate or settings.TAKEN_FILTER_ERROR_RATE,
+    )
+
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        journal.write("".join(f"{timestamp} {domain}\n" for domain, timestamp in observed.items()))
+    if os.path.exists(rebuilding_path):
+        os.remove(rebuilding_path)
+    return len(seeds), len(observed), capacity
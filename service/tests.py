@@ -1,3 +1,1255 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from prometheus_client.parser import text_string_to_metric_families
+import requests
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .availability import availability_cache, check_domain, search_available_domains
+from .cache import TTLLRUCache
+from .contacts import contact_profile, find_profile, save_profile
+from .agreements import AgreementCache, agreement_cache
+from .checks import check_rate_limit_cache
+from .godaddy import GoDaddyClient, never_sent
+from .jobs import claim_job, enqueue_purchase, process_job, release_stale_jobs
+from .log import BackgroundJSONHandler, SamplingFilter
+from .metrics import stripe_operation
+from .exports import load_pyarrow
+from .idempotency import fingerprint as request_fingerprint
+from .idempotency import idempotent
+from .models import CheckoutSession, ContactProfile, IdempotencyKey, Purchase, PurchaseJob, WebhookEvent
+from .quotes import InvalidQuote, checkout_terms, purchase_terms, quote_store
+from .ratelimit import PRIORITY, SEARCH, RateLimited, UpstreamUnavailable, godaddy_bucket, godaddy_circuit
+from .suggestions import get_index, suggest_domains
+from .taken_filter import TakenFilter, known_taken, observe_taken, rebuild
+from .webhooks import process_batch, record_event
+
+
+def create_purchases(count, checkout_session=None):
+    """``count`` purchases, each on its own checkout session unless one is given."""
+    purchases = []
+    for i in range(count):
+        session = checkout_session or CheckoutSession.objects.create(
+            session_id=f"cs_test_{CheckoutSession.objects.count()}",
+            domain_name=f"example{i}.com",
+            email=f"user{i}@example.com",
+            period=1,
+            price="11.99",
+            currency="usd",
+        )
+        purchases.append(Purchase.objects.create(
+            order_id=f"order_{Purchase.objects.count()}",
+            checkout_session=session,
+            contact=contact_profile({
+                "email": session.email,
+                "first_name": "Ada",
+                "last_name": "Lovelace",
+                "phone": "+1.5555550100",
+                "address1": "1 Main St",
+                "city": "Springfield",
+                "state": "IL",
+                "postal_code": "62701",
+                "country": "US",
+            }),
+            amount="11.99",
+            currency="usd",
+        ))
+    return purchases
+
+
+class QueryCountTests(TestCase):
+    """The number of queries must not grow with the number of rows shown."""
+
+    def setUp(self):
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+
+    def assertConstantQueries(self, url, add_rows):
+        """The page makes as many queries with 26 rows as with 1."""
+        add_rows(1)
+        self.client.get(url)  # Warm up the session and content type caches
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        add_rows(25)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_purchase_changelist(self):
+        self.assertConstantQueries(reverse("admin:service_purchase_changelist"), create_purchases)
+
+    def test_purchase_job_changelist(self):
+        def add_jobs(count):
+            for purchase in create_purchases(count):
+                PurchaseJob.objects.create(
+                    purchase=purchase, request_data={"domain_name": "example.com"}, agreed_by="127.0.0.1"
+                )
+
+        self.assertConstantQueries(reverse("admin:service_purchasejob_changelist"), add_jobs)
+
+    def test_purchase_api_view(self):
+        session = create_purchases(1)[0].checkout_session
+        url = reverse("purchase-customer-details", args=[session.session_id])
+        self.assertConstantQueries(url, lambda count: create_purchases(count, session))
+
+        purchase = self.client.get(url).json()[0]
+        self.assertEqual(
+            purchase["checkout_session"],
+            {"session_id": session.session_id, "domain_name": session.domain_name, "email": session.email},
+        )
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def setUp(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("The SQLite profile is not in use")
+
+    def test_sqlite_connections_are_tuned_when_they_open(self):
+        path = os.path.join(tempfile.mkdtemp(), "profile.sqlite3")
+        default = connections["default"]
+        wrapper = type(default)({**default.settings_dict, "NAME": path}, alias="profile")
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            pragmas = {}
+            for pragma in ["journal_mode", "synchronous", "busy_timeout"]:
+                cursor.execute(f"PRAGMA {pragma}")
+                pragmas[pragma] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {
+            "journal_mode": "wal", "synchronous": 1, "busy_timeout": settings.SQLITE_BUSY_TIMEOUT * 1000,
+        })
+        self.assertEqual(wrapper.transaction_mode, "IMMEDIATE")
+
+
+@override_settings(
+    GODADDY_RATE_LIMIT=60,
+    GODADDY_RATE_LIMIT_BURST=10,
+    GODADDY_RATE_LIMIT_RESERVE=2,
+    GODADDY_CIRCUIT_FAILURE_THRESHOLD=2,
+)
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS].clear()
+        caches[settings.AVAILABILITY_CACHE_ALIAS].clear()
+
+    def drain(self, lane):
+        """Take tokens until the bucket refuses, returns how many it gave."""
+        taken = 0
+        while not godaddy_bucket.take(lane):
+            taken += 1
+        return taken
+
+    def test_searches_leave_the_reserve_to_purchases(self):
+        self.assertEqual(self.drain(SEARCH), 8)
+        self.assertEqual(self.drain(PRIORITY), 2)
+
+    def test_searches_wait_behind_purchases(self):
+        godaddy_bucket.queue(1)
+        self.assertGreater(godaddy_bucket.take(SEARCH), 0)
+        self.assertEqual(godaddy_bucket.take(PRIORITY), 0)
+
+    def test_idle_time_saves_at_most_a_burst(self):
+        cache = caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS]
+        cache.set(godaddy_bucket.key("start"), time.time() - 3600, timeout=None)
+        cache.set(godaddy_bucket.key("taken"), 0, timeout=None)
+        self.assertEqual(self.drain(PRIORITY), 10)
+
+    def test_acquire_gives_up_after_its_timeout(self):
+        self.drain(SEARCH)
+        with self.assertRaises(RateLimited):
+            godaddy_bucket.acquire(SEARCH, 0)
+
+    def test_circuit_opens_then_lets_one_trial_through(self):
+        godaddy_circuit.record(False)
+        self.assertTrue(godaddy_circuit.allow())
+        godaddy_circuit.record(False)
+        self.assertFalse(godaddy_circuit.allow())
+
+        # Cooldown over: one trial call, which closes the circuit when it succeeds
+        caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS].delete(godaddy_circuit.key("open"))
+        self.assertTrue(godaddy_circuit.allow())
+        self.assertFalse(godaddy_circuit.allow())
+        godaddy_circuit.record(True)
+        self.assertTrue(godaddy_circuit.allow())
+
+    def test_search_serves_stale_answers_while_the_circuit_is_open(self):
+        answer = {"domain": "example.com", "available": True}
+        availability_cache.set_many({"example.com": answer})
+        godaddy_circuit.record(False)
+        godaddy_circuit.record(False)
+
+        self.assertEqual(check_domain("example.com"), {**answer, "stale": True})
+        self.assertIsNone(check_domain("example.net"))
+
+
+class RateLimitCacheCheckTests(SimpleTestCase):
+    def test_warns_about_a_process_local_rate_limit_cache(self):
+        with self.settings(DEBUG=False, GODADDY_RATE_LIMIT=60):
+            self.assertEqual([warning.id for warning in check_rate_limit_cache(None)], ["service.W001"])
+        shared = {**settings.CACHES, "ratelimit": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+        with self.settings(DEBUG=False, GODADDY_RATE_LIMIT=60, CACHES=shared):
+            self.assertEqual(check_rate_limit_cache(None), [])
+        with self.settings(DEBUG=False, GODADDY_RATE_LIMIT=0):
+            self.assertEqual(check_rate_limit_cache(None), [])
+
+
+class DroppingServer:
+    """Accepts connections, reads the request and hangs up without answering."""
+
+    def __init__(self):
+        self.connections = 0
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self.listener.getsockname()[1]}"
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            self.connections += 1
+            with conn:
+                conn.recv(65536)
+
+    def close(self):
+        self.listener.close()
+
+
+@override_settings(GODADDY_RATE_LIMIT=0, GODADDY_CIRCUIT_FAILURE_THRESHOLD=100)
+class GoDaddyRetryTests(SimpleTestCase):
+    def setUp(self):
+        caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS].clear()
+        self.server = DroppingServer()
+        self.addCleanup(self.server.close)
+
+    def godaddy(self, url):
+        return GoDaddyClient(base_url=url, max_retries=2, backoff=0)
+
+    def test_idempotent_calls_are_retried_when_the_connection_drops(self):
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.godaddy(self.server.url).check_available("example.com")
+        self.assertEqual(self.server.connections, 3)
+
+    def test_purchase_is_not_retried_once_it_was_sent(self):
+        with self.assertRaises(requests.exceptions.ConnectionError) as raised:
+            self.godaddy(self.server.url).purchase({"domain": "example.com"})
+        self.assertFalse(never_sent(raised.exception))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_purchase_is_retried_when_it_could_not_connect(self):
+        closed = socket.create_server(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{closed.getsockname()[1]}"
+        closed.close()
+        with self.assertRaises(requests.exceptions.ConnectionError) as raised:
+            self.godaddy(url).purchase({"domain": "example.com"})
+        self.assertTrue(never_sent(raised.exception))
+
+
+class SuggestionTests(SimpleTestCase):
+    def setUp(self):
+        caches[settings.AVAILABILITY_CACHE_ALIAS].clear()
+
+    def test_keywords_are_split_into_known_words(self):
+        self.assertEqual(get_index().segment("fastcoffeeshop"), ["fast", "coffee", "shop"])
+        self.assertEqual(get_index().segment("acmebestpizza"), ["acme", "best", "pizza"])
+
+    def test_known_names_are_not_looked_up(self):
+        candidates = [domain for domain, _, _ in get_index().candidates("bestpizza", [".com"])]
+        free = candidates[:3:2]
+        directory = tempfile.mkdtemp()
+        self.enterContext(self.settings(
+            TAKEN_FILTER_PATH=os.path.join(directory, "taken_filter.bloom"),
+            TAKEN_FILTER_JOURNAL_PATH=os.path.join(directory, "taken_filter.journal"),
+        ))
+        # A tiny false positive rate, so none of the free candidates is pruned by chance
+        rebuild(candidates[3:] + ["x.com"], capacity=1000, error_rate=1e-9)
+        availability_cache.set_many({
+            candidates[0]: {"domain": candidates[0], "available": True},
+            candidates[1]: {"domain": candidates[1], "available": False},
+            candidates[2]: {"domain": candidates[2], "available": True},
+        })
+
+        result = suggest_domains("bestpizza", [".com"], limit=5)
+        self.assertEqual([suggestion["domain"] for suggestion in result["suggestions"]], free)
+        self.assertEqual(result["stats"]["known_taken"], len(candidates) - 3)
+        self.assertEqual(result["stats"]["looked_up"], 0)
+
+
+class TakenFilterTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.enterContext(self.settings(
+            TAKEN_FILTER_PATH=os.path.join(directory, "taken_filter.bloom"),
+            TAKEN_FILTER_JOURNAL_PATH=os.path.join(directory, "taken_filter.journal"),
+        ))
+
+    def test_nothing_is_observed_before_the_first_rebuild(self):
+        observe_taken({"example.com": {"domain": "example.com", "available": False}})
+        self.assertEqual(known_taken(["example.com"]), {})
+        self.assertFalse(os.path.exists(settings.TAKEN_FILTER_JOURNAL_PATH))
+
+    def test_observed_names_survive_a_rebuild_until_they_are_too_old(self):
+        rebuild(["seed.com"], capacity=1000, error_rate=0.001)
+        observe_taken({
+            "Taken.com": {"domain": "Taken.com", "available": False},
+            "free.com": {"domain": "free.com", "available": True},
+            "guess.com": {"domain": "guess.com", "available": False, "definitive": False},
+        })
+        self.assertEqual(set(known_taken(["seed.com", "taken.com", "free.com", "guess.com"])), {"seed.com", "taken.com"})
+
+        with open(settings.TAKEN_FILTER_JOURNAL_PATH, "a", encoding="utf-8") as journal:
+            journal.write(f"{int(time.time()) - settings.TAKEN_FILTER_MAX_AGE - 60} expired.com\n")
+        self.assertEqual(rebuild(capacity=1000), (0, 1, 1000))
+        current = TakenFilter(settings.TAKEN_FILTER_PATH)  # Workers remap within 30 seconds
+        self.assertIn("taken.com", current)
+        self.assertNotIn("expired.com", current)
+        self.assertNotIn("seed.com", current)
+
+    def test_dimensions_match_the_error_rate(self):
+        size, hashes = TakenFilter.dimensions(1_000_000, 0.001)
+        self.assertAlmostEqual(size / 1_000_000, 14.4, places=1)
+        self.assertEqual(hashes, 10)
+
+
+class AgreementCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches[settings.GODADDY_AGREEMENT_CACHE_ALIAS].clear()
+        self.fetched = []
+        self.refreshed = threading.Event()
+
+        def fetch(tlds, privacy):
+            self.fetched.append((sorted(tlds), privacy))
+            if len(self.fetched) > 1:
+                self.refreshed.set()
+            return [{"agreementKey": f"KEY{len(self.fetched)}"}]
+
+        self.agreements = AgreementCache(fetch)
+
+    def test_one_lookup_per_tld_set(self):
+        self.assertEqual(self.agreements.get(["com", "net"]), [{"agreementKey": "KEY1"}])
+        self.assertEqual(self.agreements.get(["NET", ".com"]), [{"agreementKey": "KEY1"}])
+        self.agreements.get(["com", "net"], privacy="true")
+        self.assertEqual(self.fetched, [(["com", "net"], "false"), (["com", "net"], "true")])
+
+    @override_settings(GODADDY_AGREEMENT_TTL=0)
+    def test_stale_entry_is_served_while_it_is_refreshed(self):
+        self.agreements.get(["com"])
+        self.assertEqual(self.agreements.get(["com"]), [{"agreementKey": "KEY1"}])
+        self.assertTrue(self.refreshed.wait(5))
+        deadline = time.monotonic() + 5
+        while self.agreements.cache.get(self.agreements.key(["com"], "false"))[0] != [{"agreementKey": "KEY2"}]:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+
+@override_settings(GODADDY_CIRCUIT_FAILURE_THRESHOLD=1)
+class QuoteTests(SimpleTestCase):
+    answer = {"domain": "Example.com", "available": True, "definitive": True, "price": 11990000, "currency": "USD", "period": 1}
+
+    def setUp(self):
+        caches[settings.QUOTE_CACHE_ALIAS].clear()
+        caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS].clear()
+        [self.quoted] = quote_store.attach([self.answer])
+
+    def test_quoted_terms_ignore_the_posted_price(self):
+        quote_id = self.quoted["quote_id"]
+        self.assertEqual(
+            checkout_terms({"quote_id": quote_id, "name": "example.com", "price": "0.01", "period": 2}),
+            ("example.com", 2398, 2),
+        )
+        terms = purchase_terms({"quote_id": quote_id, "amount": 1, "email": "ada@example.com"})
+        self.assertEqual((terms["domain_name"], terms["amount"], terms["period"]), ("example.com", 1199, 1))
+
+    def test_period_must_be_whole_years_within_range(self):
+        quote_id = self.quoted["quote_id"]
+        for period in ["0", 0, -1, "11", "1.5", 1.5, "two", True]:
+            with self.subTest(period=period), self.assertRaises(InvalidQuote):
+                checkout_terms({"quote_id": quote_id, "name": "example.com", "period": period})
+            with self.subTest(period=period), self.assertRaises(InvalidQuote):
+                purchase_terms({"quote_id": quote_id, "period": period})
+        self.assertEqual(purchase_terms({"quote_id": quote_id, "period": "10"})["amount"], 11990)
+
+        response = self.client.post(
+            reverse("checkout-session"), {"quote_id": quote_id, "name": "example.com", "period": "0"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_tampered_or_foreign_quotes_are_refused(self):
+        quote_id = self.quoted["quote_id"]
+        with self.assertRaises(InvalidQuote):
+            quote_store.get(quote_id[:-1] + ("A" if quote_id[-1] != "A" else "B"))
+        with self.assertRaises(InvalidQuote):
+            quote_store.get(quote_id, domain="example.net")
+        with self.settings(QUOTE_REQUIRED=True), self.assertRaises(InvalidQuote):
+            checkout_terms({"name": "example.com", "price": "0.01"})
+
+    def test_uncached_quotes_are_checked_again(self):
+        caches[settings.QUOTE_CACHE_ALIAS].clear()
+        godaddy_circuit.record(False)
+        # Not trusted blindly, and GoDaddy can not be asked while the circuit is open
+        with self.assertRaises(UpstreamUnavailable):
+            quote_store.get(self.quoted["quote_id"])
+
+
+class BulkPurchaseTests(TestCase):
+    contact = {
+        "email": "ada@example.com",
+        "first_name": "Ada",
+        "last_name": "Lovelace",
+        "phone": "+1.5555550100",
+        "address1": "1 Main St",
+        "city": "Springfield",
+        "state": "IL",
+        "postal_code": "62701",
+        "country": "US",
+        "period": 1,
+    }
+
+    def test_every_domain_gets_its_own_outcome(self):
+        # None of these reach GoDaddy: no checkout session, listed twice and missing the amount
+        response = self.client.post(reverse("purchase-domains"), {
+            **self.contact,
+            "domains": [
+                {"domain_name": "nosession.com", "amount": 1199},
+                {"domain_name": "NoSession.com", "amount": 1199},
+                {"domain_name": "noamount.com"},
+            ],
+        }, content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["succeeded"], body["failed"]), (0, 3))
+        self.assertEqual(
+            [(result["domain_name"], result["error"]) for result in body["results"]],
+            [
+                ("nosession.com", "Invalid checkout session"),
+                ("NoSession.com", "Domain listed more than once"),
+                ("noamount.com", "amount is required"),
+            ],
+        )
+
+    @override_settings(PURCHASE_BULK_MAX_DOMAINS=2)
+    def test_too_many_domains_are_refused(self):
+        response = self.client.post(reverse("purchase-domains"), {
+            **self.contact, "domains": [{"domain_name": f"example{i}.com", "amount": 1199} for i in range(3)],
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Purchase.objects.exists())
+
+    @override_settings(GODADDY_RATE_LIMIT=0)
+    def test_unreadable_answer_leaves_one_domain_unconfirmed_and_the_rest_are_saved(self):
+        registrar = FakeRegistrar()
+        self.addCleanup(registrar.close)
+        registrar.garbled.add("garbled.com")
+        for domain_name in ["garbled.com", "fine.com"]:
+            CheckoutSession.objects.create(
+                session_id=f"cs_{domain_name}", domain_name=domain_name, email=self.contact["email"],
+                period=1, price="11.99", currency="usd",
+            )
+
+        with self.settings(GODADDY_API_URL=registrar.url):
+            response = self.client.post(reverse("purchase-domains"), {
+                **self.contact,
+                "domains": [{"domain_name": "garbled.com", "amount": 1199}, {"domain_name": "fine.com", "amount": 1199}],
+            }, content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        garbled, fine = response.json()["results"]
+        self.assertEqual((garbled["status"], garbled["status_code"]), ("UNCONFIRMED", 502))
+        self.assertEqual((fine["status"], fine["status_code"]), ("SUCCESS", 200))
+        self.assertEqual(
+            list(Purchase.objects.values_list("checkout_session__domain_name", flat=True)), ["fine.com"]
+        )
+
+    @override_settings(GODADDY_RATE_LIMIT=0)
+    def test_a_purchase_that_can_not_be_saved_does_not_lose_the_others(self):
+        registrar = FakeRegistrar()
+        self.addCleanup(registrar.close)
+        Purchase.objects.filter(pk=create_purchases(1)[0].pk).update(order_id="1")  # The first order id is taken
+        for domain_name in ["first.com", "second.com"]:
+            CheckoutSession.objects.create(
+                session_id=f"cs_{domain_name}", domain_name=domain_name, email=self.contact["email"],
+                period=1, price="11.99", currency="usd",
+            )
+
+        with self.settings(GODADDY_API_URL=registrar.url):
+            response = self.client.post(reverse("purchase-domains"), {
+                **self.contact,
+                "domains": [{"domain_name": "first.com", "amount": 1199}, {"domain_name": "second.com", "amount": 1199}],
+            }, content_type="application/json")
+
+        body = response.json()
+        self.assertEqual((body["succeeded"], body["failed"]), (1, 1))
+        # The registrations run concurrently, either domain may get the taken order id
+        outcomes = sorted(
+            (result["order_id"], result["status"], result["status_code"]) for result in body["results"]
+        )
+        self.assertEqual(outcomes, [(1, "UNRECORDED", 500), (2, "SUCCESS", 200)])
+        self.assertEqual(Purchase.objects.filter(order_id="2").count(), 1)
+
+    @override_settings(GODADDY_RATE_LIMIT=0, GODADDY_CIRCUIT_FAILURE_THRESHOLD=100)
+    def test_server_error_leaves_the_domain_unconfirmed(self):
+        registrar = FakeRegistrar()
+        self.addCleanup(registrar.close)
+        registrar.purchase_status = 500
+        CheckoutSession.objects.create(
+            session_id="cs_first.com", domain_name="first.com", email=self.contact["email"],
+            period=1, price="11.99", currency="usd",
+        )
+
+        with self.settings(GODADDY_API_URL=registrar.url):
+            response = self.client.post(reverse("purchase-domains"), {
+                **self.contact, "domains": [{"domain_name": "first.com", "amount": 1199}],
+            }, content_type="application/json")
+
+        (outcome,) = response.json()["results"]
+        self.assertEqual((outcome["status"], outcome["status_code"]), ("UNCONFIRMED", 502))
+        self.assertEqual(registrar.purchases, 1)
+        self.assertFalse(Purchase.objects.filter(checkout_session__domain_name="first.com").exists())
+        self.assertFalse(ContactProfile.objects.exists())
+
+
+class ContactProfileTests(TestCase):
+    contact = BulkPurchaseTests.contact
+
+    def setUp(self):
+        # Profiles cached by other tests point at rows their rollback removed
+        caches[settings.CONTACT_PROFILE_CACHE_ALIAS].clear()
+
+    def test_repeat_contacts_share_one_profile(self):
+        profile = contact_profile(self.contact)
+        retyped = {**self.contact, "email": "Ada@Example.com", "address1": " 1  Main St ", "country": "us"}
+        self.assertEqual(contact_profile(retyped).pk, profile.pk)
+        self.assertEqual(ContactProfile.objects.count(), 1)
+        self.assertNotEqual(contact_profile({**self.contact, "address1": "2 Main St"}).pk, profile.pk)
+
+    def test_prebuilt_contact_blocks(self):
+        contacts = contact_profile(self.contact).godaddy_contacts
+        self.assertEqual(contacts["contactRegistrant"], contacts["contactAdmin"])
+        self.assertEqual(contacts["contactBilling"], contacts["contactTech"])
+        self.assertEqual(contacts["contactTech"]["addressMailing"]["address1"], "1 Main St")
+        self.assertEqual(contacts["contactAdmin"]["email"], "ada@example.com")
+
+    def test_found_profile_is_stored_only_when_saved(self):
+        profile = find_profile(self.contact)
+        self.assertIsNone(profile.pk)
+        self.assertEqual(profile.godaddy_contacts["contactAdmin"]["email"], "ada@example.com")
+        self.assertFalse(ContactProfile.objects.exists())
+        self.assertEqual(save_profile(profile).pk, find_profile(self.contact).pk)
+
+    def test_cached_profile_skips_the_query(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            contact_profile(self.contact)
+        with self.assertNumQueries(0):
+            contact_profile(self.contact)
+
+
+class FakeRegistrar(ThreadingHTTPServer):
+    """
+    Serves agreements and answers purchases with ``purchase_status``, or hangs
+    up when it is None. Domains in ``garbled`` get a 200 that is not JSON.
+    Every domain is available, purchases and single lookups of the ``slow``
+    ones take a second and ``single_lookups`` records the lookups. Bulk lookups, recorded in
+    ``bulk_lookups``, report an error for the domains in ``bulk_errors``.
+    """
+
+    daemon_threads = True
+    block_on_close = False  # Do not wait for slow lookups nobody waits for any more
+
+    def __init__(self):
+        self.purchase_status = 200
+        self.purchases = 0
+        self.garbled = set()
+        self.slow = set()
+        self.single_lookups = []
+        self.bulk_errors = set()
+        self.bulk_lookups = []
+        super().__init__(("127.0.0.1", 0), FakeRegistrarHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeRegistrarHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def answer(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def availability(self, domain):
+        return {"domain": domain, "available": True, "definitive": True, "price": 11990000, "currency": "USD", "period": 1}
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != "/v1/domains/available":
+            self.answer(200, [{"agreementKey": "DNRA", "title": "Registration Agreement"}])
+            return
+        domain = parse_qs(url.query)["domain"][0]
+        self.server.single_lookups.append(domain)
+        if domain in self.server.slow:
+            time.sleep(1)
+        self.answer(200, self.availability(domain))
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if urlsplit(self.path).path == "/v1/domains/available":
+            self.server.bulk_lookups.append(payload)
+            failed = [domain for domain in payload if domain in self.server.bulk_errors]
+            self.answer(203 if failed else 200, {
+                "domains": [self.availability(domain) for domain in payload if domain not in failed],
+                "errors": [{"domain": domain, "code": "UNKNOWN_ERROR"} for domain in failed],
+            })
+            return
+        self.server.purchases += 1
+        if payload["domain"] in self.server.slow:
+            time.sleep(1)
+        if payload["domain"] in self.server.garbled:
+            self.send_response(200)
+            self.send_header("Content-Length", "6")
+            self.end_headers()
+            self.wfile.write(b"<html>")
+        elif self.server.purchase_status is None:
+            self.close_connection = True
+        else:
+            self.answer(
+                self.server.purchase_status,
+                {"orderId": self.server.purchases, "code": "ERROR", "message": "Upstream error"},
+            )
+
+
+@override_settings(GODADDY_RATE_LIMIT=0, GODADDY_CIRCUIT_FAILURE_THRESHOLD=100, GODADDY_MAX_RETRIES=0)
+class PurchaseWorkerTests(TestCase):
+    """A purchase is only sent again when GoDaddy provably never received it."""
+
+    def setUp(self):
+        caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS].clear()
+        caches[settings.GODADDY_AGREEMENT_CACHE_ALIAS].clear()
+        self.registrar = FakeRegistrar()
+        self.addCleanup(self.registrar.close)
+        self.enterContext(self.settings(GODADDY_API_URL=self.registrar.url))
+        session = create_purchases(1)[0].checkout_session
+        enqueue_purchase(
+            {**BulkPurchaseTests.contact, "email": session.email, "domain_name": session.domain_name, "amount": 1199},
+            session,
+            "127.0.0.1",
+        )
+
+    def run_job(self):
+        job = claim_job("test-worker")
+        return process_job(job)
+
+    def test_success(self):
+        job = self.run_job()
+        self.assertEqual(job.status, PurchaseJob.SUCCEEDED)
+        self.assertEqual(Purchase.objects.get(pk=job.purchase_id).order_id, "1")
+
+    def test_server_error_needs_reconciliation(self):
+        self.registrar.purchase_status = 503
+        job = self.run_job()
+        self.assertEqual(job.status, PurchaseJob.UNCONFIRMED)
+        self.assertEqual(Purchase.objects.get(pk=job.purchase_id).status, "UNCONFIRMED")
+        self.assertIsNone(claim_job("test-worker"))
+        self.assertEqual(self.registrar.purchases, 1)
+
+    def test_dropped_connection_needs_reconciliation(self):
+        self.registrar.purchase_status = None
+        job = self.run_job()
+        self.assertEqual(job.status, PurchaseJob.UNCONFIRMED)
+        self.assertIsNone(claim_job("test-worker"))
+        self.assertEqual(self.registrar.purchases, 1)
+
+    def test_rate_limited_purchase_is_requeued(self):
+        self.registrar.purchase_status = 429
+        job = self.run_job()
+        self.assertEqual(job.status, PurchaseJob.QUEUED)
+        self.assertEqual(Purchase.objects.get(pk=job.purchase_id).status, "PENDING")
+
+    def test_refused_connection_is_requeued(self):
+        agreement_cache.get(["com"])  # Only the purchase can not connect
+        closed = socket.create_server(("127.0.0.1", 0))
+        with self.settings(GODADDY_API_URL=f"http://127.0.0.1:{closed.getsockname()[1]}"):
+            closed.close()
+            job = self.run_job()
+        self.assertEqual(job.status, PurchaseJob.QUEUED)
+        self.assertEqual(self.registrar.purchases, 0)
+
+    @override_settings(GODADDY_CIRCUIT_FAILURE_THRESHOLD=1)
+    def test_open_circuit_is_requeued(self):
+        agreement_cache.get(["com"])
+        godaddy_circuit.record(False)
+        job = self.run_job()
+        self.assertEqual(job.status, PurchaseJob.QUEUED)
+        self.assertEqual(self.registrar.purchases, 0)
+
+    @override_settings(PURCHASE_JOB_LOCK_TIMEOUT=60)
+    def test_stale_running_job_needs_reconciliation(self):
+        job = claim_job("dead-worker")
+        PurchaseJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(minutes=5))
+        release_stale_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, PurchaseJob.UNCONFIRMED)
+        self.assertEqual(Purchase.objects.get(pk=job.purchase_id).status, "UNCONFIRMED")
+        self.assertIsNone(claim_job("test-worker"))
+
+
+class WebhookOrderTests(TestCase):
+    """The newest Stripe event by its created time decides the payment status, not the last delivered."""
+
+    def setUp(self):
+        self.session = create_purchases(1)[0].checkout_session
+        self.events = 0
+
+    def deliver(self, type, created, payment_status="unpaid"):
+        self.events += 1
+        record_event({
+            "id": f"evt_{self.events}",
+            "type": type,
+            "created": created,
+            "data": {"object": {"id": self.session.session_id, "payment_status": payment_status}},
+        })
+
+    def status(self):
+        self.session.refresh_from_db()
+        return self.session.payment_status, self.session.paid_at and int(self.session.paid_at.timestamp())
+
+    def test_late_event_in_the_same_batch_does_not_undo_a_payment(self):
+        self.deliver("checkout.session.async_payment_succeeded", 2000, "paid")
+        self.deliver("checkout.session.completed", 1000)
+        process_batch()
+        self.assertEqual(self.status(), ("paid", 2000))
+
+    def test_late_event_in_a_later_batch_does_not_undo_a_payment(self):
+        self.deliver("checkout.session.completed", 2000, "paid")
+        process_batch()
+        self.deliver("checkout.session.expired", 1000)
+        process_batch()
+        self.assertEqual(self.status(), ("paid", 2000))
+
+    def test_paid_at_follows_the_final_status(self):
+        self.deliver("checkout.session.completed", 1000, "paid")
+        self.deliver("checkout.session.async_payment_succeeded", 1500, "paid")
+        process_batch()
+        self.assertEqual(self.status(), ("paid", 1000))
+        self.deliver("checkout.session.expired", 2000)
+        process_batch()
+        self.assertEqual(self.status(), ("expired", None))
+
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=2)
+    def test_bad_event_does_not_block_the_rest_of_the_batch(self):
+        record_event({"id": "evt_bad", "type": "checkout.session.completed", "created": 500, "data": {}})
+        self.deliver("checkout.session.completed", 1000, "paid")
+        with self.assertLogs("service.webhooks", level="ERROR"):
+            self.assertEqual(process_batch(), 2)
+        self.assertEqual(self.status(), ("paid", 1000))
+        bad = WebhookEvent.objects.get(event_id="evt_bad")
+        self.assertEqual((bad.attempts, bad.processed_at), (1, None))
+        self.assertIn("KeyError", bad.error)
+        with self.assertLogs("service.webhooks", level="ERROR"):
+            process_batch()
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, 2)
+        self.assertIsNotNone(bad.processed_at)
+        self.assertEqual(process_batch(), 0)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.calls = 0
+
+        @idempotent
+        def view(request):
+            self.calls += 1
+            return JsonResponse({"call": self.calls}, status=json.loads(request.body).get("status", 200))
+
+        self.view = view
+
+    def post(self, body, key="key-1"):
+        request = RequestFactory().post(
+            "/", json.dumps(body), content_type="application/json", headers={"Idempotency-Key": key}
+        )
+        return self.view(request)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post({"domain": "example.com"})
+        retry = self.post({"domain": "example.com"})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((retry.status_code, retry.content), (first.status_code, first.content))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.post({"domain": "example.com"}, key="key-2")
+        self.assertEqual(self.calls, 2)
+
+    def test_same_key_with_another_body_is_refused(self):
+        self.post({"domain": "example.com"})
+        response = self.post({"domain": "example.net"})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0.3)
+    def test_concurrent_duplicate_waits_then_gets_409(self):
+        body = {"domain": "example.com"}
+        request = RequestFactory().post("/", json.dumps(body), content_type="application/json")
+        # The first request is still running
+        IdempotencyKey.objects.create(
+            scope="view", key="key-1", fingerprint=request_fingerprint(request),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        started = time.monotonic()
+        response = self.post(body)
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.calls, 0)
+
+    def test_server_errors_release_the_key(self):
+        self.assertEqual(self.post({"status": 503}).status_code, 503)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        response = self.post({"status": 503})
+        self.assertEqual(self.calls, 2)
+        self.assertNotIn("Idempotent-Replayed", response)
+
+    @override_settings(GODADDY_RATE_LIMIT=0, GODADDY_CIRCUIT_FAILURE_THRESHOLD=100)
+    def test_purchase_that_timed_out_after_sending_is_not_sent_again(self):
+        caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS].clear()
+        caches[settings.GODADDY_AGREEMENT_CACHE_ALIAS].clear()
+        registrar = FakeRegistrar()
+        self.addCleanup(registrar.close)
+        session = create_purchases(1)[0].checkout_session
+        registrar.slow.add(session.domain_name)
+        body = {**BulkPurchaseTests.contact, "email": session.email, "domain_name": session.domain_name, "amount": 1199}
+        client = GoDaddyClient(base_url=registrar.url, read_timeout=0.2, max_retries=0)
+        with self.settings(GODADDY_API_URL=registrar.url), mock.patch("service.views.get_client", return_value=client):
+            first, retry = [
+                self.client.post(
+                    reverse("purchase-domain"), body, content_type="application/json",
+                    headers={"Idempotency-Key": "purchase-1"},
+                )
+                for _ in range(2)
+            ]
+        self.assertEqual(first.status_code, 502)
+        self.assertEqual(first.json()["status"], "UNCONFIRMED")
+        self.assertEqual((retry.status_code, retry.content), (first.status_code, first.content))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(registrar.purchases, 1)
+
+    def test_purge_deletes_only_expired_keys(self):
+        now = timezone.now()
+        for i, expires_at in enumerate([now - timedelta(seconds=1), now - timedelta(days=1), now + timedelta(hours=1)]):
+            IdempotencyKey.objects.create(scope="view", key=f"key-{i}", fingerprint="", expires_at=expires_at)
+        out = io.StringIO()
+        call_command("purge_idempotency_keys", batch_size=1, stdout=out)
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["key-2"])
+        self.assertIn("Deleted 2 expired idempotency keys", out.getvalue())
+
+
+@override_settings(GODADDY_RATE_LIMIT=0, GODADDY_CIRCUIT_FAILURE_THRESHOLD=100)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        for alias in [settings.GODADDY_RATE_LIMIT_CACHE_ALIAS, settings.GODADDY_AGREEMENT_CACHE_ALIAS,
+                      settings.AVAILABILITY_CACHE_ALIAS]:
+            caches[alias].clear()
+        self.registrar = FakeRegistrar()
+        self.addCleanup(self.registrar.close)
+        self.enterContext(self.settings(GODADDY_API_URL=self.registrar.url))
+        self.session = CheckoutSession.objects.create(
+            session_id="cs_async", domain_name="example.com", email=BulkPurchaseTests.contact["email"],
+            period=1, price="11.99", currency="usd",
+        )
+
+    async def test_search(self):
+        response = await self.async_client.post(
+            reverse("async-list-domains"), {"domain_name": "example", "extensions": [".com", ".net"]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(result["domain"] for result in response.json()["available_domains"]), ["example.com", "example.net"]
+        )
+
+    async def test_purchase_is_registered_and_saved(self):
+        response = await self.async_client.post(
+            reverse("async-purchase-domain"),
+            {**BulkPurchaseTests.contact, "domain_name": "example.com", "amount": 1199},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["order_id"], 1)
+        purchase = await Purchase.objects.select_related("checkout_session").aget(order_id="1")
+        self.assertEqual(purchase.checkout_session.session_id, "cs_async")
+        self.assertEqual(self.registrar.purchases, 1)
+
+
+@override_settings(GODADDY_RATE_LIMIT=0, GODADDY_CIRCUIT_FAILURE_THRESHOLD=100)
+class DomainSearchTests(SimpleTestCase):
+    def setUp(self):
+        caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS].clear()
+        self.registrar = FakeRegistrar()
+        self.addCleanup(self.registrar.close)
+        self.enterContext(self.settings(GODADDY_API_URL=self.registrar.url))
+
+    def search(self, **kwargs):
+        return search_available_domains("example", [".com", ".net", ".org"], fresh=True, **kwargs)
+
+    def test_lookups_past_the_deadline_are_reported_pending(self):
+        self.registrar.slow.add("example.net")
+        started = time.monotonic()
+        payload = self.search(deadline=0.3, bulk=False)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([result["domain"] for result in payload["available_domains"]], ["example.com", "example.org"])
+        self.assertTrue(payload["partial"])
+        self.assertEqual(payload["pending_domains"], ["example.net"])
+
+    def test_search_within_the_deadline_is_complete(self):
+        payload = self.search(deadline=5, bulk=False)
+        self.assertEqual(len(payload["available_domains"]), 3)
+        self.assertEqual((payload["partial"], payload["pending_domains"]), (False, []))
+
+    @override_settings(GODADDY_BULK_CHUNK_SIZE=2)
+    def test_bulk_errors_fall_back_to_single_lookups(self):
+        self.registrar.bulk_errors.add("example.net")
+        payload = self.search(deadline=5, bulk=True)
+        self.assertEqual(len(payload["available_domains"]), 3)
+        self.assertFalse(payload["partial"])
+        self.assertEqual(
+            sorted(map(sorted, self.registrar.bulk_lookups)), [["example.com", "example.net"], ["example.org"]]
+        )
+        self.assertEqual(self.registrar.single_lookups, ["example.net"])
+
+    def test_ndjson_stream_sends_each_domain_as_its_lookup_finishes(self):
+        self.registrar.slow.add("example.com")
+        response = self.client.post(reverse("list-domains"), {
+            "domain_name": "example", "extensions": [".com", ".net"], "stream": "ndjson", "fresh": True, "bulk": False,
+        }, content_type="application/json")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [(record["event"], record["data"].get("domain")) for record in records],
+            [("available", "example.net"), ("available", "example.com"), ("summary", None)],
+        )
+        self.assertEqual(records[-1]["data"], {"available_count": 2, "partial": False, "pending_domains": []})
+
+    def test_sse_stream_is_picked_from_the_accept_header(self):
+        response = self.client.post(
+            reverse("list-domains"), {"domain_name": "example", "extensions": [".com"], "fresh": True},
+            content_type="application/json", headers={"Accept": "text/event-stream"},
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = b"".join(response.streaming_content).decode().split("\n\n")
+        self.assertEqual(events[0].splitlines()[0], "event: available")
+        self.assertEqual(json.loads(events[0].splitlines()[1].removeprefix("data: "))["domain"], "example.com")
+        self.assertTrue(events[1].startswith("event: summary\n"))
+
+    def test_repeat_searches_are_answered_from_the_cache_unless_fresh(self):
+        caches[settings.AVAILABILITY_CACHE_ALIAS].clear()
+        for fresh in [False, False, True]:
+            payload = search_available_domains("example", [".com", ".net"], deadline=5, bulk=False, fresh=fresh)
+            self.assertEqual(len(payload["available_domains"]), 2)
+        # The second search asked nobody, the fresh one asked GoDaddy again
+        self.assertEqual(
+            sorted(self.registrar.single_lookups), ["example.com", "example.com", "example.net", "example.net"]
+        )
+
+
+class StructuredLoggingTests(SimpleTestCase):
+    def log(self, emit, sample_rate=1.0):
+        """The JSON records the background handler wrote for what ``emit(logger)`` logged."""
+        stream = io.StringIO()
+        handler = BackgroundJSONHandler(stream)
+        handler.addFilter(SamplingFilter(sample_rate))
+        logger = logging.getLogger(f"service.tests.{self._testMethodName}")
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        logger.addHandler(handler)
+        try:
+            emit(logger)
+        finally:
+            logger.removeHandler(handler)
+            handler.close()  # Waits for the writer thread to drain the queue
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def test_records_are_json_with_pii_redacted(self):
+        [record] = self.log(lambda logger: logger.warning(
+            "Purchase refused for ada@example.com",
+            extra={
+                "domain_name": "example.com",
+                "email": "ada@example.com",
+                "payload": {"contactAdmin": {"nameFirst": "Ada", "phone": "+1.5555550100"}, "period": 1},
+            },
+        ))
+        self.assertEqual((record["level"], record["message"]), ("WARNING", "Purchase refused for [redacted]"))
+        self.assertEqual(record["domain_name"], "example.com")
+        self.assertEqual(record["email"], "[redacted]")
+        self.assertEqual(
+            record["payload"], {"contactAdmin": {"nameFirst": "[redacted]", "phone": "[redacted]"}, "period": 1}
+        )
+
+    def test_debug_records_are_sampled(self):
+        def emit(logger):
+            for _ in range(20):
+                logger.debug("Domain search")
+            logger.info("Domain purchased")
+
+        self.assertEqual([record["message"] for record in self.log(emit, sample_rate=0)], ["Domain purchased"])
+        self.assertEqual(len(self.log(emit, sample_rate=1)), 21)
+
+
+@override_settings(GODADDY_RATE_LIMIT=0, GODADDY_CIRCUIT_FAILURE_THRESHOLD=100)
+class MetricsTests(SimpleTestCase):
+    def sample(self, name, **labels):
+        """The current value of one sample served by /metrics, 0 when it was never recorded."""
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        for family in text_string_to_metric_families(response.content.decode()):
+            for sample in family.samples:
+                if sample.name == name and all(sample.labels.get(key) == value for key, value in labels.items()):
+                    return sample.value
+        return 0
+
+    def test_upstream_calls_and_views_are_counted(self):
+        caches[settings.GODADDY_RATE_LIMIT_CACHE_ALIAS].clear()
+        registrar = FakeRegistrar()
+        self.addCleanup(registrar.close)
+        godaddy = {"upstream": "godaddy", "operation": "check_available"}
+        requests_before = self.sample("upstream_requests_total", status="200", **godaddy)
+        latency_before = self.sample("upstream_request_duration_seconds_count", **godaddy)
+        views_before = self.sample("http_responses_total", view="metrics", method="GET", status="200")
+
+        with self.settings(GODADDY_API_URL=registrar.url):
+            check_domain("example.com")
+
+        self.assertEqual(self.sample("upstream_requests_total", status="200", **godaddy), requests_before + 1)
+        self.assertEqual(self.sample("upstream_request_duration_seconds_count", **godaddy), latency_before + 1)
+        # The three scrapes before this one were counted too
+        self.assertEqual(
+            self.sample("http_responses_total", view="metrics", method="GET", status="200"), views_before + 3
+        )
+
+    def test_stripe_ids_are_collapsed_in_operation_labels(self):
+        self.assertEqual(
+            stripe_operation("get", "https://api.stripe.com/v1/checkout/sessions/cs_test_a1B2c3?expand[]=x"),
+            "GET /v1/checkout/sessions/:id",
+        )
+
+
+class TTLLRUCacheTests(SimpleTestCase):
+    def cache(self, **options):
+        return TTLLRUCache(self.id(), {"TIMEOUT": 60, "OPTIONS": options})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = self.cache(MAX_ENTRIES=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": 1, "c": 3})
+        self.assertEqual(cache.evictions, 1)
+
+    def test_byte_cap_and_expiry(self):
+        cache = self.cache(MAX_BYTES=200)
+        cache.set("big", "x" * 150)
+        cache.set("other", "y" * 150)
+        self.assertIsNone(cache.get("big"))
+        self.assertLessEqual(cache.size, 200)
+        cache.set("gone", 1, timeout=0)
+        self.assertIsNone(cache.get("gone"))
+
+
+class CheckoutSessionPaginationTests(TestCase):
+    url = reverse("checkout-session-details")
+
+    def setUp(self):
+        for i in range(5):
+            CheckoutSession.objects.create(
+                session_id=f"cs_{i}", domain_name=f"example{i}.com", email=f"user{i % 2}@example.com",
+                period=1, price="11.99", currency="usd",
+            )
+        # Rows created in the same instant are told apart by id
+        CheckoutSession.objects.filter(session_id__in=["cs_1", "cs_2", "cs_3"]).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+
+    def pages(self, query):
+        body = self.client.get(self.url, query).json()
+        pages = [body]
+        while body["next_cursor"]:
+            body = self.client.get(self.url, {**query, "cursor": body["next_cursor"]}).json()
+            pages.append(body)
+        return pages
+
+    def test_cursor_walks_every_row_once_newest_first(self):
+        pages = self.pages({"limit": 2})
+        self.assertEqual([len(page["checkout_sessions"]) for page in pages], [2, 2, 1])
+        self.assertIsNone(pages[-1]["next"])
+        session_ids = [row["session_id"] for page in pages for row in page["checkout_sessions"]]
+        self.assertEqual(session_ids, ["cs_4", "cs_0", "cs_3", "cs_2", "cs_1"])
+
+    def test_filters_and_field_projection(self):
+        pages = self.pages({"limit": 1, "email": "user1@example.com", "fields": "session_id,email"})
+        rows = [row for page in pages for row in page["checkout_sessions"]]
+        self.assertEqual(rows, [
+            {"session_id": "cs_3", "email": "user1@example.com"},
+            {"session_id": "cs_1", "email": "user1@example.com"},
+        ])
+        self.assertIn("email=user1%40example.com", pages[0]["next"])
+
+        recent = self.client.get(self.url, {"created_after": (timezone.now() - timedelta(minutes=5)).isoformat()})
+        self.assertEqual([row["session_id"] for row in recent.json()["checkout_sessions"]], ["cs_4", "cs_0"])
+
+    def test_invalid_parameters_answer_400(self):
+        for query in [
+            {"cursor": "not-a-cursor"},
+            {"limit": 0},
+            {"limit": "ten"},
+            {"created_after": "yesterday"},
+            {"fields": "session_id,secret"},
+        ]:
+            with self.subTest(query=query):
+                response = self.client.get(self.url, query)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+
+class ExportCommandTests(TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "checkout_sessions.csv")
+
+    def create_session(self):
+        count = CheckoutSession.objects.count()
+        return CheckoutSession.objects.create(
+            session_id=f"cs_{count}", domain_name=f"example{count}.com", email=f"user{count}@example.com",
+            period=1, price="11.99", currency="usd",
+        )
+
+    def export(self, **options):
+        call_command("export_checkout_sessions", path=self.path, stdout=io.StringIO(), **options)
+        with open(self.path, newline="", encoding="utf-8") as export:
+            return list(csv.reader(export))
+
+    def watermark(self):
+        with open(f"{self.path}.watermark", encoding="utf-8") as watermark:
+            return json.load(watermark)["last_id"]
+
+    def test_runs_append_only_the_sessions_after_the_watermark(self):
+        first, second = self.create_session(), self.create_session()
+        rows = self.export()
+        self.assertEqual(rows[0][0], "session id")
+        self.assertEqual([row[0] for row in rows[1:]], ["cs_0", "cs_1"])
+        self.assertEqual(self.watermark(), second.pk)
+
+        third = self.create_session()
+        rows = self.export()
+        self.assertEqual([row[0] for row in rows], ["session id", "cs_0", "cs_1", "cs_2"])
+        self.assertEqual(self.watermark(), third.pk)
+        self.assertEqual(self.export(), rows)  # Nothing new, nothing appended
+        self.assertFalse(os.path.exists(f"{self.path}.watermark.tmp"))
+
+    def test_full_rewrites_the_file_and_resets_the_watermark(self):
+        self.create_session()
+        self.export()
+        with open(self.path, "a", encoding="utf-8") as export:
+            export.write("stray,row\n")
+        CheckoutSession.objects.all().delete()
+        latest = self.create_session()
+
+        rows = self.export(full=True)
+        self.assertEqual([row[0] for row in rows], ["session id", latest.session_id])
+        self.assertEqual(self.watermark(), latest.pk)
+
+
+class ExportViewTests(TestCase):
+    url = reverse("export-checkout-sessions")
+
+    def setUp(self):
+        for i in range(3):
+            CheckoutSession.objects.create(
+                session_id=f"cs_{i}", domain_name=f"example{i}.com", email=f"user{i}@example.com",
+                period=1, price="11.99", currency="usd",
+            )
+
+    def export(self, **query):
+        response = self.client.get(self.url, query)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    def pyarrow(self):
+        try:
+            return load_pyarrow()
+        except ImproperlyConfigured:
+            self.skipTest("pyarrow is not installed")
+
+    def test_csv(self):
+        response, body = self.export()
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0][:2], ["session id", "Domain Name"])
+        self.assertEqual([row[0] for row in rows[1:]], ["cs_0", "cs_1", "cs_2"])
+
+    def test_gzipped_csv(self):
+        response, body = self.export(compress="gzip")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn('filename="purchases.csv.gz"', response["Content-Disposition"])
+        rows = list(csv.reader(io.StringIO(gzip.decompress(body).decode())))
+        self.assertEqual([row[0] for row in rows[1:]], ["cs_0", "cs_1", "cs_2"])
+
+    def test_ndjson(self):
+        response, body = self.export(format="ndjson", since_id=CheckoutSession.objects.get(session_id="cs_0").pk)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row["session_id"] for row in rows], ["cs_1", "cs_2"])
+        self.assertEqual(rows[0]["price"], "11.99")
+
+    @override_settings(EXPORT_BATCH_ROWS=2)
+    def test_parquet(self):
+        pa = self.pyarrow()
+        response, body = self.export(format="parquet")
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.parquet")
+        table = pa.parquet.read_table(pa.BufferReader(body))
+        self.assertEqual(table.column("session_id").to_pylist(), ["cs_0", "cs_1", "cs_2"])
+        self.assertEqual(str(table.schema.field("price").type), "decimal128(10, 2)")
+
+    @override_settings(EXPORT_BATCH_ROWS=2)
+    def test_arrow(self):
+        pa = self.pyarrow()
+        response, body = self.export(format="arrow")
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.arrow.stream")
+        self.assertIn('filename="purchases.arrows"', response["Content-Disposition"])
+        table = pa.ipc.open_stream(body).read_all()
+        self.assertEqual(table.column("domain_name").to_pylist(), ["example0.com", "example1.com", "example2.com"])
+
+    def test_bad_format_answers_400(self):
+        for query in [{"format": "xlsx"}, {"format": "parquet", "compress": "gzip"}, {"compress": "zip"}]:
+            with self.subTest(query=query):
+                response = self.client.get(self.url, query)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
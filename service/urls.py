@@ -1,10 +1,15 @@
 from django.urls import path,include
-from . import views
+from . import async_views, views
 urlpatterns = [
     path('', views.home, name='home' ), # Added the service app url
     # path('search-domain/', views.search_domain_name, name='search-domain' ), # Added the service app url
     path('purchase-domain/', views.purchase_domain, name='purchase-domain' ), # Added the service app url
+    path('purchase-domains/', views.purchase_domains, name='purchase-domains'),
+    path('purchase-jobs/<int:job_id>/', views.purchase_job_status, name='purchase-job-status'),
     path('list-domains/', views.get_list_domains, name='list-domains' ), # Added the service app url
+    path('suggest-domains/', views.suggest_domains, name='suggest-domains'),
+    path('availability-cache-stats/', views.availability_cache_stats, name='availability-cache-stats'),
+    path('metrics', views.metrics, name='metrics'),
     path('domain-agreement/', views.domain_agreement, name='domain-agreement' ), # Added the service app url
     path('success/', views.success, name='success' ), # Added the service app url
     path('cancel/', views.cancel, name='cancel' ), # Added the service app url
@@ -14,4 +19,10 @@ urlpatterns = [
     path('purchase-customer-details/<str:session_id>',views.PurchaseAPIView.as_view(), name='purchase-customer-details'),
     path('export-checkout-sessions/', views.export_to_csv, name='export-checkout-sessions'),
 
+    # ASGI-native variants, serve with an ASGI server (e.g. uvicorn domainserviceprovider.asgi:application)
+    path('async/list-domains/', async_views.get_list_domains, name='async-list-domains'),
+    path('async/purchase-domain/', async_views.purchase_domain, name='async-purchase-domain'),
+    path('async/checkout-session/', async_views.create_checkout_session, name='async-checkout-session'),
+    path('async/success/', async_views.success, name='async-success'),
+
 ]
\ No newline at end of file
@@ -1,22 +1,50 @@
 from django.shortcuts import render, HttpResponse, get_object_or_404
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 import requests
 from django.views.decorators.csrf import csrf_exempt
 import json
+import logging
 from datetime import datetime
 import stripe
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from decimal import Decimal
 from django.shortcuts import redirect
-from .models import CheckoutSession, Purchase
-import csv
-from .serializers import CheckoutSessionSerializer,PurchaseSerializer
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+from .models import CheckoutSession, Purchase, PurchaseJob
+from .serializers import CheckoutSessionSerializer, PurchaseReadSerializer, PurchaseSerializer
+from .availability import availability_cache, iter_search, search_available_domains
+from .bulk_purchases import purchase_many
+from .agreements import agreement_cache
+from .checkout import checkout_session_params
+from .contacts import find_profile, save_profile
+from .godaddy import get_client, never_sent
+from .idempotency import idempotent, keep
+from .jobs import enqueue_purchase, iter_job_status, job_status
+from .exports import COLUMNAR_FORMATS, FORMATS as EXPORT_FORMATS, export_rows, iter_export, load_pyarrow
+from .metrics import CONTENT_TYPE_LATEST as METRICS_CONTENT_TYPE, render as render_metrics
+from .pagination import keyset_page, parse_bound
+from .quotes import QuoteError, checkout_terms, purchase_terms, quote_store
+from .ratelimit import UpstreamUnavailable
+from .streaming import stream_format, streaming_response, streaming_search_response
+from .suggestions import suggest_domains as suggest_alternatives
+from .taken_filter import taken_filter
+from .webhooks import record_event, verify_event
+from .purchasing import (
+    build_purchase_payload,
+    missing_field,
+    purchase_details,
+    purchase_error,
+    purchase_result,
+    purchase_unconfirmed,
+)
 
 # Create your views here.
 
+logger = logging.getLogger(__name__)
+
 current_time = datetime.utcnow()
 stripe.api_key = settings.STRIPE_SECRET_KEY
 DOMAIN = settings.DOMAIN
@@ -32,41 +60,44 @@ def get_list_domains(request):
         try:
             # Parse the JSON body from the POST request
             data = json.loads(request.body.decode("utf-8"))
-            print(data)
             domain_keyword = data.get(
                 "domain_name", "defaultdomain"
             )  # Use a default if not provided
 
-            # Define extensions and prepare API headers
+            # Define extensions to check
             extensions = data.get("extensions", [])
+            logger.debug("Domain search", extra={"domain_name": domain_keyword, "extensions": extensions})
 
             # extensions = [
             #     ".com", ".in", ".org", ".net", ".info", ".co", ".io",
             #     ".biz", ".us", ".uk", ".ca", ".au", ".eu", ".asia", ".de",
             # ]
-            base_url = "https://api.ote-godaddy.com/v1/domains/available"
-            headers = {
-                "content-type": "application/json",
-                "Authorization": f"sso-key {settings.GODADDY_API_KEY}:{settings.GODADDY_API_SECRET_KEY}",
-            }
-
-            available_domains = []
-
-            # Query the GoDaddy API for each extension
-            for ext in extensions:
-                domain = f"{domain_keyword}{ext}"
-                url = f"{base_url}?domain={domain}"
-                response = requests.get(url, headers=headers)
-                result = response.json()
 
-                # Check if the domain is available
-                if result.get("available"):
-                    available_domains.append(result)
+            # Query the GoDaddy API for every extension concurrently
+            # Stream each available domain as soon as its lookup finishes
+            fmt = stream_format(request, data)
+            if fmt:
+                events = iter_search(
+                    domain_keyword,
+                    extensions,
+                    bulk=data.get("bulk"),
+                    fresh=bool(data.get("fresh", False)),
+                )
+                return streaming_search_response(events, fmt)
+
+            # Pass "fresh": true to bypass the availability cache
+            result = search_available_domains(
+                domain_keyword,
+                extensions,
+                bulk=data.get("bulk"),
+                fresh=bool(data.get("fresh", False)),
+            )
+            # Pass "suggest": true to get alternatives right away when every exact name is taken
+            if data.get("suggest") and not result["available_domains"]:
+                result["suggestions"] = suggest_alternatives(domain_keyword, extensions)["suggestions"]
 
             # Return the list of available domains as JSON response
-            return JsonResponse(
-                {"available_domains": available_domains}, safe=False, status=200
-            )
+            return JsonResponse(result, safe=False, status=200)
         except json.JSONDecodeError:
             return JsonResponse({"error": "Invalid JSON payload"}, status=400)
         except Exception as e:
@@ -75,27 +106,50 @@ def get_list_domains(request):
         return JsonResponse({"error": "Only POST method is allowed"}, status=405)
 
 
+def metrics(request):
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+
+@csrf_exempt
+def suggest_domains(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method is allowed"}, status=405)
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+        keyword = data.get("domain_name")
+        if not keyword:
+            return JsonResponse({"error": "domain_name is required"}, status=400)
+        limit = min(int(data.get("limit") or settings.SUGGESTIONS_LIMIT), 100)
+        result = suggest_alternatives(keyword, data.get("extensions", []), limit=limit)
+        return JsonResponse(result, status=200)
+    except (json.JSONDecodeError, ValueError):
+        return JsonResponse({"error": "Invalid JSON payload"}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+def availability_cache_stats(request):
+    return JsonResponse(
+        {**availability_cache.stats(), "taken_filter": taken_filter().stats(), "quotes": quote_store.stats()},
+        status=200,
+    )
+
+
 def domain_agreement(tlds, privacy="false"):
     # tlds = ["com", "net", "org"]  # Replace with supported TLDs
     # privacy = "false"  # Set to "true" if you want agreements for privacy protection
-    tlds_query = "&".join([f"tlds={tld}" for tld in tlds])  # Build TLDs query parameter
-
-    url = f"https://api.ote-godaddy.com/v1/domains/agreements?{tlds_query}&privacy={privacy}"
-    headers = {
-        "content-type": "application/json",
-        "Authorization": f"sso-key {settings.GODADDY_API_KEY}:{settings.GODADDY_API_SECRET_KEY}",
-    }
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        if response.status_code == 200:
-            data = response.json()
-            return data  # Return the agreements data
-        else:
-            return JsonResponse(
-                {"error": response.json().get("message", "Failed to fetch agreements")},
-                status=response.status_code,
-            )
+        # Agreements rarely change, they are memoized per TLD set and refreshed in the background
+        return agreement_cache.get(tlds, privacy)
+    except requests.exceptions.HTTPError as http_err:
+        response = http_err.response
+        try:
+            message = response.json().get("message", "Failed to fetch agreements")
+        except ValueError:
+            message = "Failed to fetch agreements"
+        return JsonResponse({"error": message}, status=response.status_code)
+    except UpstreamUnavailable as unavailable:
+        return JsonResponse({"error": str(unavailable)}, status=503)
     except requests.exceptions.RequestException as req_err:
         return JsonResponse({"error": str(req_err)}, status=500)
     except ValueError as val_err:
@@ -108,34 +162,25 @@ def domain_agreement(tlds, privacy="false"):
 def stripe_webhook(request):
     if request.method == "POST":
         payload = request.body
-        endpoint_secret = settings.WEBHOOK_ENDPOINT_SECRET
-        sig_header = request.headers("STRIPE_SIGNATURE")  # Use .get to avoid KeyError
-        event = None
+        sig_header = request.headers.get("Stripe-Signature")
         # Check if the signature header is present
         if not sig_header:
             return JsonResponse({"error": "Signature header not found"}, status=400)
 
         try:
             # Verify the event using the signature and endpoint secret
-            event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+            event = verify_event(payload, sig_header)
         except ValueError as e:
             # Invalid payload
-            print(f"Error pasrsing payload: {e}")
+            logger.warning("Invalid webhook payload", extra={"error": str(e)})
             return HttpResponse(status=400)
         except stripe.error.SignatureVerificationError as e:
             # Invalid signature
-            print(f"Signature verification failed: {e}")
+            logger.warning("Webhook signature verification failed", extra={"error": str(e)})
             return HttpResponse(status=400)
-        # Process the webhook event
-        if event["type"] == "checkout.session.completed":
-            # Perform actions after successful payment
-            session = event["data"]["object"]
-            print(session)
-            print("Payment was successful.")
-            return JsonResponse({"status": "Payment was successful"}, status=200)
-        else:
-            print("Unhandled event type:", event["type"])
 
+        # Acknowledge right away, the process_webhooks command applies the event
+        record_event(event)
         return HttpResponse(status=200)
     # Reject non-POST requests
     return JsonResponse(
@@ -143,63 +188,61 @@ def stripe_webhook(request):
     )
 
 
+def purchase_not_answered(domain_name, reason):
+    """The response for a purchase that reached GoDaddy without a usable answer, kept for retries with the same key."""
+    logger.error("Domain purchase unconfirmed", extra={"domain_name": domain_name, "reason": str(reason)})
+    return keep(JsonResponse(purchase_unconfirmed(domain_name, str(reason)), status=502))
+
+
 @csrf_exempt
+@idempotent
 def purchase_domain(request):
     if request.method != "POST":
         return JsonResponse({"error": "Invalid request method"}, status=400)
 
     try:
-        # Parse request data
-        data = json.loads(request.body.decode("utf-8"))
-        required_fields = [
-            "domain_name",
-            "email",
-            "period",
-            "first_name",
-            "last_name",
-            "phone",
-            "address1",
-            "city",
-            "state",
-            "postal_code",
-            "country",
-            "amount",
-        ]
+        # Parse request data, a quoted purchase is charged what the quote says
+        data = purchase_terms(json.loads(request.body.decode("utf-8")))
 
         # Validate required fields
-        for field in required_fields:
-            if not data.get(field):
-                return JsonResponse({"error": f"{field} is required"}, status=400)
+        field = missing_field(data)
+        if field:
+            return JsonResponse({"error": f"{field} is required"}, status=400)
 
+        # One lookup on the (domain_name, email) index instead of exists() then first()
         checkout_session = CheckoutSession.objects.filter(
             domain_name=data["domain_name"], email=data["email"]
-        )
-        if not checkout_session.exists():
+        ).first()
+        if checkout_session is None:
             return JsonResponse({"error": "Invalid checkout session"}, status=400)
-        print("= ================================")
-        print("checkout session from purchase",checkout_session)
-        checkout_session = checkout_session.first()
+        logger.debug("Checkout session found", extra={"session_id": checkout_session.session_id})
         domain_name = data["domain_name"]
-        email = data["email"]
-        period = int(data["period"])
-        first_name = data["first_name"]
-        last_name = data["last_name"]
-        phone = data["phone"]
-        address1 = data["address1"]
-        address2 = data.get("address2", "")
-        city = data["city"]
-        state = data["state"]
-        postal_code = data["postal_code"]
-        country = data["country"]
         amount = int(data["amount"])
-        currency = data.get("currency", "USD").lower()
 
         if amount <= 0:
             return JsonResponse({"error": "Amount must be greater than 0"}, status=400)
 
+        # Queue the registration for the purchase worker and answer right away
+        if data.get("async", settings.PURCHASE_ASYNC):
+            job = enqueue_purchase(
+                data, checkout_session, request.META.get("REMOTE_ADDR", "127.0.0.1")
+            )
+            return JsonResponse(
+                {
+                    "domain_name": domain_name,
+                    "job_id": job.pk,
+                    "status": job.purchase.status,
+                    "status_url": reverse("purchase-job-status", args=[job.pk]),
+                },
+                status=202,
+            )
+
         # Extract TLD and fetch agreement keys
         tlds = [domain_name.split(".")[-1]]  # Extract TLD from domain name
         agreements = domain_agreement(tlds)
+        if isinstance(agreements, JsonResponse):
+            # Fetching the agreements failed, pass the error on
+            return agreements
 
         if not agreements or "agreementKey" not in agreements[0]:
             return JsonResponse(
@@ -212,193 +255,112 @@ def purchase_domain(request):
         agreed_at = datetime.now().isoformat() + "Z"  # ISO8601 format with UTC
         agreed_by = request.META.get("REMOTE_ADDR", "127.0.0.1")
 
-        # GoDaddy API endpoint and headers
-        url = "https://api.ote-godaddy.com/v1/domains/purchase"
-        headers = {
-            "content-type": "application/json",
-            "Authorization": f"sso-key {settings.GODADDY_API_KEY}:{settings.GODADDY_API_SECRET_KEY}",
-        }
-
-        # Data payload for domain registration
-        payload = {
-            "consent": {
-                "agreedAt": agreed_at,
-                "agreedBy": agreed_by,
-                "agreementKeys": [agreement_key],
-            },
-            "contactAdmin": {
-                "addressMailing": {
-                    "address1": address1,
-                    "address2": address2,
-                    "city": city,
-                    "country": country,
-                    "postalCode": postal_code,
-                    "state": state,
-                },
-                "email": email,
-                "phone": phone,
-                "nameFirst": first_name,
-                "nameLast": last_name,
-            },
-            "contactBilling": {
-                "addressMailing": {
-                    "address1": address1,
-                    "address2": address2,
-                    "city": city,
-                    "country": country,
-                    "postalCode": postal_code,
-                    "state": state,
-                },
-                "email": email,
-                "fax": phone,
-                "jobTitle": "string",
-                "nameFirst": first_name,
-                "nameLast": last_name,
-                "nameMiddle": "string",
-                "organization": "string",
-                "phone": phone,
-            },
-            "contactRegistrant": {
-                "addressMailing": {
-                    "address1": address1,
-                    "address2": address2,
-                    "city": city,
-                    "country": country,
-                    "postalCode": postal_code,
-                    "state": state,
-                },
-                "email": email,
-                "phone": phone,
-                "nameFirst": first_name,
-                "nameLast": last_name,
-                # "entityType": "INDIVIDUAL",  # Add entityType here
-                # "language": "en", 
-            },
-            "contactTech": {
-                "addressMailing": {
-                    "address1": address1,
-                    "address2": address2,
-                    "city": city,
-                    "country": country,
-                    "postalCode": postal_code,
-                    "state": state,
-                },
-                "email": email,
-                "fax": phone,
-                "jobTitle": "string",
-                "nameFirst": first_name,
-                "nameLast": last_name,
-                "nameMiddle": "string",
-                "organization": "string",
-                "phone": phone,
-            },
-            "domain": domain_name,
-            "nameServers": [
-                "ns01.domaincontrol.com",
-                "ns02.domaincontrol.com",
-            ],
-            "period": period,
-            # "privacy": False,
-            "renewAuto": True,
-        }
+        # Data payload for domain registration, with the contact blocks prebuilt for the customer's profile
+        contact = find_profile(data)
+        payload = build_purchase_payload(data, agreement_key, agreed_at, agreed_by, contact.godaddy_contacts)
 
         # Send request to GoDaddy API
-        response = requests.post(url, headers=headers, json=payload)
+        response = get_client().purchase(payload)
+        if response.status_code >= 500:
+            # GoDaddy may have registered the domain before failing
+            return purchase_not_answered(domain_name, f"GoDaddy answered {response.status_code}")
 
         response_data = response.json()
         response_data["status"] = "SUCCESS" if response.status_code == 200 else "FAILED"
-        print(response_data)
         if response.status_code == 200:
 
             # Save purchase details in the database
             purchase = Purchase.objects.create(
                 order_id=response_data.get("orderId"),  # Generate a unique order ID
                 checkout_session=checkout_session,
-                first_name=data["first_name"],
-                last_name=data["last_name"],
-                phone=data["phone"],
-                address1=data["address1"],
-                address2=data.get("address2", ""),
-                city=data["city"],
-                state=data["state"],
-                postal_code=data["postal_code"],
-                country=data["country"],
-                amount=Decimal(data["amount"]),
-                currency=data.get("currency", "USD").upper(),
+                contact=save_profile(contact),
                 status="SUCCESS",
+                **purchase_details(data),
             )
-            print("Purchase details saved: =======================  ")
-            print(purchase)
-            return JsonResponse(
-                {
-                    "domain_name": domain_name,
-                    "status": response_data.get("status", "PENDING"),
-                    "order_id": response_data.get("orderId"),
-                    "currency": response_data.get("currency"),
-                    "total": response_data.get("total"),
-                    "item_count": response_data.get("itemCount"),
-                },
-                status=200,
-            )
+            logger.info("Domain purchased", extra={"domain_name": domain_name, "order_id": purchase.order_id})
+            return JsonResponse(purchase_result(domain_name, response_data), status=200)
         else:
+            logger.warning(
+                "Domain purchase refused",
+                extra={"domain_name": domain_name, "status_code": response.status_code, "code": response_data.get("code")},
+            )
+            return JsonResponse(purchase_error(response_data), status=response.status_code)
+
+    except QuoteError as error:
+        return JsonResponse(error.payload(), status=error.status)
+    except UpstreamUnavailable as unavailable:
+        # Not sent to GoDaddy, so the client can safely retry later
+        logger.warning("Domain purchase deferred", extra={"reason": str(unavailable)})
+        return JsonResponse({"error": str(unavailable)}, status=503)
+    except requests.exceptions.ConnectionError as conn_err:
+        if not never_sent(conn_err):
+            return purchase_not_answered(domain_name, conn_err)
+        logger.warning("Domain purchase deferred", extra={"reason": str(conn_err)})
+        return JsonResponse({"error": str(conn_err)}, status=503)
+    except requests.exceptions.RequestException as req_err:
+        # e.g. a read timeout or an unreadable answer, GoDaddy may still have registered the domain
+        return purchase_not_answered(domain_name, req_err)
+    except Exception as e:
+        logger.exception("Domain purchase failed")
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+@idempotent
+def purchase_domains(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method is allowed"}, status=405)
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+        domains = data.get("domains")
+        if not domains or not isinstance(domains, list) or not all(isinstance(item, dict) for item in domains):
+            return JsonResponse({"error": "domains must be a list of purchase requests"}, status=400)
+        if len(domains) > settings.PURCHASE_BULK_MAX_DOMAINS:
             return JsonResponse(
-                {
-                    "error": response_data.get("message", "An error occurred"),
-                    "fields": response_data.get("fields", {}),
-                },
-                status=response.status_code,
+                {"error": f"At most {settings.PURCHASE_BULK_MAX_DOMAINS} domains per request"}, status=400
             )
 
+        result = purchase_many(data, request.META.get("REMOTE_ADDR", "127.0.0.1"))
+        logger.info(
+            "Bulk purchase finished",
+            extra={"domains": len(domains), "succeeded": result["succeeded"], "failed": result["failed"]},
+        )
+        return JsonResponse(result, status=200)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON payload"}, status=400)
     except Exception as e:
+        logger.exception("Bulk purchase failed")
         return JsonResponse({"error": str(e)}, status=500)
 
 
+def purchase_job_status(request, job_id):
+    job = get_object_or_404(PurchaseJob, pk=job_id)
+    # Stream status changes until the job finishes instead of polling
+    fmt = stream_format(request, {"stream": request.GET.get("stream")})
+    if fmt:
+        return streaming_response(iter_job_status(job.pk), fmt)
+    return JsonResponse(job_status(job), status=200)
+
+
 @csrf_exempt
+@idempotent
 def create_checkout_session(request):
     if request.method == "POST":
         try:
             # Get the product details from the POST request
             data = json.loads(request.body.decode("utf-8"))
-            domain_name = data.get("name")
-
-            product_price = (
-                Decimal(data.get("price")) * 100
-            )  # Convert to cents for Stripe
-            product_period = data.get("period")
+            # The price comes from the quote when the client sends a quote_id, in cents for Stripe
+            domain_name, product_price, product_period = checkout_terms(data)
             user_email = data.get("email")
 
-            print("=====================================")
-            print(domain_name, product_price, product_period, user_email)
+            logger.debug(
+                "Creating checkout session",
+                extra={"domain_name": domain_name, "price": product_price, "period": product_period, "email": user_email},
+            )
 
             # Create a Stripe checkout session
             checkout_session = stripe.checkout.Session.create(
-                line_items=[
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "unit_amount": int(
-                                product_price
-                            ),  # Stripe requires the price in cents
-                            "product_data": {
-                                "name": domain_name,
-                                "description": f"Registration for {product_period} year(s)",
-                                # 'images': ['https://images.unsplash.com/photo-1579202673506-ca3ce28943ef'],
-                            },
-                        },
-                        "quantity": 1,
-                    },
-                ],
-                mode="payment",
-                billing_address_collection="required",
-                # success_url=DOMAIN + '/success?session_id={CHECKOUT_SESSION_ID}',
-                success_url=(
-                    f"{DOMAIN}/success?"
-                    f"session_id={{CHECKOUT_SESSION_ID}}"
-                    f"&domain_name={domain_name}"
-                    f"&period={product_period}"
-                ),
-                cancel_url=DOMAIN + "/cancel",
-                customer_email=user_email,
+                **checkout_session_params(domain_name, product_price, product_period, user_email)
             )
             # Save checkout session details in the database
             checkoutdb_session = CheckoutSession.objects.create(
@@ -410,10 +372,17 @@ def create_checkout_session(request):
                 currency="usd",
             )
 
-            print(f"Session ID: {checkout_session.id}")
-            print(f"Checkout URL: {checkoutdb_session}")
+            logger.info(
+                "Checkout session created",
+                extra={"session_id": checkoutdb_session.session_id, "domain_name": domain_name},
+            )
             return JsonResponse({"session": checkout_session.url}, status=200)
+        except QuoteError as error:
+            return JsonResponse(error.payload(), status=error.status)
+        except UpstreamUnavailable as unavailable:
+            return JsonResponse({"error": str(unavailable)}, status=503)
         except Exception as error:
+            logger.exception("Creating the checkout session failed")
             return JsonResponse({"error": str(error)}, status=500)
 
     return JsonResponse(
@@ -429,7 +398,10 @@ def success(request):
         data = json.loads(request.body.decode("utf-8"))
         session_id = data.get("session_id")
         session = stripe.checkout.Session.retrieve(session_id)
-        print(session)
+        logger.debug(
+            "Checkout session retrieved",
+            extra={"session_id": session_id, "payment_status": session.get("payment_status")},
+        )
         return JsonResponse({"message": "Payment successful", "session": session})
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -441,19 +413,60 @@ def cancel(request):
 
 
 class CheckoutSessionView(APIView):
+    FILTERS = ("email", "domain_name", "currency")
+
     def get(self, request):
+        params = request.query_params
         try:
-            checkout_sessions = CheckoutSession.objects.all()
-            serializer = CheckoutSessionSerializer(checkout_sessions, many=True)
-            return Response({"checkout_sessions": serializer.data}, status=status.HTTP_200_OK)
+            limit = min(
+                int(params.get("limit", settings.CHECKOUT_SESSIONS_PAGE_SIZE)),
+                settings.CHECKOUT_SESSIONS_MAX_PAGE_SIZE,
+            )
+            if limit <= 0:
+                raise ValueError("limit must be greater than 0")
+
+            checkout_sessions = CheckoutSession.objects.filter(
+                **{name: params[name] for name in self.FILTERS if params.get(name)}
+            )
+            if params.get("created_after"):
+                checkout_sessions = checkout_sessions.filter(
+                    created_at__gte=parse_bound(params["created_after"], "created_after")
+                )
+            if params.get("created_before"):
+                checkout_sessions = checkout_sessions.filter(
+                    created_at__lt=parse_bound(params["created_before"], "created_before")
+                )
+
+            fields = None
+            if params.get("fields"):
+                fields = [name.strip() for name in params["fields"].split(",") if name.strip()]
+                unknown = set(fields) - set(CheckoutSessionSerializer.Meta.fields)
+                if unknown:
+                    raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+                # created_at and id are needed to build the next cursor
+                checkout_sessions = checkout_sessions.only("id", "created_at", *fields)
+
+            page, next_cursor = keyset_page(checkout_sessions, params.get("cursor"), limit)
+            serializer = CheckoutSessionSerializer(page, many=True, fields=fields)
+            next_url = None
+            if next_cursor:
+                query = params.copy()
+                query["cursor"] = next_cursor
+                next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+            return Response(
+                {"checkout_sessions": serializer.data, "next_cursor": next_cursor, "next": next_url},
+                status=status.HTTP_200_OK,
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class PurchaseAPIView(APIView):
     def get(self, request, session_id):
         checkout_session = get_object_or_404(CheckoutSession, session_id=session_id)
-        purchases = Purchase.objects.filter(checkout_session=checkout_session)
-        serializer = PurchaseSerializer(purchases, many=True)
+        purchases = Purchase.objects.filter(checkout_session=checkout_session).select_related("checkout_session", "contact")
+        serializer = PurchaseReadSerializer(purchases, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request, session_id):
@@ -470,25 +483,34 @@ class PurchaseAPIView(APIView):
     
     
 def export_to_csv(request):
-    file_path = 'domainserviceprovider\CSVdata\purchases.csv'
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="purchases.csv"'
-    
-    writer = csv.writer(response)
-    
-    writer.writerow(['session id','Domain Name','Email','Period','Price','Currency','Created At'])
-    sessions = CheckoutSession.objects.all()
-    
-    for session in sessions:
-        writer.writerow([
-            session.session_id,
-            session.domain_name,
-            session.email,
-            session.period,
-            session.price,
-            session.currency,
-            session.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
+    try:
+        since = parse_bound(request.GET["since"], "since") if request.GET.get("since") else None
+        until = parse_bound(request.GET["until"], "until") if request.GET.get("until") else None
+        since_id = int(request.GET["since_id"]) if request.GET.get("since_id") else None
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    include_purchases = request.GET.get("include_purchases", "").lower() in ("1", "true", "yes")
+
+    fmt = request.GET.get("format", "csv")
+    compress = request.GET.get("compress") or None
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}, status=400)
+    if compress not in (None, "gzip") or (compress and fmt in COLUMNAR_FORMATS):
+        return JsonResponse({"error": "compress=gzip is only supported for csv and ndjson"}, status=400)
+    if fmt in COLUMNAR_FORMATS:
+        try:
+            load_pyarrow()
+        except ImproperlyConfigured as e:
+            return JsonResponse({"error": str(e)}, status=501)
+
+    content_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"purchases.{extension}"
+    if compress:
+        content_type, filename = "application/gzip", f"{filename}.gz"
+
+    rows = export_rows(since, until, since_id, include_purchases)
+    response = StreamingHttpResponse(iter_export(rows, fmt, compress, include_purchases), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
@@ -497,13 +519,11 @@ def verify_registrant_email(request, domain):
     if request.method != "POST":
         return JsonResponse({"error": "Invalid request method. Use POST."}, status=400)
     try:
-        url = f"https://api.ote-godaddy.com/v1/domains/{domain}/verifyRegistrantEmail"
-        headers = {
-            "content-type": "application/json",
-            "Authorization": f"sso-key {settings.GODADDY_API_KEY}:{settings.GODADDY_API_SECRET_KEY}",
-        }
-        response = requests.post(url, headers=headers)
-        print(response.json())
+        response = get_client().verify_registrant_email(domain)
+        logger.info(
+            "Registrant email verification requested",
+            extra={"domain": domain, "status_code": response.status_code},
+        )
         if response.status_code == 200:
             return JsonResponse({"message": "Verification email sent"}, status=200)
         else:
@@ -515,6 +535,8 @@ def verify_registrant_email(request, domain):
                 },
                 status=response.status_code,
             )
+    except UpstreamUnavailable as unavailable:
+        return JsonResponse({"error": str(unavailable)}, status=503)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
@@ -0,0 +1,141 @@
+import json
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+import stripe
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CheckoutSession, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+# Events that carry a checkout session whose payment_status we mirror
+CHECKOUT_EVENTS = {
+    "checkout.session.completed",
+    "checkout.session.async_payment_succeeded",
+    "checkout.session.async_payment_failed",
+    "checkout.session.expired",
+}
+
+
+def verify_event(payload, sig_header, secret=None):
+    """
+    Check the Stripe-Signature header and return the decoded event.
+
+    Raises ``ValueError`` for a malformed payload and
+    ``stripe.error.SignatureVerificationError`` for a bad signature.
+    """
+    stripe.WebhookSignature.verify_header(
+        payload.decode("utf-8"), sig_header, secret or settings.WEBHOOK_ENDPOINT_SECRET
+    )
+    return json.loads(payload)
+
+
+def record_event(event):
+    """Append the event to the inbox, deliveries of an event already there are ignored."""
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(event_id=event["id"], type=event["type"], payload=event)],
+        ignore_conflicts=True,
+    )
+
+
+def supersedes(update, current):
+    """
+    Whether the ``(payment_status, event time)`` ``update`` replaces ``current``.
+
+    Stripe may deliver events late and out of order, so the newest event by
+    its ``created`` time wins, not the last one to arrive. ``created`` is in
+    whole seconds: on a tie the later delivery wins, unless it would take
+    back a "paid".
+    """
+    if current is None or current[1] is None:
+        return True
+    if update[1] != current[1]:
+        return update[1] > current[1]
+    return current[0] != "paid"
+
+
+def session_updates(events):
+    """The newest ``(payment_status, event time, paid_at)`` per checkout session id."""
+    updates = {}
+    for event in events:
+        if event.type not in CHECKOUT_EVENTS:
+            continue
+        session = event.payload["data"]["object"]
+        status = "expired" if event.type == "checkout.session.expired" else session.get("payment_status", "")
+        changed_at = datetime.fromtimestamp(event.payload["created"], tz=dt_timezone.utc)
+        current = updates.get(session["id"])
+        if supersedes((status, changed_at), current):
+            paid_at = None
+            if status == "paid":
+                # Keep the first payment's time when Stripe confirms it again
+                paid_at = current[2] if current and current[0] == "paid" else changed_at
+            updates[session["id"]] = (status, changed_at, paid_at)
+    return updates
+
+
+def apply_updates(updates):
+    """Store the updates newer than what the sessions already have, returns how many sessions changed."""
+    sessions = []
+    for session in CheckoutSession.objects.filter(session_id__in=updates):
+        status, changed_at, paid_at = updates[session.session_id]
+        if not supersedes((status, changed_at), (session.payment_status, session.payment_status_at)):
+            continue
+        if status != "paid" or session.payment_status != "paid" or session.paid_at is None:
+            session.paid_at = paid_at
+        session.payment_status = status
+        session.payment_status_at = changed_at
+        sessions.append(session)
+    CheckoutSession.objects.bulk_update(
+        sessions, ["payment_status", "paid_at", "payment_status_at"], batch_size=500
+    )
+    return len(sessions)
+
+
+def process_batch(batch_size=None):
+    """
+    Apply the oldest unprocessed events, returns how many were taken from the inbox.
+
+    When the batch fails to apply, its events are applied one by one so a bad
+    event doesn't hold up the ones behind it. The failing event keeps its error
+    and is retried with the next batches, up to ``WEBHOOK_MAX_ATTEMPTS``
+    times before it is set aside as processed.
+    """
+    batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+    with transaction.atomic():
+        pending = WebhookEvent.objects.filter(processed_at__isnull=True).order_by("id")
+        if connection.features.has_select_for_update_skip_locked:
+            # Lets several workers drain the inbox on Postgres
+            pending = pending.select_for_update(skip_locked=True)
+        events = list(pending[:batch_size])
+        if not events:
+            return 0
+        try:
+            with transaction.atomic():
+                apply_updates(session_updates(events))
+            applied = events
+        except Exception:
+            logger.exception("Applying the webhook batch failed, applying its events one by one")
+            applied = [event for event in events if apply_event(event)]
+        WebhookEvent.objects.filter(pk__in=[event.pk for event in applied]).update(
+            processed_at=timezone.now()
+        )
+    return len(events)
+
+
+def apply_event(event):
+    """Apply a single event, returns False when it failed and is left for a retry."""
+    try:
+        with transaction.atomic():
+            apply_updates(session_updates([event]))
+        return True
+    except Exception as error:
+        logger.exception("Webhook event not applied", extra={"event_id": event.event_id})
+        event.attempts += 1
+        event.error = repr(error)
+        if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            event.processed_at = timezone.now()
+        event.save(update_fields=["attempts", "error", "processed_at"])
+        return False